@@ -1,13 +1,22 @@
+from __future__ import annotations
+
+from time import perf_counter
+from typing import TYPE_CHECKING
+
 import numpy as np
-import pandas as pd
-from scipy.special import expi
-from scipy.optimize import minimize,least_squares
-from functools import partial
+
+from . import _scipy
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# scipy 在用到的函数内部导入，避免导入本模块时加载 scipy.optimize / scipy.special；
+# 目标函数中的 scipy.special 经 _scipy.special() 取得，只在第一次调用时导入
 
 # 定义常量，避免使用“魔法数字”
 MAX_EXPI_ARG = -700.0 # expi 函数参数的阈值，用于避免溢出
 
-def NFM_Kluitenberg(x: list, T_measured: np.ndarray, t: np.ndarray, variables: list) -> float:
+def NFM_Kluitenberg(x: list, T_measured: np.ndarray, t: np.ndarray, variables: list, context=None) -> float:
     """
     计算理论温度与实测温度之间的均方根误差 (RMSE)。
 
@@ -21,10 +30,17 @@ def NFM_Kluitenberg(x: list, T_measured: np.ndarray, t: np.ndarray, variables: l
             variables[0] = r (径向距离)
             variables[1] = q (热源强度)
             variables[2] = t0 (加热持续时间)
+        context - 可选的 FitContext（由 t 创建），给出时使用其缓存的不变量和工作数组，不再分配临时数组
 
     输出:
         RMSE - 实测温度与理论温度之间的均方根误差
     """
+    if context is not None:
+        context.check_time(t)
+        return context.kluitenberg_rmse(x[0], x[1], T_measured, *variables)
+
+    expi = _scipy.special().expi
+
     # 提取 Cv 和 lambda
     Cv = x[0]
     lambda_ = x[1]
@@ -72,7 +88,7 @@ def NFM_Kluitenberg(x: list, T_measured: np.ndarray, t: np.ndarray, variables: l
 
     return RMSE
 
-def calc_temp(parameters: list, t: np.ndarray, variables: list) -> np.ndarray:
+def calc_temp(parameters: list, t: np.ndarray, variables: list, context=None) -> np.ndarray:
     """
     根据给定方程计算理论温度。
 
@@ -85,10 +101,18 @@ def calc_temp(parameters: list, t: np.ndarray, variables: list) -> np.ndarray:
             variables[0] = r (径向距离)
             variables[1] = q (热源强度)
             variables[2] = t0 (加热持续时间)
+        context - 可选的 FitContext（由 t 创建），给出时使用其缓存的不变量
 
     输出:
         T_theoretical - 给定时间点上的理论温度值 (Numpy 数组)
     """
+    if context is not None:
+        context.check_time(t)
+        r, q, t0 = variables
+        return context.kluitenberg_temperature(parameters[0], parameters[1], r, q, t0)
+
+    expi = _scipy.special().expi
+
     # 提取 Cv 和 lambda
     Cv = parameters[0]
     lambda_ = parameters[1]
@@ -129,7 +153,12 @@ def optimize_soil_properties_RMSE(
     time: np.ndarray,
     temperature_data: np.ndarray | pd.Series,
     variables: list,
-    initial_guess: list
+    initial_guess: list,
+    instrumentation=None,
+    checkpoint=None,
+    checkpoint_interval: float = 60.0,
+    cache=None,
+    context=None
 ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     通过最小化实测温度与理论温度之间的 RMSE 来优化土壤特性参数。
@@ -140,23 +169,32 @@ def optimize_soil_properties_RMSE(
                            **请根据您的实际数据形状调整数据提取方式。**
         variables - 额外参数列表:
             variables[0] = r (径向距离)
-            variables[1] = q (热源强度)
+            variables[1] = q (热源强度)，标量或每个数据集一个值的数组
+                           （如 corrected_power_matrix 返回的 P_avg）
             variables[2] = t0 (加热持续时间)
         initial_guess - [Cv_初始值, lambda_初始值] 的初始猜测列表
+        instrumentation - 可选的 Instrumentation 对象，记录每个数据集的求解统计
+        checkpoint - 可选的检查点文件路径 (.npz)。已完成数据集的结果会定期原子地写入该文件，
+                     以相同输入重新运行时跳过已完成的数据集
+        checkpoint_interval - 两次写检查点之间的最短间隔（秒）
+        cache - 可选的 ResultCache 或缓存目录路径。按数据集缓存结果，输入和求解选项相同时直接返回
+        context - 可选的 FitContext（由 time 创建）。所有数据集共享其缓存的不变量和工作数组，
+                  目标函数求值不再分配临时数组；给出时忽略全局计算后端
 
     输出:
         Cv - 每个数据集的优化体积热容 (J/(m^3·K))
         lambda_ - 每个数据集的优化导热系数 (W/(m·K))
         RMSE - 每个数据集的均方根误差
     """
+    from scipy.optimize import minimize
+    from .kernels import get_kernel_backend, kluitenberg_objective
 
     # 初始猜测 Cv 和 lambda
     Cv_initial = initial_guess[0]
     lambda_initial = initial_guess[1]
 
-    # 确保 temperature_data 是一个 2D NumPy 数组
-    if isinstance(temperature_data, pd.Series):
-        temperature_data = temperature_data.to_numpy()
+    # 确保 temperature_data 是一个 2D NumPy 数组（pandas 对象同样适用）
+    temperature_data = np.asarray(temperature_data)
 
     if temperature_data.ndim == 1:
         temperature_data = temperature_data[np.newaxis, :]
@@ -169,20 +207,43 @@ def optimize_soil_properties_RMSE(
     # 数据集数量
     num_datasets = temperature_data.shape[0]
 
+    # 热源强度可以按数据集分别给定
+    q_values = np.broadcast_to(np.asarray(variables[1], dtype=float), (num_datasets,))
+
     # 初始化输出数组
     Cv_optimized = np.zeros(num_datasets)
     lambda_optimized = np.zeros(num_datasets)
     RMSE_results = np.zeros(num_datasets)
 
+    if context is not None:
+        context.check_time(time)
+
+    if cache is not None:
+        from .cache import as_result_cache
+        cache = as_result_cache(cache)
+
+    if checkpoint is not None:
+        from ._hashing import hash_inputs
+        from .checkpoint import Checkpoint
+        fingerprint = hash_inputs('optimize_soil_properties_RMSE', time, temperature_data,
+                                  [variables[0], q_values, variables[2]], list(initial_guess))
+        checkpoint = Checkpoint(checkpoint, num_datasets, fingerprint, interval=checkpoint_interval)
+
     # 循环处理每个数据集
     for i in range(num_datasets):
+        if checkpoint is not None and checkpoint.is_done(i):
+            Cv_optimized[i] = checkpoint.get('Cv', i)
+            lambda_optimized[i] = checkpoint.get('lambda', i)
+            RMSE_results[i] = checkpoint.get('RMSE', i)
+            continue
+
         current_temperature = temperature_data[i, :]
         x0 = [Cv_initial, lambda_initial]
 
         # 定义参数的边界：Cv 和 lambda 必须是正值
         bounds = [(1e-6, None), (1e-6, None)]
 
-        objective_function = partial(NFM_Kluitenberg, T_measured=current_temperature, t=time, variables=variables)
+        current_variables = [variables[0], q_values[i], variables[2]]
 
         options = {
             'disp': False,
@@ -191,16 +252,302 @@ def optimize_soil_properties_RMSE(
             'xtol': 1e-9
         }
 
+        if cache is not None:
+            start = perf_counter()
+            key = cache.key('optimize_soil_properties_RMSE', time, current_temperature,
+                            current_variables, x0, bounds, options,
+                            'fit_context' if context is not None else get_kernel_backend())
+            cached = cache.get(key)
+            if cached is not None:
+                Cv_optimized[i], lambda_optimized[i] = cached['x']
+                RMSE_results[i] = cached['fun']
+                if instrumentation is not None:
+                    instrumentation.record_cached('optimize_soil_properties_RMSE', i,
+                                                  perf_counter() - start, float(cached['fun']))
+                if checkpoint is not None:
+                    checkpoint.complete(i, Cv=Cv_optimized[i], **{'lambda': lambda_optimized[i]},
+                                        RMSE=RMSE_results[i])
+                continue
+
+        objective_function = kluitenberg_objective(current_temperature, time, current_variables,
+                                                   context=context)
+        if instrumentation is not None:
+            objective_function = instrumentation.wrap_objective(objective_function)
+            start = perf_counter()
+
         # 推荐使用 L-BFGS-B 或 TNC 方法，它们支持边界
         result = minimize(objective_function, x0, method='Nelder-Mead', bounds=bounds, options=options)
 
+        if instrumentation is not None:
+            instrumentation.record_result('optimize_soil_properties_RMSE', i, result,
+                                          perf_counter() - start, objective_function)
+        if cache is not None:
+            cache.put(key, x=result.x, fun=result.fun)
+
         Cv_optimized[i] = result.x[0]
         lambda_optimized[i] = result.x[1]
         RMSE_results[i] = result.fun
 
+        if checkpoint is not None:
+            checkpoint.complete(i, Cv=result.x[0], **{'lambda': result.x[1]}, RMSE=result.fun)
+
+    if checkpoint is not None:
+        checkpoint.save()
+
     return Cv_optimized, lambda_optimized, RMSE_results
 
 
+def _fit_soil_depth_DE(
+    time: np.ndarray,
+    temperature: np.ndarray,
+    variables: list,
+    bounds,
+    popsize: int,
+    maxiter: int,
+    tol: float,
+    seed,
+    polish: bool,
+    depth: int,
+    record: bool = False
+):
+    """单个数据集的差分进化反演（optimize_soil_properties_DE 在进程池中调用）"""
+    from scipy.optimize import differential_evolution, minimize
+    from .kernels import kluitenberg_rmse_batch
+
+    # scipy 以 (2, S) 的形状传入整代种群，精化阶段传入单个参数向量
+    def loss(x):
+        values = kluitenberg_rmse_batch(np.transpose(x), temperature, time, *variables)
+        return values if np.ndim(x) > 1 else values[0]
+
+    objective = loss
+    if record:
+        from .instrumentation import Instrumentation
+        instrumentation = Instrumentation()
+        objective = instrumentation.wrap_objective(loss)
+        start = perf_counter()
+
+    result = differential_evolution(objective, bounds, popsize=popsize, maxiter=maxiter, tol=tol,
+                                    seed=seed, polish=False, vectorized=True, updating='deferred')
+    if polish:
+        local = minimize(objective, result.x, method='Nelder-Mead', bounds=bounds,
+                         options={'xatol': 1e-9, 'fatol': 1e-12, 'maxiter': 10**4})
+        result.nfev += local.nfev
+        if local.fun < result.fun:
+            result.x, result.fun = local.x, local.fun
+
+    if not record:
+        return result.x, result.fun, []
+    instrumentation.record_result('optimize_soil_properties_DE', depth, result,
+                                  perf_counter() - start, objective)
+    return result.x, result.fun, instrumentation.records
+
+
+def optimize_soil_properties_DE(
+    time: np.ndarray,
+    temperature_data: np.ndarray | pd.DataFrame,
+    variables: list,
+    bounds=((1e5, 1e7), (0.05, 10.0)),
+    popsize: int = 15,
+    maxiter: int = 1000,
+    tol: float = 0.01,
+    seed: int | None = None,
+    polish: bool = True,
+    processes: int | None = None,
+    instrumentation=None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    用差分进化在参数边界内全局搜索 Cv 和 lambda，不依赖初始猜测。
+
+    每一代的整个种群通过 kluitenberg_rmse_batch 一次向量化评估（scipy.optimize.differential_evolution
+    的 vectorized 模式，需要 SciPy >= 1.9），最后用 Nelder-Mead 精化。processes 大于 1 时
+    各数据集在进程池中并行求解。
+
+    输入:
+        time - 时间值 (Numpy 数组)
+        temperature_data - 实测温度，形状 (num_datasets, num_time_points)
+        variables - [r, q, t0]，q 可以为每个数据集一个值的数组
+        bounds - [(Cv_min, Cv_max), (lambda_min, lambda_max)]
+        popsize - 种群规模系数（种群个体数为 popsize * 2）
+        maxiter - 最大代数
+        tol - 种群目标值的相对收敛阈值
+        seed - 随机数种子，各数据集使用由它派生的独立随机数序列
+        polish - 是否在最后用 Nelder-Mead 局部精化
+        processes - 进程数，默认在当前进程中依次求解
+        instrumentation - 可选的 Instrumentation 对象，记录每个数据集的求解统计
+
+    输出:
+        Cv - 每个数据集的体积热容 (J/(m^3·K))
+        lambda_ - 每个数据集的导热系数 (W/(m·K))
+        RMSE - 每个数据集的均方根误差
+    """
+    t = np.asarray(time, dtype=float)
+    temperature_data = np.atleast_2d(np.asarray(temperature_data, dtype=float))
+    num_datasets = temperature_data.shape[0]
+    q_values = np.broadcast_to(np.asarray(variables[1], dtype=float), (num_datasets,))
+    seeds = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(num_datasets)]
+    tasks = [
+        (t, temperature_data[i], [variables[0], q_values[i], variables[2]], bounds, popsize, maxiter, tol,
+         seeds[i], polish, i, instrumentation is not None)
+        for i in range(num_datasets)
+    ]
+
+    if processes is not None and processes > 1 and num_datasets > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(processes, num_datasets)) as executor:
+            results = list(executor.map(_fit_soil_depth_DE, *zip(*tasks)))
+    else:
+        results = [_fit_soil_depth_DE(*task) for task in tasks]
+
+    x = np.array([result[0] for result in results])
+    RMSE = np.array([result[1] for result in results])
+    if instrumentation is not None:
+        for result in results:
+            instrumentation.records.extend(result[2])
+    return x[:, 0], x[:, 1], RMSE
+
+
+def _kluitenberg_log_derivatives(log_Cv, log_lambda, t, r, q, t0, valid):
+    """
+    Kluitenberg 模型的理论温度及其对 ln Cv、ln lambda 的解析导数（按广播规则计算）。
+
+    valid 为 False 的点（如 t <= 0）结果无意义，由调用方屏蔽。
+    """
+    exp1 = _scipy.special().exp1
+
+    cooling = t > t0
+    ratio = np.exp(log_Cv - log_lambda)  # Cv / lambda = 1 / k
+    amplitude = q / (4 * np.pi * np.exp(log_lambda))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        x1 = np.where(valid, r ** 2 * ratio / (4 * np.where(t > 0, t, 1.0)), 1.0)
+        x2 = np.where(valid & cooling, r ** 2 * ratio / (4 * np.where(cooling, t - t0, 1.0)), 1.0)
+    exp_x1 = np.exp(-x1)
+    exp_x2 = np.where(cooling, np.exp(-x2), 0.0)
+    temperature = amplitude * (exp1(x1) - np.where(cooling, exp1(x2), 0.0))
+    # dE1(x)/dx = -exp(-x)/x，dx/dlnCv = x，dx/dln(lambda) = -x
+    d_log_Cv = amplitude * (exp_x2 - exp_x1)
+    d_log_lambda = -temperature - d_log_Cv
+    return temperature, d_log_Cv, d_log_lambda
+
+
+def optimize_soil_properties_joint(
+    time: np.ndarray,
+    temperature_data: np.ndarray | pd.DataFrame,
+    variables: list,
+    initial_guess: list,
+    regularization: float | tuple = 1e-3,
+    penalty: str = 'smooth',
+    tv_epsilon: float = 1e-3,
+    max_nfev: int | None = None,
+    instrumentation=None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    所有深度联合反演 Cv 和 lambda，并对相邻深度的参数差施加平滑或全变差惩罚。
+
+    逐深度独立拟合得到的剖面噪声较大。本函数在 (ln Cv, ln lambda) 空间中一次求解
+    min Σ_i RMSE_i² + Σ_i w·ρ(p_{i+1} - p_i)，
+    其雅可比矩阵只有每个深度自身的 2 列块和相邻深度的带状正则项，
+    以稀疏矩阵交给 scipy.optimize.least_squares（trf + lsmr）求解。
+
+    输入:
+        time - 时间值 (Numpy 数组)
+        temperature_data - 实测温度，形状 (num_datasets, num_time_points)，相邻行为相邻深度
+        variables - [r, q, t0]，q 可以为每个数据集一个值的数组
+        initial_guess - [Cv_初始值, lambda_初始值]，每项可以是标量或每个数据集一个值的数组
+                        （如 optimize_soil_properties_RMSE 的结果）
+        regularization - 正则化系数，标量或 (Cv 系数, lambda 系数)；0 时等价于逐深度独立拟合
+        penalty - 'smooth'：相邻深度差的平方（Tikhonov）；'tv'：全变差 sqrt(d² + eps²)，保留分层界面
+        tv_epsilon - 全变差惩罚的平滑参数 eps
+        max_nfev - 最大函数求值次数，默认为 least_squares 的默认值
+        instrumentation - 可选的 Instrumentation 对象，记录求解统计
+
+    输出:
+        Cv - 每个数据集的体积热容 (J/(m^3·K))
+        lambda_ - 每个数据集的导热系数 (W/(m·K))
+        RMSE - 每个数据集的均方根误差（不含惩罚项）
+    """
+    from scipy.optimize import least_squares
+    from scipy.sparse import csr_matrix
+
+    if penalty not in ('smooth', 'tv'):
+        raise ValueError("penalty必须为'smooth'或'tv'")
+
+    t = np.asarray(time, dtype=float)
+    temperature_data = np.atleast_2d(np.asarray(temperature_data, dtype=float))
+    num_datasets, num_times = temperature_data.shape
+    r, t0 = variables[0], variables[2]
+    q = np.broadcast_to(np.asarray(variables[1], dtype=float), (num_datasets,))[:, np.newaxis]
+    weights = np.sqrt(np.broadcast_to(np.asarray(regularization, dtype=float), (2,)))
+
+    Cv_initial, lambda_initial = np.broadcast_arrays(
+        *(np.broadcast_to(np.asarray(value, dtype=float), (num_datasets,)) for value in initial_guess))
+    x0 = np.log(np.column_stack([Cv_initial, lambda_initial])).ravel()
+
+    # 有效观测：t > 0 且实测值有限；每个深度的残差除以 sqrt(有效点数)，平方和即 RMSE²
+    valid = (t > 0) & np.isfinite(temperature_data)
+    n_valid = valid.sum(axis=1)
+    if np.any(n_valid == 0):
+        raise ValueError("存在没有有效观测的数据集")
+    scale = (1.0 / np.sqrt(n_valid))[:, np.newaxis]
+    measured = np.where(valid, temperature_data, 0.0)
+
+    n_data = num_datasets * num_times
+    n_penalty = 2 * (num_datasets - 1)
+    # 每行恰有 2 个非零元：数据行为 (ln Cv_i, ln lambda_i)，惩罚行为相邻深度的同一参数
+    rows = np.arange(num_datasets)
+    data_columns = np.repeat(2 * rows, num_times)[:, np.newaxis] + np.array([0, 1])
+    pair = (2 * rows[:-1])[:, np.newaxis] + np.array([0, 1])
+    penalty_columns = np.stack([pair, pair + 2], axis=-1).reshape(-1, 2)
+    indices = np.concatenate([data_columns, penalty_columns]).ravel()
+    indptr = np.arange(0, 2 * (n_data + n_penalty) + 1, 2)
+    shape = (n_data + n_penalty, 2 * num_datasets)
+
+    def forward(x):
+        """理论温度及其对 ln Cv、ln lambda 的导数"""
+        return _kluitenberg_log_derivatives(x[0::2, np.newaxis], x[1::2, np.newaxis], t, r, q, t0, valid)
+
+    def differences(x):
+        parameters = x.reshape(num_datasets, 2)
+        return (parameters[1:] - parameters[:-1]).ravel()
+
+    def penalty_terms(d):
+        """惩罚残差及其对 d 的导数"""
+        w = np.tile(weights, num_datasets - 1)
+        if penalty == 'smooth':
+            return w * d, w
+        root = (d ** 2 + tv_epsilon ** 2) ** 0.25
+        return w * root, w * d / (2 * root ** 3)
+
+    def residuals(x):
+        temperature = forward(x)[0]
+        data = np.where(valid, (temperature - measured) * scale, 0.0).ravel()
+        return np.concatenate([data, penalty_terms(differences(x))[0]])
+
+    def jacobian(x):
+        _, d_log_Cv, d_log_lambda = forward(x)
+        data = np.stack([np.where(valid, d_log_Cv * scale, 0.0),
+                         np.where(valid, d_log_lambda * scale, 0.0)], axis=-1).ravel()
+        slope = penalty_terms(differences(x))[1]
+        values = np.concatenate([data, np.stack([-slope, slope], axis=-1).ravel()])
+        return csr_matrix((values, indices, indptr), shape=shape)
+
+    objective = residuals
+    if instrumentation is not None:
+        objective = instrumentation.wrap_objective(residuals)
+        start = perf_counter()
+
+    result = least_squares(objective, x0, jac=jacobian, method='trf', tr_solver='lsmr',
+                           x_scale='jac', max_nfev=max_nfev)
+
+    if instrumentation is not None:
+        instrumentation.record_result('optimize_soil_properties_joint', None, result,
+                                      perf_counter() - start, objective)
+
+    temperature = forward(result.x)[0]
+    RMSE = np.sqrt(np.sum(np.where(valid, temperature - measured, 0.0) ** 2, axis=1) / n_valid)
+    return np.exp(result.x[0::2]), np.exp(result.x[1::2]), RMSE
+
+
 def calc_mositureanddensities_micon(Cv, lamda, vars, soil_density=0.72, fsa=1,calc_method='L-BFGS-B'):
     """
     Calculate water moisture and densities from thermal properties
@@ -214,6 +561,8 @@ def calc_mositureanddensities_micon(Cv, lamda, vars, soil_density=0.72, fsa=1,ca
     water_moisture: numpy array
     densities: numpy array
     """
+    from scipy.optimize import least_squares
+
     Cv = np.array(Cv)
     lamda = np.array(lamda)
     
@@ -253,6 +602,8 @@ def calc_mositureanddensities_micon(Cv, lamda, vars, soil_density=0.72, fsa=1,ca
             densities[i] = np.nan
             water_moisture[i] = np.nan
 
+    return water_moisture, densities
+
 # 计算平均电压
 def estimate_avg_power(U0, Ut, I, T=120):
     k = 5 / T  # or tune based on observed heating dynamics
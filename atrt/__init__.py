@@ -12,11 +12,118 @@ Author: 王丰源
 Email: wfy22500@smail.nju.edu.cn
 """
 
+import importlib
+
 __version__ = "0.1.0"
 __author__ = "王丰源"
 __email__ = "wfy22500@smail.nju.edu.cn"
 
-# 延迟导入以避免依赖问题
+# 公开API与所在子模块的对应关系。
+# 子模块在首次访问对应属性时才导入，`import atrt` 本身不加载 numpy/scipy/matplotlib，
+# 便于大量短生命周期的进程池工作进程快速启动。
+_LAZY_ATTRIBUTES = {
+    # DTS数据处理
+    "DtsDataProcessing": "dts_dataprocessing",
+    # 压缩归档
+    "DtsArchive": "archive",
+    "write_dts_archive": "archive",
+    # 去噪
+    "StreamingDenoiser": "filters",
+    "denoise_temperature": "filters",
+    # DTPM计算
+    "NFM_Kluitenberg": "DTPM_calcfunc",
+    "calc_temp": "DTPM_calcfunc",
+    "optimize_soil_properties_RMSE": "DTPM_calcfunc",
+    "optimize_soil_properties_joint": "DTPM_calcfunc",
+    "optimize_soil_properties_DE": "DTPM_calcfunc",
+    "calc_mositureanddensities_micon": "DTPM_calcfunc",
+    "estimate_avg_power": "DTPM_calcfunc",
+    # 热导率分析
+    "find_nearest_index": "thermal_conductivity_function",
+    "corrected_power_per_meter": "thermal_conductivity_function",
+    "corrected_power_matrix": "thermal_conductivity_function",
+    "calculate_thermal_conductivity": "thermal_conductivity_function",
+    "scan_thermal_conductivity_windows": "thermal_conductivity_function",
+    "plot_thermal_conductivity_fit": "thermal_conductivity_function",
+    "temperature_response": "thermal_conductivity_function",
+    "CLHS_RMSE": "thermal_conductivity_function",
+    "optimize_CLHS_parameters": "thermal_conductivity_function",
+    # 地下水流速
+    "calc_rmse_std": "flowrate_function",
+    "optimize_parameters_GD": "flowrate_function",
+    "optimize_parameters_SA": "flowrate_function",
+    "optimize_parameters_DE": "flowrate_function",
+    "optimize_parameters_batch": "flowrate_function",
+    "compute_temperature": "flowrate_function",
+    "leaky_well_function": "flowrate_function",
+    "calculate_flow_rate": "flowrate_function",
+    # 不确定性估计
+    "bootstrap_thermal_conductivity": "uncertainty",
+    "bootstrap_soil_properties": "uncertainty",
+    "bootstrap_flow_parameters": "uncertainty",
+    # 变功率叠加模型
+    "superpose_step_response": "superposition",
+    "temperature_response_variable_power": "superposition",
+    "calc_temp_variable_power": "superposition",
+    "compute_temperature_variable_power": "superposition",
+    # 批量出图
+    "collect_fit_results": "report",
+    "ThermalConductivityFitRenderer": "report",
+    "render_thermal_conductivity_reports": "report",
+    # 求解统计
+    "Instrumentation": "instrumentation",
+    # 检查点与续算
+    "Checkpoint": "checkpoint",
+    # 结果缓存
+    "ResultCache": "cache",
+    # 计算后端
+    "set_kernel_backend": "kernels",
+    "get_kernel_backend": "kernels",
+    # 拟合上下文
+    "FitContext": "fit_context",
+    # 流式分析流程
+    "AnalysisPipeline": "pipeline",
+    # 监测目录数据接入
+    "DtsDirectoryWatcher": "watcher",
+}
+
+_SUBMODULES = {
+    "dts_dataprocessing",
+    "DTPM_calcfunc",
+    "thermal_conductivity_function",
+    "flowrate_function",
+    "superposition",
+    "report",
+    "synthetic",
+    "instrumentation",
+    "pipeline",
+    "checkpoint",
+    "cache",
+    "kernels",
+    "fit_context",
+    "watcher",
+    "filters",
+    "uncertainty",
+    "archive",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value  # 缓存，之后的访问不再经过 __getattr__
+        return value
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | _SUBMODULES)
+
+
+# 保留原有的获取函数，兼容旧代码
 def get_dts_data_processing():
     """获取DtsDataProcessing类"""
     from .dts_dataprocessing import DtsDataProcessing
@@ -40,36 +147,11 @@ def get_flow_functions():
     from .flowrate_function import calc_rmse_std
     return calc_rmse_std
 
-# 尝试直接导入，如果失败则提供获取函数
-try:
-    from .dts_dataprocessing import DtsDataProcessing
-    from .DTPM_calcfunc import NFM_Kluitenberg
-    from .thermal_conductivity_function import (
-        find_nearest_index,
-        corrected_power_per_meter
-    )
-    from .flowrate_function import calc_rmse_std
-    
-    # 定义公开的API
-    __all__ = [
-        "DtsDataProcessing",
-        "NFM_Kluitenberg", 
-        "find_nearest_index",
-        "corrected_power_per_meter",
-        "calc_rmse_std",
-        "get_dts_data_processing",
-        "get_nfm_kluitenberg", 
-        "get_thermal_functions",
-        "get_flow_functions"
-    ]
-    
-except ImportError as e:
-    # 如果直接导入失败，只导出获取函数
-    __all__ = [
-        "get_dts_data_processing",
-        "get_nfm_kluitenberg", 
-        "get_thermal_functions",
-        "get_flow_functions"
-    ]
-    import warnings
-    warnings.warn(f"部分模块导入失败: {e}，请使用get_*函数来获取相应功能", ImportWarning)
\ No newline at end of file
+
+# 定义公开的API
+__all__ = list(_LAZY_ATTRIBUTES) + [
+    "get_dts_data_processing",
+    "get_nfm_kluitenberg",
+    "get_thermal_functions",
+    "get_flow_functions",
+]
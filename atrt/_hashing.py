@@ -0,0 +1,58 @@
+"""
+输入数据的快速哈希（内部使用）
+
+对数组、pandas 对象、标量及其嵌套的列表/元组/字典计算稳定的摘要，
+用于判断两次计算的输入是否相同（检查点续算、结果缓存）。
+"""
+import hashlib
+
+import numpy as np
+
+
+def _update(digest, obj):
+    if obj is None:
+        digest.update(b'N')
+    elif isinstance(obj, (bool, np.bool_)):
+        digest.update(b'B1' if obj else b'B0')
+    elif isinstance(obj, str):
+        digest.update(b'S' + obj.encode('utf-8') + b'\0')
+    elif isinstance(obj, bytes):
+        digest.update(b'Y' + len(obj).to_bytes(8, 'little') + obj)
+    elif isinstance(obj, (int, float, complex, np.number)):
+        # 数值统一转换为 float64 数组，保证 1 与 1.0、np.float64(1) 的哈希相同
+        _update(digest, np.asarray(obj, dtype=np.result_type(obj, np.float64)))
+    elif isinstance(obj, dict):
+        digest.update(b'D' + len(obj).to_bytes(8, 'little'))
+        for key in sorted(obj, key=repr):
+            _update(digest, key)
+            _update(digest, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'L' + len(obj).to_bytes(8, 'little'))
+        for item in obj:
+            _update(digest, item)
+    elif hasattr(obj, 'to_numpy'):
+        # pandas 对象：只哈希数值内容
+        _update(digest, obj.to_numpy())
+    else:
+        array = np.asarray(obj)
+        if array.dtype == object:
+            # repr 可能包含内存地址（如 numpy Generator），不能作为稳定的摘要
+            raise TypeError(f"无法计算 {type(obj).__name__} 对象的稳定哈希")
+        if array.dtype.kind in 'iub':
+            array = array.astype(np.float64)
+        array = np.ascontiguousarray(array)
+        digest.update(b'A' + str(array.dtype).encode() + str(array.shape).encode())
+        digest.update(memoryview(array).cast('B'))
+
+
+def hash_inputs(*objects):
+    """
+    计算输入的摘要。
+
+    :param objects: 任意数量的数组、标量、字符串及其嵌套的列表/元组/字典
+    :return: 32 位十六进制字符串
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for obj in objects:
+        _update(digest, obj)
+    return digest.hexdigest()
@@ -0,0 +1,22 @@
+"""
+延迟导入的 SciPy 子模块
+
+导入 atrt 时不加载 SciPy。目标函数和正演模型在每次求值时都要取得 scipy.special /
+scipy.integrate 中的函数，函数内的 from-import 每次都要经过导入机制（约 0.7 µs）；
+这里的访问函数只在第一次调用时导入，之后直接返回缓存的模块（约 0.15 µs）。
+"""
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def special():
+    """返回 scipy.special 模块"""
+    import scipy.special
+    return scipy.special
+
+
+@functools.lru_cache(maxsize=None)
+def integrate():
+    """返回 scipy.integrate 模块"""
+    import scipy.integrate
+    return scipy.integrate
@@ -0,0 +1,124 @@
+"""
+批量非线性最小二乘求解器（内部使用）
+
+对 B 个相互独立的小规模最小二乘问题同时执行 Levenberg-Marquardt 迭代，
+每次迭代只调用一次向量化的残差/雅可比函数，避免逐个深度的 Python 循环。
+"""
+import numpy as np
+
+
+def batched_levenberg_marquardt(residual_jacobian, p0, max_iter=200, tol=1e-12,
+                                damping=1e-3):
+    """
+    批量 Levenberg-Marquardt 求解。
+
+    Parameters:
+    -----------
+    residual_jacobian : callable
+        residual_jacobian(p, rows) -> (residuals, jacobian)。rows 为参与计算的
+        问题编号（整数数组），p 为对应的参数，形状为 (len(rows), m)；
+        residuals 形状为 (len(rows), n)，jacobian 形状为 (len(rows), n, m)。
+        无效数据点应返回 0 残差和 0 雅可比。
+    p0 : array_like
+        初始参数，形状为 (B, m)
+    max_iter : int, optional
+        最大迭代次数，默认为 200
+    tol : float, optional
+        相对代价下降的收敛阈值，默认为 1e-12
+    damping : float, optional
+        初始阻尼系数，默认为 1e-3
+
+    Returns:
+    --------
+    dict
+        - x : array, (B, m)  最优参数
+        - cost : array, (B,)  残差平方和
+        - jacobian : array, (B, n, m)  最优参数处的雅可比矩阵
+        - nit : array, (B,)  迭代次数
+        - converged : array, (B,)  是否收敛
+    """
+    p = np.array(p0, dtype=float)
+    n_batch, n_params = p.shape
+
+    residuals, jacobian = residual_jacobian(p, np.arange(n_batch))
+    residuals, jacobian = np.array(residuals, dtype=float), np.array(jacobian, dtype=float)
+    cost = np.sum(residuals**2, axis=1)
+    mu = np.full(n_batch, damping)
+    nit = np.zeros(n_batch, dtype=int)
+    active = np.isfinite(cost)
+    converged = np.zeros(n_batch, dtype=bool)
+    identity = np.eye(n_params)
+
+    for _ in range(max_iter):
+        if not np.any(active):
+            break
+
+        idx = np.flatnonzero(active)
+        J = jacobian[idx]
+        A = np.einsum('bni,bnj->bij', J, J)
+        g = np.einsum('bni,bn->bi', J, residuals[idx])
+        diag = np.einsum('bii->bi', A)
+        diag = np.where(diag > 0, diag, 1.0)
+        A_damped = A + mu[idx, None, None] * diag[:, :, None] * identity
+
+        try:
+            step = -np.linalg.solve(A_damped, g[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            step = -np.einsum('bij,bj->bi', np.linalg.pinv(A_damped), g)
+
+        p_trial = p.copy()
+        p_trial[idx] += step
+        trial_residuals, trial_jacobian = residual_jacobian(p_trial[idx], idx)
+        trial_cost = np.sum(trial_residuals**2, axis=1)
+
+        accept = np.isfinite(trial_cost) & (trial_cost <= cost[idx])
+        accepted = idx[accept]
+        rejected = idx[~accept]
+        nit[idx] += 1
+
+        # 相对代价下降足够小时视为收敛
+        improvement = cost[accepted] - trial_cost[accept]
+        done = improvement <= tol * np.maximum(cost[accepted], np.finfo(float).tiny)
+
+        p[accepted] = p_trial[accepted]
+        residuals[accepted] = trial_residuals[accept]
+        jacobian[accepted] = trial_jacobian[accept]
+        cost[accepted] = trial_cost[accept]
+        mu[accepted] = np.maximum(mu[accepted] / 10, 1e-15)
+        mu[rejected] *= 10
+
+        converged[accepted[done]] = True
+        active[accepted[done]] = False
+        # 阻尼过大说明已无法继续下降
+        stalled = rejected[mu[rejected] > 1e15]
+        converged[stalled] = True
+        active[stalled] = False
+
+    return {
+        'x': p,
+        'cost': cost,
+        'jacobian': jacobian,
+        'nit': nit,
+        'converged': converged,
+    }
+
+
+def parameter_covariance(jacobian, cost, n_observations):
+    """
+    根据雅可比矩阵和残差平方和估计参数协方差（与 curve_fit 的默认做法一致）。
+
+    Parameters:
+    -----------
+    jacobian : array, (B, n, m)
+    cost : array, (B,)
+    n_observations : array, (B,)
+        每个问题的有效观测点数
+
+    Returns:
+    --------
+    array, (B, m, m)
+    """
+    n_params = jacobian.shape[-1]
+    A = np.einsum('bni,bnj->bij', jacobian, jacobian)
+    dof = np.maximum(np.asarray(n_observations) - n_params, 1)
+    return np.linalg.pinv(A) * (cost / dof)[:, None, None]
@@ -0,0 +1,249 @@
+"""
+DTS 长期记录的压缩归档格式
+
+DTS 温度的有效分辨率约 0.01 °C，以 float64 或 CSV 文本保存的体积远大于其信息量。
+本模块把温度矩阵按分辨率量化为 int16（块内超出范围时为 int32），在每个 深度×时间 块内
+沿时间做差分编码（块的第一列保存原值，因此每块可独立解码），按字节重排后用标准库的
+zlib / lzma / bz2 压缩。块的位置记录在文件末尾的索引中，读取一个加热时间窗口时只解压
+与之重叠的块。
+
+文件结构：MAGIC | 压缩块 ... | 时间 | 深度 | JSON 索引 | 索引长度 (uint64) | MAGIC
+
+量化是有损的：还原值与原值之差不超过 resolution / 2；NaN 原样保留。
+
+示例:
+    write_dts_archive('well1.atrt', processor, resolution=0.01)
+    archive = DtsArchive('well1.atrt')
+    window = archive.load('2024/01/01 10:00:00', '2024/01/02 10:00:00')   # DtsDataProcessing
+"""
+import bz2
+import json
+import lzma
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b'ATRTDTS1'
+FORMAT_VERSION = 1
+TIME_FORMAT = '%Y/%m/%d %H:%M:%S'
+
+_CODECS = {
+    'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+    'bz2': (lambda data, level: bz2.compress(data, max(level, 1)), bz2.decompress),
+    'none': (lambda data, level: data, bytes),
+}
+_FOOTER = struct.Struct('<Q')
+
+
+def _shuffle(values):
+    """按字节重排（所有元素的低字节在前），提高差分后小整数的压缩率"""
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, count):
+    dtype = np.dtype(dtype)
+    shuffled = np.frombuffer(data, np.uint8, count * dtype.itemsize).reshape(dtype.itemsize, count)
+    return shuffled.T.copy().view(dtype).ravel()
+
+
+def _encode_chunk(block, resolution, compress):
+    """
+    量化、沿时间差分并压缩一个块，返回 (压缩数据, 是否含 NaN, 整数字节数)。
+
+    量化值的绝对值不超过 16383 时相邻值之差一定在 int16 范围内，使用 int16，否则使用 int32。
+    含 NaN 时在末尾附加按位打包的掩码。
+    """
+    missing = np.isnan(block)
+    has_missing = bool(missing.any())
+    quantized = np.rint(np.where(missing, 0.0, block) / resolution).astype(np.int64)
+    if has_missing:
+        # NaN 处取前一个值，使差分保持为小整数
+        index = np.where(missing, 0, np.arange(block.shape[1]))
+        np.maximum.accumulate(index, axis=1, out=index)
+        quantized = np.take_along_axis(quantized, index, axis=1)
+    dtype = np.dtype('<i2') if np.max(np.abs(quantized), initial=0) <= 16383 else np.dtype('<i4')
+    deltas = quantized.copy()
+    deltas[:, 1:] = np.diff(quantized, axis=1)
+    payload = _shuffle(np.ascontiguousarray(deltas, dtype=dtype).ravel())
+    if has_missing:
+        payload += np.packbits(missing.ravel()).tobytes()
+    return compress(payload), has_missing, dtype.itemsize
+
+
+def write_dts_archive(path, processor, resolution=0.01, chunk_shape=(256, 1024), codec='zlib', level=6):
+    """
+    把 DtsDataProcessing 的记录写入归档文件（先写临时文件再原子替换）。
+
+    :param path: 输出文件路径
+    :param processor: DtsDataProcessing 对象，temp 可以是 np.memmap
+    :param resolution: 量化分辨率 (°C)
+    :param chunk_shape: 块大小 (深度点数, 时间点数)，读取窗口时以块为单位解压
+    :param codec: 'zlib'、'lzma'、'bz2' 或 'none'
+    :param level: 压缩级别
+    :return: 写入的字节数
+    """
+    if codec not in _CODECS:
+        raise ValueError(f"未知的压缩方式: {codec!r}")
+    if resolution <= 0:
+        raise ValueError("resolution必须大于0")
+    compress = lambda data: _CODECS[codec][0](data, level)
+    temp = processor.temp
+    n_depths, n_time = temp.shape
+    depth_chunk, time_chunk = (int(size) for size in chunk_shape)
+
+    path = os.fspath(path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            chunks = []
+            for d0 in range(0, n_depths, depth_chunk):
+                row = []
+                for t0 in range(0, n_time, time_chunk):
+                    block = np.asarray(temp[d0:d0 + depth_chunk, t0:t0 + time_chunk], dtype=np.float64)
+                    data, has_missing, itemsize = _encode_chunk(block, resolution, compress)
+                    row.append([f.tell(), len(data), has_missing, itemsize])
+                    f.write(data)
+                chunks.append(row)
+
+            axes = {}
+            time = np.asarray(processor.time, dtype='datetime64[ns]').view(np.int64)
+            for name, values in (('time', np.ascontiguousarray(time, dtype='<i8')),
+                                 ('depth', np.ascontiguousarray(processor.depth, dtype='<f8'))):
+                data = zlib.compress(values.tobytes())
+                axes[name] = [f.tell(), len(data)]
+                f.write(data)
+
+            index = json.dumps({
+                'version': FORMAT_VERSION,
+                'shape': [n_depths, n_time],
+                'chunk_shape': [depth_chunk, time_chunk],
+                'resolution': resolution,
+                'codec': codec,
+                'chunks': chunks,
+                'axes': axes,
+            }).encode()
+            f.write(index)
+            f.write(_FOOTER.pack(len(index)))
+            f.write(MAGIC)
+            size = f.tell()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size
+
+
+class DtsArchive:
+    """
+    以块为单位随机读取的 DTS 归档。
+
+    打开时只读取索引、时间轴和深度轴；read / load 只解压与请求范围重叠的块。
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} 不是 DTS 归档文件")
+            f.seek(-(len(MAGIC) + _FOOTER.size), os.SEEK_END)
+            (index_length,) = _FOOTER.unpack(f.read(_FOOTER.size))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} 不完整")
+            f.seek(-(len(MAGIC) + _FOOTER.size + index_length), os.SEEK_END)
+            index = json.loads(f.read(index_length))
+            if index['version'] > FORMAT_VERSION:
+                raise ValueError(f"不支持的归档版本: {index['version']}")
+
+            axes = {}
+            for name, dtype in (('time', '<i8'), ('depth', '<f8')):
+                offset, length = index['axes'][name]
+                f.seek(offset)
+                axes[name] = np.frombuffer(zlib.decompress(f.read(length)), dtype)
+
+        self.shape = tuple(index['shape'])
+        self.chunk_shape = tuple(index['chunk_shape'])
+        self.resolution = index['resolution']
+        self.codec = index['codec']
+        self._chunks = index['chunks']
+        self._decompress = _CODECS[self.codec][1]
+        self.time = pd.DatetimeIndex(axes['time'].astype('datetime64[ns]'))
+        self.depth = axes['depth'].astype(np.float64)
+
+    def _decode_chunk(self, f, i, j):
+        """解压第 (i, j) 块，返回温度 (°C)"""
+        offset, length, has_missing, itemsize = self._chunks[i][j]
+        dtype = np.dtype(f'<i{itemsize}')
+        rows = min(self.chunk_shape[0], self.shape[0] - i * self.chunk_shape[0])
+        columns = min(self.chunk_shape[1], self.shape[1] - j * self.chunk_shape[1])
+        f.seek(offset)
+        payload = self._decompress(f.read(length))
+        count = rows * columns
+        deltas = _unshuffle(payload, dtype, count).reshape(rows, columns)
+        block = np.cumsum(deltas, axis=1, dtype=np.int64) * self.resolution
+        if has_missing:
+            missing = np.unpackbits(np.frombuffer(payload, np.uint8, offset=count * itemsize),
+                                    count=count).reshape(rows, columns)
+            block[missing.astype(bool)] = np.nan
+        return block
+
+    def read(self, depth=slice(None), time=slice(None)):
+        """
+        读取温度矩阵的一个矩形区域。
+
+        :param depth: 深度索引的切片（步长为 1）
+        :param time: 时间索引的切片（步长为 1）
+        :return: 温度数组 (n_depths, n_time)
+        """
+        d_start, d_stop, d_step = depth.indices(self.shape[0])
+        t_start, t_stop, t_step = time.indices(self.shape[1])
+        if d_step != 1 or t_step != 1:
+            raise ValueError("只支持步长为1的切片")
+        out = np.empty((max(d_stop - d_start, 0), max(t_stop - t_start, 0)))
+        if out.size == 0:
+            return out
+
+        depth_chunk, time_chunk = self.chunk_shape
+        with open(self.path, 'rb') as f:
+            for i in range(d_start // depth_chunk, (d_stop - 1) // depth_chunk + 1):
+                for j in range(t_start // time_chunk, (t_stop - 1) // time_chunk + 1):
+                    block = self._decode_chunk(f, i, j)
+                    d0, t0 = i * depth_chunk, j * time_chunk
+                    d_lo, d_hi = max(d_start, d0), min(d_stop, d0 + block.shape[0])
+                    t_lo, t_hi = max(t_start, t0), min(t_stop, t0 + block.shape[1])
+                    out[d_lo - d_start:d_hi - d_start, t_lo - t_start:t_hi - t_start] = \
+                        block[d_lo - d0:d_hi - d0, t_lo - t0:t_hi - t0]
+        return out
+
+    def time_slice(self, start_str=None, end_str=None):
+        """返回时间在 [start_str, end_str] 内的时间索引切片"""
+        start = 0 if start_str is None else \
+            self.time.searchsorted(pd.to_datetime(start_str, format=TIME_FORMAT), side='left')
+        stop = len(self.time) if end_str is None else \
+            self.time.searchsorted(pd.to_datetime(end_str, format=TIME_FORMAT), side='right')
+        return slice(int(start), int(stop))
+
+    def load(self, start_str=None, end_str=None, before_minutes=1.0):
+        """
+        读取一个时间窗口（全部深度）为 DtsDataProcessing 对象。
+
+        窗口向前多取 before_minutes 分钟，供 extraction_heating_data 计算加热前的自然温度；
+        深度索引与原记录相同，可直接用于 AnalysisPipeline.run_event。
+
+        :param start_str: 开始时间 'YYYY/MM/DD HH:MM:SS'，None 表示记录开头
+        :param end_str: 结束时间，None 表示记录结尾
+        :param before_minutes: 向前多取的分钟数
+        """
+        from .dts_dataprocessing import DtsDataProcessing
+
+        if start_str is not None and before_minutes:
+            start = pd.to_datetime(start_str, format=TIME_FORMAT) - pd.Timedelta(minutes=before_minutes)
+            start_str = start.strftime(TIME_FORMAT)
+        window = self.time_slice(start_str, end_str)
+        return DtsDataProcessing.from_arrays(self.time[window], self.depth, self.read(time=window))
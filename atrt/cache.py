@@ -0,0 +1,186 @@
+"""
+拟合结果的磁盘缓存
+
+以输入数据（温度序列、时间、模型参数、求解器选项）的哈希为键，把拟合结果保存为
+缓存目录中的 npz 文件。重复运行相同的分析时直接读取结果，不再重新优化。
+缓存总大小超过上限时，按最近使用时间（文件修改时间）淘汰最旧的条目。
+
+optimize_soil_properties_RMSE、calculate_thermal_conductivity、optimize_parameters_GD、
+optimize_parameters_SA、optimize_parameters_batch 和 AnalysisPipeline 均接受 cache 参数，
+可传入 ResultCache 对象或缓存目录路径。
+
+示例:
+    cache = ResultCache('~/.cache/atrt', max_bytes=512 * 2**20)
+    Cv, lambda_, RMSE = optimize_soil_properties_RMSE(time, data, variables, x0, cache=cache)
+    cache.hits, cache.misses
+
+条目键包含缓存格式版本 CACHE_FORMAT 和包版本，拟合实现或保存的结果布局改变后
+旧条目不会再被命中（由大小上限逐渐淘汰）。
+
+注意：模拟退火的结果带有随机性，命中缓存时返回的是第一次计算的结果。
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from . import __version__
+from ._hashing import hash_inputs
+
+# 缓存格式版本：拟合函数的算法或保存的结果名称/布局改变时递增
+CACHE_FORMAT = 1
+
+
+class ResultCache:
+    """
+    内容寻址的拟合结果缓存。
+
+    每个条目一个文件，写入先写临时文件再原子替换，多个进程可以共用同一目录。
+    对象只保存目录和大小上限，可以被序列化传给进程池工作进程。
+    """
+
+    def __init__(self, directory, max_bytes=256 * 2**20):
+        """
+        :param directory: 缓存目录，不存在时自动创建
+        :param max_bytes: 缓存总大小上限（字节），None 表示不限制
+        """
+        self.directory = os.path.abspath(os.path.expanduser(os.fspath(directory)))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_size'] = None
+        return state
+
+    def key(self, namespace, *inputs):
+        """由函数名、缓存格式版本、包版本和全部输入计算条目键"""
+        return f"{namespace}-v{CACHE_FORMAT}-{hash_inputs(namespace, CACHE_FORMAT, __version__, *inputs)}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """
+        读取条目。
+
+        :return: 名称到数组的字典，未命中时返回 None
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                values = {name: data[name] for name in data.files}
+        except (FileNotFoundError, OSError, ValueError):
+            # 不存在、已被其他进程淘汰或文件损坏，均视为未命中
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # 更新最近使用时间
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return values
+
+    def put(self, key, **values):
+        """写入条目，超过大小上限时淘汰最旧的条目"""
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **{name: np.asarray(value) for name, value in values.items()})
+            size = os.path.getsize(tmp_path)
+            # 覆盖已有条目时只增加两者大小之差
+            try:
+                size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self.max_bytes is not None:
+            if self._size is None:
+                self._size = self.size_bytes
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.npz'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    @property
+    def size_bytes(self):
+        """缓存当前占用的字节数"""
+        return sum(size for _, size, _ in self._entries())
+
+    def __len__(self):
+        return len(self._entries())
+
+    def evict(self, max_bytes=None):
+        """按最近使用时间淘汰条目，直到总大小不超过上限"""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if limit is None or total <= limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        """删除所有条目"""
+        self.evict(max_bytes=0)
+
+
+def as_result_cache(cache):
+    """把 cache 参数（None、ResultCache 或目录路径）转换为 ResultCache 或 None"""
+    if cache is None or isinstance(cache, ResultCache):
+        return cache
+    return ResultCache(cache)
+
+
+def cached_call(cache, namespace, inputs, compute, names, on_hit=None):
+    """
+    带缓存地执行计算。
+
+    :param cache: ResultCache 或 None
+    :param namespace: 条目键的前缀（通常为函数名）
+    :param inputs: 决定结果的全部输入（参与哈希）
+    :param compute: 无参数函数，返回与 names 对应的结果元组
+    :param names: 结果各元素的名称
+    :param on_hit: 可选，命中缓存时以结果元组调用（如记录插桩）
+    :return: 结果元组；命中缓存时标量以 numpy 标量返回
+    """
+    if cache is None:
+        return compute()
+    key = cache.key(namespace, *inputs)
+    values = cache.get(key)
+    if values is not None:
+        result = tuple(values[name][()] if values[name].ndim == 0 else values[name]
+                       for name in names)
+        if on_hit is not None:
+            on_hit(result)
+        return result
+    result = compute()
+    cache.put(key, **dict(zip(names, result)))
+    return result
@@ -0,0 +1,130 @@
+"""
+长时间反演的检查点与续算
+
+逐深度的反演（optimize_soil_properties_RMSE、optimize_parameters_batch）
+可传入 checkpoint 文件路径：已完成深度的结果和正在计算深度的当前最优解
+会定期以原子方式（先写临时文件再替换）保存为 npz 文件。
+进程崩溃或被抢占后，用相同的输入重新运行即可跳过已完成的深度，
+并从中断深度保存的最优解继续搜索。
+"""
+import os
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+
+class Checkpoint:
+    """
+    逐项（深度）结果的检查点文件。
+
+    文件中保存输入指纹，只有指纹相同时才会续算；指纹不同时拒绝覆盖，
+    以免误删其他计算的结果。
+    """
+
+    def __init__(self, path, n_items, fingerprint, interval=60.0):
+        """
+        :param path: 检查点文件路径（.npz）
+        :param n_items: 总项数（深度数）
+        :param fingerprint: 输入指纹，通常由 hash_inputs 计算
+        :param interval: 两次自动保存之间的最短间隔（秒），0 表示每次更新都保存
+        """
+        self.path = os.fspath(path)
+        self.n_items = int(n_items)
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.done = np.zeros(self.n_items, dtype=bool)
+        self.values = {}
+        self.partial_index = -1
+        self.partial_x = None
+        self._last_save = perf_counter()
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            stored = str(data['__fingerprint__'])
+            if stored != self.fingerprint or int(data['__n_items__']) != self.n_items:
+                raise ValueError(
+                    f"检查点文件 {self.path} 对应的输入与本次计算不同，"
+                    "请删除该文件或使用其他路径"
+                )
+            self.done = data['__done__'].astype(bool)
+            self.partial_index = int(data['__partial_index__'])
+            if self.partial_index >= 0:
+                self.partial_x = data['__partial_x__']
+            for key in data.files:
+                if not key.startswith('__'):
+                    self.values[key] = data[key]
+
+    @property
+    def n_done(self):
+        """已完成的项数"""
+        return int(self.done.sum())
+
+    def is_done(self, index):
+        return bool(self.done[index])
+
+    def get(self, name, index):
+        """读取已完成项的结果"""
+        return self.values[name][index]
+
+    def partial_state(self, index):
+        """返回中断时该项保存的当前最优解，没有时返回 None"""
+        if index == self.partial_index and self.partial_x is not None:
+            return np.array(self.partial_x)
+        return None
+
+    def set_partial(self, index, x):
+        """记录正在计算项的当前最优解"""
+        self.partial_index = int(index)
+        self.partial_x = np.array(x, dtype=float)
+        self._dirty = True
+        self.maybe_save()
+
+    def complete(self, index, **values):
+        """记录一项的最终结果"""
+        for name, value in values.items():
+            value = np.asarray(value, dtype=float)
+            if name not in self.values:
+                self.values[name] = np.full((self.n_items,) + value.shape, np.nan)
+            self.values[name][index] = value
+        self.done[index] = True
+        if self.partial_index == index:
+            self.partial_index, self.partial_x = -1, None
+        self._dirty = True
+        self.maybe_save()
+
+    def maybe_save(self):
+        """距上次保存超过 interval 时保存"""
+        if self._dirty and perf_counter() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        """原子地写入检查点文件"""
+        arrays = {
+            '__fingerprint__': np.array(self.fingerprint),
+            '__n_items__': np.array(self.n_items),
+            '__done__': self.done,
+            '__partial_index__': np.array(self.partial_index),
+            '__partial_x__': np.zeros(0) if self.partial_x is None else self.partial_x,
+        }
+        arrays.update(self.values)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._last_save = perf_counter()
+        self._dirty = False
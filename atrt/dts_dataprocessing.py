@@ -14,16 +14,217 @@ class DtsDataProcessing:
         self.time = pd.to_datetime(data.columns[1:])
         self.depth = data.iloc[1:, 0].astype(np.float64).to_numpy()
         self.temp = data.iloc[1:, 1:].astype(np.float64).to_numpy()
+        self._temp_buffer = self.temp
+
+    @classmethod
+    def from_files(cls, paths, max_workers=8, sep=','):
+        """
+        Load a measurement campaign stored as many export files.
+
+        Files are read concurrently in a thread pool and their columns are
+        written straight into one preallocated temperature matrix, so the
+        campaign is never concatenated as DataFrames. A first pass reads only
+        the header line of each file to build the sorted, de-duplicated time
+        axis; when a timestamp appears more than once the column from the
+        earliest file in ``paths`` (and the leftmost within that file) is
+        kept. ``self.data`` is None for a record created this way.
+
+        Parameters:
+        -----------
+        paths : iterable of str
+            CSV files in the constructor's table layout (first column depth,
+            remaining column labels timestamps).
+        max_workers : int, optional
+            Number of reader threads. At most this many files are held in
+            memory at once.
+        sep : str, optional
+            Field delimiter.
+
+        Returns:
+        --------
+        DtsDataProcessing
+
+        Raises:
+        -------
+        ValueError
+            If no paths are given or the files' depth axes differ.
+        """
+        import csv
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        paths = list(paths)
+        if not paths:
+            raise ValueError("No files to load")
+
+        def read_header(path):
+            with open(path, newline='') as f:
+                return next(csv.reader(f, delimiter=sep))[1:]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            headers = list(executor.map(read_header, paths))
+
+            # Destination column of every source column; duplicates keep the first occurrence
+            stamps = pd.to_datetime(np.concatenate(headers)).to_numpy()
+            time, first, inverse = np.unique(stamps, return_index=True, return_inverse=True)
+            owner = np.zeros(len(stamps), dtype=bool)
+            owner[first] = True
+            bounds = np.cumsum([0] + [len(header) for header in headers])
+
+            # The matrix is allocated once the first file reveals the depth axis
+            record = {}
+            lock = threading.Lock()
+
+            def load(k):
+                frame = pd.read_csv(paths[k], sep=sep)
+                depth = frame.iloc[1:, 0].astype(np.float64).to_numpy()
+                with lock:
+                    if not record:
+                        record['depth'] = depth
+                        record['temp'] = np.empty((len(depth), len(time)))
+                reference = record['depth']
+                if depth.shape != reference.shape or not np.allclose(depth, reference):
+                    raise ValueError(f"Depth axis of {paths[k]} does not match the other files")
+                keep = owner[bounds[k]:bounds[k + 1]]
+                record['temp'][:, inverse[bounds[k]:bounds[k + 1]][keep]] = \
+                    frame.iloc[1:, np.flatnonzero(keep) + 1].to_numpy(dtype=np.float64)
+
+            for _ in executor.map(load, range(len(paths))):
+                pass
+
+        return cls.from_arrays(pd.DatetimeIndex(time), record['depth'], record['temp'])
+
+    @classmethod
+    def from_arrays(cls, time, depth, temp):
+        """
+        Create a record from a time index, depth axis and temperature matrix.
+
+        ``temp`` (n_depths, n_time) is used without copying; ``self.data`` is None.
+        """
+        self = cls.__new__(cls)
+        self.data = None
+        self.time = pd.DatetimeIndex(time)
+        self.depth = np.asarray(depth, dtype=np.float64)
+        self.temp = temp
+        self._temp_buffer = temp
+        if temp.shape != (len(self.depth), len(self.time)):
+            raise ValueError("temp must have shape (len(depth), len(time))")
+        return self
+
+    @classmethod
+    def from_archive(cls, path, start_str=None, end_str=None, before_minutes=1.0):
+        """
+        Load a time window (all depths) from an archive written by to_archive.
+
+        Only the compressed chunks overlapping the window are decoded; see
+        atrt.archive.DtsArchive.load.
+        """
+        from .archive import DtsArchive
+
+        return DtsArchive(path).load(start_str, end_str, before_minutes)
+
+    def to_archive(self, path, resolution=0.01, chunk_shape=(256, 1024), codec='zlib', level=6):
+        """
+        Write the record to a quantized, chunk-compressed archive file.
+
+        Temperatures are stored to within ``resolution / 2``; see
+        atrt.archive.write_dts_archive for the parameters.
+
+        Returns:
+        --------
+        int
+            Size of the archive in bytes.
+        """
+        from .archive import write_dts_archive
+
+        return write_dts_archive(path, self, resolution, chunk_shape, codec, level)
+
+    def append(self, data):
+        """
+        Append newly recorded time columns to the in-memory record.
+
+        The temperature matrix grows through an over-allocated buffer, so
+        appending files in time order costs amortized O(new columns) instead
+        of copying the whole record each time. Out-of-order columns are merged
+        by sorting; timestamps already present are ignored. ``self.data``
+        keeps referring to the table the object was created from.
+
+        Parameters:
+        -----------
+        data : pd.DataFrame
+            New DTS data in the same layout as the constructor input (first
+            column depth, remaining column labels timestamps).
+
+        Returns:
+        --------
+        int
+            Number of time columns actually added.
+
+        Raises:
+        -------
+        ValueError
+            If the depth axis differs from the existing record.
+        """
+        depth = data.iloc[1:, 0].astype(np.float64).to_numpy()
+        if depth.shape != self.depth.shape or not np.allclose(depth, self.depth):
+            raise ValueError("Depth axis of appended data does not match the existing record")
+
+        new_time = pd.to_datetime(data.columns[1:])
+        new_temp = data.iloc[1:, 1:].astype(np.float64).to_numpy()
+        keep = ~new_time.isin(self.time) & ~new_time.duplicated()
+        if not keep.all():
+            new_time, new_temp = new_time[keep], new_temp[:, keep]
+        n_new = len(new_time)
+        if n_new == 0:
+            return 0
+
+        n_old = len(self.time)
+        in_order = new_time.is_monotonic_increasing and (n_old == 0 or new_time[0] > self.time[-1])
+        if in_order:
+            if n_old + n_new > self._temp_buffer.shape[1]:
+                capacity = max(2 * self._temp_buffer.shape[1], n_old + n_new)
+                buffer = np.empty((len(self.depth), capacity))
+                buffer[:, :n_old] = self.temp
+                self._temp_buffer = buffer
+            self._temp_buffer[:, n_old:n_old + n_new] = new_temp
+            self.temp = self._temp_buffer[:, :n_old + n_new]
+            self.time = self.time.append(new_time)
+        else:
+            time = self.time.append(new_time)
+            order = np.argsort(time.to_numpy(), kind='stable')
+            self.time = time[order]
+            self.temp = np.concatenate([self.temp, new_temp], axis=1)[:, order]
+            self._temp_buffer = self.temp
+        return n_new
     
+    def denoise(self, time_window=5, polyorder=0, depth_window=None, chunk_size=None):
+        """
+        Smooth the temperature record in place, chunk by chunk.
+
+        Moving average (polyorder=0) or Savitzky-Golay along time, with an
+        optional median along depth; see atrt.filters.denoise_temperature.
+        Columns appended afterwards are not smoothed; for a live record feed
+        new columns through atrt.filters.StreamingDenoiser instead.
+
+        Returns:
+        --------
+        DtsDataProcessing
+            self, to allow chaining.
+        """
+        from .filters import denoise_temperature
+
+        denoise_temperature(self.temp, time_window, polyorder, depth_window, chunk_size, out=self.temp)
+        return self
+
     def find_time_index(self, time_str):
         target_time = datetime.strptime(time_str, '%Y/%m/%d %H:%M:%S')
-        time_diffs = [abs(target_time - time) for time in self.time]
-        closest_time_index = np.argmin(time_diffs)
+        time_diffs = np.abs(self.time - target_time)
+        closest_time_index = int(np.argmin(time_diffs))
         return closest_time_index
     
     def find_depth_index(self, depth_value):
         depth_array = self.depth
-        idx = (np.abs(depth_array - depth_value)).argmin()
+        idx = int((np.abs(depth_array - depth_value)).argmin())
         return idx
     
     def extraction_heating_data(self, top_idx, bottom_idx, start_str, end_str):
@@ -0,0 +1,200 @@
+"""
+DTS 温度矩阵的流式去噪
+
+原始 DTS 温度的噪声约为 ±0.05–0.1 °C。本模块沿时间方向做滑动平均或 Savitzky–Golay 平滑，
+并可在每个时刻沿深度方向做中值滤波（去除单点尖峰）。计算按时间列分块进行，
+块之间只保留平滑窗口所需的少量重叠列，内存占用与记录长度无关：
+
+- StreamingDenoiser  逐批接收新的时间列（如监测中追加的数据），输出已可最终确定的平滑列
+- denoise_temperature  对整个矩阵（可以是 np.memmap）分块平滑，结果写入 out
+
+两者的结果完全相同。边界处按最近值延拓（'nearest'），与 scipy.signal.savgol_filter
+默认的多项式外推不同。
+"""
+import numpy as np
+
+# 每块约含的样本数，使块大小适合 CPU 缓存
+_CHUNK_SAMPLES = 2**18
+
+
+def _median_along_depth(columns, depth_window, out):
+    """沿深度（第 0 轴）的中值滤波，边界按最近值延拓，结果写入 out"""
+    if depth_window == 3 and columns.shape[0] >= 3:
+        # 三点中值的比较网络：med(a, b, c) = max(min(a, b), min(max(a, b), c))
+        low = np.minimum(columns[:-2], columns[1:-1])
+        high = np.maximum(columns[:-2], columns[1:-1])
+        np.minimum(high, columns[2:], out=out[1:-1])
+        np.maximum(out[1:-1], low, out=out[1:-1])
+        out[0] = columns[0]
+        out[-1] = columns[-1]
+        return out
+    from scipy.ndimage import median_filter
+    return median_filter(columns, size=(depth_window, 1), mode='nearest', output=out)
+
+
+class StreamingDenoiser:
+    """
+    流式去噪器。
+
+    push 接收新的时间列，返回已能最终确定的平滑结果（比输入滞后 time_window // 2 列）；
+    所有数据输入完毕后调用 flush 取得剩余的列。除可重复使用的工作缓冲区外，
+    只缓存最多 time_window - 1 列。
+    """
+
+    def __init__(self, time_window=5, polyorder=0, depth_window=None):
+        """
+        :param time_window: 时间方向的窗口长度（奇数），1 表示不沿时间平滑
+        :param polyorder: Savitzky–Golay 多项式阶数，0 即滑动平均
+        :param depth_window: 深度方向中值滤波的窗口长度（奇数），None 表示不做中值滤波
+        """
+        if time_window < 1 or time_window % 2 == 0:
+            raise ValueError("time_window必须为正奇数")
+        if polyorder < 0 or (time_window > 1 and polyorder >= time_window):
+            raise ValueError("polyorder必须小于time_window")
+        if depth_window is not None and (depth_window < 1 or depth_window % 2 == 0):
+            raise ValueError("depth_window必须为正奇数")
+
+        self.time_window = time_window
+        self.polyorder = polyorder
+        self.depth_window = depth_window if depth_window and depth_window > 1 else None
+        self.half = time_window // 2
+        if polyorder == 0 or time_window == 1:
+            self.weights = None  # 滑动平均，使用 uniform_filter1d
+        else:
+            from scipy.signal import savgol_coeffs
+            self.weights = savgol_coeffs(time_window, polyorder, use='dot')
+        self.reset()
+
+    def reset(self):
+        """清空缓存，准备处理新的数据序列"""
+        self._n_depths = None
+        self._n_tail = 0  # 工作缓冲区开头保存的尚未输出的列（含左侧上下文）
+        self._work = None
+        self._result = None
+
+    def _reserve(self, n_depths, width):
+        if self._work is None or self._work.shape[1] < width:
+            work = np.empty((n_depths, width))
+            if self._work is not None:
+                work[:, :self._n_tail] = self._work[:, :self._n_tail]
+            self._work = work
+            self._result = np.empty((n_depths, width))
+
+    def _smooth(self, width):
+        """平滑工作缓冲区的前 width 列，返回有完整窗口的列（结果缓冲区的视图）"""
+        data = self._work[:, :width]
+        if self.half == 0:
+            return data
+        result = self._result[:, :width]
+        if self.weights is None:
+            from scipy.ndimage import uniform_filter1d
+            uniform_filter1d(data, self.time_window, axis=1, mode='nearest', output=result)
+        else:
+            from scipy.ndimage import correlate1d
+            correlate1d(data, self.weights, axis=1, mode='nearest', output=result)
+        return result[:, self.half:width - self.half]
+
+    def _push(self, columns):
+        """push 的实现，返回的数组在下一次调用时会被覆盖"""
+        if columns.ndim == 1:
+            columns = columns[:, np.newaxis]
+        n_depths, n_new = columns.shape
+        if self._n_depths is None:
+            if n_new == 0:
+                return np.empty((n_depths, 0))
+            self._n_depths = n_depths
+            self._reserve(n_depths, self.half + n_new)
+            left = self.half  # 首列前预留左侧延拓
+        else:
+            if n_depths != self._n_depths:
+                raise ValueError("深度点数与之前输入的数据不一致")
+            self._reserve(n_depths, self._n_tail + n_new)
+            left = self._n_tail
+
+        target = self._work[:, left:left + n_new]
+        if self.depth_window is not None:
+            _median_along_depth(np.asarray(columns, dtype=np.float64), self.depth_window, target)
+        else:
+            target[...] = columns
+        if self._n_tail == 0:
+            # 左边界按最近值延拓
+            self._work[:, :self.half] = self._work[:, self.half:self.half + 1]
+
+        width = left + n_new
+        n_ready = max(0, width - 2 * self.half)
+        smoothed = self._smooth(width) if n_ready else np.empty((n_depths, 0))
+        # 未输出的列及其左侧上下文移到缓冲区开头
+        self._n_tail = width - n_ready
+        self._work[:, :self._n_tail] = self._work[:, n_ready:width].copy()
+        return smoothed
+
+    def push(self, columns):
+        """
+        输入新的时间列。
+
+        :param columns: 温度数组 (n_depths, k)
+        :return: 已确定的平滑结果 (n_depths, m)，m 可以为 0
+        """
+        return self._push(np.asarray(columns)).copy()
+
+    def _flush(self):
+        if self._n_depths is None:
+            return np.empty((0, 0))
+        width = self._n_tail + self.half
+        self._reserve(self._n_depths, width)
+        # 右边界按最近值延拓
+        self._work[:, self._n_tail:width] = self._work[:, self._n_tail - 1:self._n_tail]
+        smoothed = self._smooth(width)
+        self.reset()
+        return smoothed
+
+    def flush(self):
+        """输入结束，返回剩余的平滑列并重置状态"""
+        return self._flush().copy()
+
+
+def iter_denoised_chunks(temp, time_window=5, polyorder=0, depth_window=None, chunk_size=None):
+    """
+    分块平滑温度矩阵，依次生成 (起始列, 结束列, 平滑结果)。
+
+    :param temp: 温度矩阵 (n_depths, n_time)，可以是 np.memmap 或 DtsDataProcessing.temp
+    :param chunk_size: 每次读取的时间列数，默认使每块约 2^18 个样本
+
+    生成的数组在下一次迭代时会被覆盖，需要保留时请复制。
+    """
+    n_depths, n_time = temp.shape
+    if chunk_size is None:
+        chunk_size = max(64, _CHUNK_SAMPLES // max(n_depths, 1))
+    denoiser = StreamingDenoiser(time_window, polyorder, depth_window)
+    position = 0
+    for start in range(0, n_time, chunk_size):
+        smoothed = denoiser._push(temp[:, start:start + chunk_size])
+        if smoothed.shape[1]:
+            yield position, position + smoothed.shape[1], smoothed
+            position += smoothed.shape[1]
+    smoothed = denoiser._flush()
+    if smoothed.shape[1]:
+        yield position, position + smoothed.shape[1], smoothed
+
+
+def denoise_temperature(temp, time_window=5, polyorder=0, depth_window=None, chunk_size=None, out=None):
+    """
+    对温度矩阵去噪。
+
+    :param temp: 温度矩阵 (n_depths, n_time)，可以是 np.memmap
+    :param time_window: 时间方向的窗口长度（奇数）
+    :param polyorder: Savitzky–Golay 多项式阶数，0 即滑动平均
+    :param depth_window: 深度方向中值滤波的窗口长度（奇数），None 表示不做中值滤波
+    :param chunk_size: 每次读取的时间列数
+    :param out: 输出数组（可以是 np.memmap，也可以是 temp 本身以原地去噪），默认新建
+    :return: 去噪后的温度矩阵
+    """
+    if out is None:
+        out = np.empty(temp.shape)
+    elif out.shape != temp.shape:
+        raise ValueError("out的形状必须与temp相同")
+    # 每块结果只写入已经读过的列，内部缓存的是原始数据的副本，因此 out 可以是 temp 本身
+    for start, stop, smoothed in iter_denoised_chunks(temp, time_window, polyorder,
+                                                      depth_window, chunk_size):
+        out[:, start:stop] = smoothed
+    return out
@@ -0,0 +1,276 @@
+"""
+只依赖时间轴的不变量的拟合上下文
+
+NFM_Kluitenberg、calc_temp、CLHS_RMSE 和 calc_rmse_std 每次求值都会重新计算只依赖 t、r、t0 的量
+（t > t0 等掩码、t - t0、r²/4t、井函数的 1/t）并用 np.full_like 等分配临时数组。FitContext 按时间轴
+创建一次，缓存这些不变量和预分配的工作数组，之后的每次目标函数求值只做原地运算，不再分配与
+时间轴等长的数组。
+
+同一时间轴上的多个深度（如 optimize_soil_properties_RMSE 的各数据集、optimize_parameters_batch 的
+各深度）可共享一个 FitContext；依赖 r、t0、calc_timeidx 的不变量按取值分别缓存，q 和参数在每次
+调用时给出。工作数组是共享的，因此一个 FitContext 不能同时在多个线程中使用；进程池中使用时
+只序列化时间轴，不变量在子进程中重新计算。
+
+计算结果与 'numpy' 计算后端一致：Kluitenberg 与 CLHS 模型在舍入误差以内与参考实现相同，
+越流井函数使用 leaky_well_function 的分段 Gauss-Legendre 求积（与 quad 的相对误差约 1e-6）。
+
+示例:
+    context = FitContext(time)
+    optimize_soil_properties_RMSE(time, data, variables, initial_guess, context=context)
+    NFM_Kluitenberg([Cv, lambda_], T_measured, time, variables, context=context)
+"""
+import numpy as np
+
+from . import _scipy
+from .kernels import _MAX_E1_ARG, _WELL_NODES, _WELL_PANELS, _WELL_WEIGHTS, _as_float_array
+
+_WELL_HALF_NODES = _WELL_NODES / 2
+
+
+class FitContext:
+    """
+    一条时间轴的拟合上下文。
+
+    :param t: 时间 (s)，创建后不应再修改
+    """
+
+    def __init__(self, t):
+        self.t = _as_float_array(t).copy()
+        self.t.flags.writeable = False
+        # 创建时传入的对象，check_time 对它只做身份比较
+        self._source = t
+        self.n = len(self.t)
+        self._kluitenberg = {}
+        self._clhs = {}
+        self._well = {}
+
+    def __reduce__(self):
+        # 不变量和工作数组都可由时间轴重建，序列化时只保留时间轴
+        return FitContext, (self.t,)
+
+    def check_time(self, t):
+        """
+        确认 t 与创建上下文时的时间轴相同，不同时抛出 ValueError。
+
+        t 是创建时传入的对象或 self.t 本身时只做身份比较，否则逐元素比较。
+        """
+        if t is self._source or t is self.t:
+            return
+        if not np.array_equal(np.asarray(t, dtype=np.float64), self.t):
+            raise ValueError("时间轴与创建拟合上下文时的时间轴不一致")
+
+    def _check(self, T_measured):
+        T_measured = np.asarray(T_measured, dtype=np.float64)
+        if T_measured.shape != (self.n,):
+            raise ValueError(f"温度长度 {T_measured.shape} 与拟合上下文的时间轴长度 {self.n} 不一致")
+        return T_measured
+
+    # -----------------------------------------------------------------------
+    # Kluitenberg 脉冲模型
+    # -----------------------------------------------------------------------
+    def _kluitenberg_invariants(self, r, t0):
+        key = (float(r), float(t0))
+        invariants = self._kluitenberg.get(key)
+        if invariants is None:
+            r, t0 = key
+            t = self.t
+            heating = (t > 0) & (t <= t0)
+            cooling = t > t0
+            # x1 = (Cv/λ)·r²/4t，t <= 0 处为 nan（无效时刻）
+            g1 = np.full(self.n, np.nan)
+            g1[heating | cooling] = r ** 2 / (4 * t[heating | cooling])
+            # x2 = (Cv/λ)·r²/4(t - t0) 只在冷却段计算。时间轴递增时冷却段是连续的一段，
+            # 否则在整个时间轴上计算，非冷却时刻取 inf（E1(inf) = 0）并在有效性判断中豁免
+            index = np.flatnonzero(cooling)
+            if len(index) == 0 or index[-1] - index[0] + 1 == len(index):
+                start = index[0] if len(index) else self.n
+                cooling_slice = slice(start, start + len(index))
+                exempt = None
+            else:
+                cooling_slice = slice(0, self.n)
+                exempt = ~cooling
+            g2 = np.full(cooling_slice.stop - cooling_slice.start, np.inf)
+            local = cooling[cooling_slice]
+            g2[local] = r ** 2 / (4 * (t[cooling_slice][local] - t0))
+            invariants = self._kluitenberg[key] = {
+                'cooling': cooling_slice,
+                'exempt': exempt,
+                'g1': g1,
+                'g2': g2,
+                'x1': np.empty(self.n),
+                'x2': np.empty(len(g2)),
+                'valid': np.empty(self.n, dtype=bool),
+                'mask': np.empty(self.n, dtype=bool),
+                'cooling_valid': np.empty(len(g2), dtype=bool),
+            }
+        return invariants
+
+    def _kluitenberg_difference(self, Cv, lambda_, r, t0, mask_invalid):
+        """在工作数组 x1 中计算 E1(x1) - E1(x2)（尚未乘系数），返回不变量字典"""
+        exp1 = _scipy.special().exp1
+
+        invariants = self._kluitenberg_invariants(r, t0)
+        x1, x2, cooling = invariants['x1'], invariants['x2'], invariants['cooling']
+        ratio = Cv / lambda_
+        np.multiply(invariants['g1'], ratio, out=x1)
+        np.multiply(invariants['g2'], ratio, out=x2)
+        if mask_invalid:
+            # 与 NFM_Kluitenberg 相同：E1 参数不小于阈值的时刻记为无效
+            valid, cooling_valid = invariants['valid'], invariants['cooling_valid']
+            np.less(x1, _MAX_E1_ARG, out=valid)
+            np.less(x2, _MAX_E1_ARG, out=cooling_valid)
+            if invariants['exempt'] is not None:
+                np.logical_or(cooling_valid, invariants['exempt'], out=cooling_valid)
+            np.logical_and(valid[cooling], cooling_valid, out=valid[cooling])
+        exp1(x1, out=x1)
+        exp1(x2, out=x2)
+        np.subtract(x1[cooling], x2, out=x1[cooling])
+        return invariants
+
+    def kluitenberg_temperature(self, Cv, lambda_, r, q, t0, out=None):
+        """
+        Kluitenberg 脉冲模型的理论温升（与 calc_temp 相同）。
+
+        :param out: 可选的输出数组，不给出时分配新数组
+        :return: 理论温升，t <= 0 处为 nan
+        """
+        invariants = self._kluitenberg_difference(Cv, lambda_, r, t0, mask_invalid=False)
+        if out is None:
+            out = np.empty(self.n)
+        return np.multiply(invariants['x1'], q / (4 * np.pi * lambda_), out=out)
+
+    def kluitenberg_rmse(self, Cv, lambda_, T_measured, r, q, t0):
+        """Kluitenberg 脉冲模型的 RMSE（与 NFM_Kluitenberg 相同，忽略无效时刻和 nan）"""
+        T_measured = self._check(T_measured)
+        invariants = self._kluitenberg_difference(Cv, lambda_, r, t0, mask_invalid=True)
+        residuals, invalid, missing = invariants['x1'], invariants['valid'], invariants['mask']
+        np.multiply(residuals, q / (4 * np.pi * lambda_), out=residuals)
+        np.subtract(T_measured, residuals, out=residuals)
+        np.logical_not(invalid, out=invalid)
+        np.isnan(residuals, out=missing)
+        np.logical_or(invalid, missing, out=invalid)
+        np.copyto(residuals, 0.0, where=invalid)
+        count = self.n - np.count_nonzero(invalid)
+        if count == 0:
+            return np.nan
+        return np.sqrt(np.dot(residuals, residuals) / count)
+
+    # -----------------------------------------------------------------------
+    # 持续线热源 (CLHS) 模型
+    # -----------------------------------------------------------------------
+    def _clhs_invariants(self, r):
+        key = float(r)
+        invariants = self._clhs.get(key)
+        if invariants is None:
+            invariants = self._clhs[key] = {
+                # E1 参数为 (1/α)·r²/4t，与 temperature_response 相同地把 t 截断到 1e-6 以上
+                'g': key ** 2 / (4 * np.maximum(self.t, 1e-6)),
+                'work': np.empty(self.n),
+            }
+        return invariants
+
+    def clhs_temperature(self, q, k, alpha, r=0.0007, out=None):
+        """持续线热源模型的理论温升（与 temperature_response 相同）"""
+        exp1 = _scipy.special().exp1
+
+        invariants = self._clhs_invariants(r)
+        if out is None:
+            out = np.empty(self.n)
+        np.divide(invariants['g'], alpha, out=out)
+        exp1(out, out=out)
+        return np.multiply(out, q / (4 * np.pi * k), out=out)
+
+    def clhs_rmse(self, alpha, lambda_, T_measured, q, r=0.0007):
+        """持续线热源模型的 RMSE（与 CLHS_RMSE 相同）"""
+        T_measured = self._check(T_measured)
+        residuals = self.clhs_temperature(q, lambda_, alpha, r, out=self._clhs_invariants(r)['work'])
+        np.subtract(T_measured, residuals, out=residuals)
+        return np.sqrt(np.dot(residuals, residuals) / self.n)
+
+    # -----------------------------------------------------------------------
+    # 越流井函数模型
+    # -----------------------------------------------------------------------
+    def _well_invariants(self, calc_timeidx):
+        key = int(calc_timeidx)
+        invariants = self._well.get(key)
+        if invariants is None:
+            # 第一个时刻的温度按 calc_rmse_std 的约定取 0，井函数只在 max(calc_timeidx, 1) 之后计算
+            first = max(key, 1)
+            m = max(self.n - first, 0)
+            invariants = self._well[key] = {
+                'first': first,
+                'inv_t': 1 / self.t[first:],
+                'u': np.empty(m),
+                'y_low': np.empty(m),
+                'width': np.empty(m),
+                'center': np.empty(m),
+                'panel': np.empty(m),
+                'well': np.empty(m),
+                'y': np.empty((m, len(_WELL_NODES))),
+                'integrand': np.empty((m, len(_WELL_NODES))),
+                'residuals': np.empty(max(self.n - key, 0)),
+                'centered': np.empty(max(self.n - key, 0)),
+            }
+        return invariants
+
+    def _leaky_well_function(self, A, b, invariants):
+        """在工作数组 well 中计算 W(A/t, b)，与 leaky_well_function 相同的对数代换分段求积"""
+        u, y_low, width = invariants['u'], invariants['y_low'], invariants['width']
+        center, panel, well = invariants['center'], invariants['panel'], invariants['well']
+        y, integrand = invariants['y'], invariants['integrand']
+        c = b ** 2 / 4
+
+        np.multiply(invariants['inv_t'], A, out=u)
+        # 有效积分区间：s > u + 40 或 b²/(4s) > 40 时被积函数可忽略
+        np.log(u, out=y_low)
+        if c > 0:
+            np.maximum(y_low, np.log(c / 40), out=y_low)
+        np.add(u, 40.0, out=width)
+        np.log(width, out=width)
+        np.maximum(width, y_low, out=width)
+        np.subtract(width, y_low, out=width)
+        np.divide(width, _WELL_PANELS, out=width)
+
+        well.fill(0.0)
+        for p in range(_WELL_PANELS):
+            np.multiply(width, p + 0.5, out=center)
+            np.add(center, y_low, out=center)
+            np.multiply(width[:, np.newaxis], _WELL_HALF_NODES, out=y)
+            np.add(y, center[:, np.newaxis], out=y)
+            np.exp(y, out=y)
+            np.divide(c, y, out=integrand)
+            np.add(integrand, y, out=integrand)
+            np.negative(integrand, out=integrand)
+            np.exp(integrand, out=integrand)
+            np.dot(integrand, _WELL_WEIGHTS, out=panel)
+            np.multiply(panel, width, out=panel)
+            np.add(well, panel, out=well)
+        np.divide(well, 2, out=well)
+        return well
+
+    def leaky_well_rmse_std(self, parameter_process_0, temp_observed, calc_timeidx):
+        """
+        越流井函数模型的 RMSE 与残差标准差的加权平均（与 calc_rmse_std 相同）。
+
+        A <= 0（井函数发散）时返回 inf。
+        """
+        kv = _scipy.special().kv
+
+        temp_observed = self._check(temp_observed)
+        T_steady, b, A = (float(value) for value in parameter_process_0[:3])
+        if not A > 0:
+            return np.inf
+        invariants = self._well_invariants(calc_timeidx)
+        first, residuals, centered = invariants['first'], invariants['residuals'], invariants['centered']
+        count = len(residuals)
+
+        well = self._leaky_well_function(A, b, invariants)
+        offset = first - calc_timeidx
+        np.multiply(well, T_steady / (2 * kv(0, b)), out=residuals[offset:])
+        residuals[:offset] = 0.0
+        np.subtract(residuals, temp_observed[calc_timeidx:], out=residuals)
+
+        rmse = np.sqrt(np.dot(residuals, residuals) / count)
+        np.subtract(residuals, residuals.sum() / count, out=centered)
+        std = np.sqrt(np.dot(centered, centered) / count)
+        return 0.5 * rmse + 0.5 * std
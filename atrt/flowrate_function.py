@@ -5,22 +5,34 @@
 联系方式:wfy22500@smail.nju.edu.cn
 注：本人水平极其有限，如有错误或不足之处，还请批评指正
 '''
+from time import perf_counter
+
 import numpy as np
-from scipy.integrate import quad
-from scipy.optimize import minimize
-from scipy.special import kv
-from scipy.optimize import dual_annealing
+
+from . import _scipy
+
+# scipy 在用到的函数内部导入，避免导入本模块时加载 scipy.optimize / scipy.integrate；
+# 目标函数中的 quad、kv 经 _scipy 的访问函数取得，只在第一次调用时导入
 
 # 计算 RMSE 和标准差
-def calc_rmse_std(parameter_process_0, t_observed, temp_observed, calc_timeidx):
+def calc_rmse_std(parameter_process_0, t_observed, temp_observed, calc_timeidx, context=None):
     """
     计算 RMSE 和标准差的加权平均。
     :param parameter_process_0: 输入的模型参数 [T_steady, r_divide_B, A]
     :param t_observed: 观测时间数据
     :param temp_observed: 观测温度数据
     :param calc_timeidx: 计算从该索引开始的数据
+    :param context: 可选的 FitContext（由 t_observed 创建），给出时用 leaky_well_function 的求积代替 quad，
+                    复用缓存的 1/t 和工作数组（相对误差约 1e-6），A <= 0 时返回 inf
     :return: RMSE 和标准差的加权平均值
     """
+    if context is not None:
+        context.check_time(t_observed)
+        return context.leaky_well_rmse_std(parameter_process_0, temp_observed, calc_timeidx)
+
+    quad = _scipy.integrate().quad
+    kv = _scipy.special().kv
+
     a = parameter_process_0[0]  # T_steady
     b = parameter_process_0[1]  # r_divide_B
     c = parameter_process_0[2]  # A
@@ -46,8 +58,41 @@ def calc_rmse_std(parameter_process_0, t_observed, temp_observed, calc_timeidx):
     rmse_std = 0.5* rmse_value + 0.5* residual_std_value
     return rmse_std
 
+# 随机数种子在缓存键中的表示：SeedSequence 以其熵和派生键表示
+def _seed_key(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return ('SeedSequence', str(seed.entropy), list(seed.spawn_key))
+    return seed
+
+# 带缓存的流速参数优化（求解路径拆分为参数数组和目标值数组保存）
+def _cached_flow_fit(cache, namespace, inputs, optimize, context=None, instrumentation=None,
+                     depth=None):
+    from .cache import as_result_cache, cached_call
+    from .kernels import get_kernel_backend
+
+    start = perf_counter()
+
+    def on_hit(result):
+        if instrumentation is not None:
+            instrumentation.record_cached(namespace, depth, perf_counter() - start, float(result[1]))
+
+    def compute():
+        parameter_estimated, rmse_std, history = optimize()
+        return (parameter_estimated, rmse_std,
+                np.array([parameter for parameter, _ in history]),
+                np.array([value for _, value in history]))
+
+    parameter_estimated, rmse_std, history_parameters, history_values = cached_call(
+        as_result_cache(cache), namespace,
+        inputs + ('fit_context' if context is not None else get_kernel_backend(),), compute,
+        ('parameter_estimated', 'rmse_std', 'history_parameters', 'history_values'), on_hit
+    )
+    return parameter_estimated, rmse_std, list(zip(history_parameters, history_values))
+
 # 优化参数——梯度下降法
-def optimize_parameters_GD(t_observed, temp_observed, calc_timeidx, parameter_process, method):
+def optimize_parameters_GD(t_observed, temp_observed, calc_timeidx, parameter_process, method,
+                           instrumentation=None, depth=None, callback=None, cache=None, context=None,
+                           disp=True):
     """
     使用 Nelder-Mead 方法优化模型参数，以最小化 RMSE 和标准差。
     :param t_observed: 观测时间数据
@@ -55,11 +100,31 @@ def optimize_parameters_GD(t_observed, temp_observed, calc_timeidx, parameter_pr
     :param calc_timeidx: 计算从该索引开始的数据
     :param parameter_process: 初始参数
     :param method: 优化方法
+    :param instrumentation: 可选的 Instrumentation 对象，记录求解统计
+    :param depth: 记录统计时使用的深度序号
+    :param callback: 可选，每次迭代后以当前参数调用（传给 scipy.optimize.minimize）
+    :param cache: 可选的 ResultCache 或缓存目录路径，输入相同时直接返回缓存的结果
+    :param context: 可选的 FitContext（由 t_observed 创建），目标函数复用其缓存的不变量和工作数组
+    :param disp: 是否打印 scipy 的收敛信息（不影响结果，也不参与缓存键）
     :return: 优化后的参数值、RMSE和优化过程记录
     """
-    # 定义损失函数（RMSE和标准差的加权平均）
-    def loss(parameter):
-        return calc_rmse_std(parameter, t_observed, temp_observed, calc_timeidx)
+    if context is not None:
+        context.check_time(t_observed)
+    if cache is not None:
+        return _cached_flow_fit(
+            cache, 'optimize_parameters_GD',
+            (t_observed, temp_observed, calc_timeidx, parameter_process, method),
+            lambda: optimize_parameters_GD(t_observed, temp_observed, calc_timeidx, parameter_process,
+                                           method, instrumentation, depth, callback, context=context,
+                                           disp=disp),
+            context, instrumentation, depth
+        )
+
+    from scipy.optimize import minimize
+    from .kernels import leaky_well_objective
+
+    # 定义损失函数（RMSE和标准差的加权平均），按当前计算后端取得
+    loss = leaky_well_objective(t_observed, temp_observed, calc_timeidx, context=context)
     
     # 用于记录优化过程
     history = []
@@ -72,22 +137,32 @@ def optimize_parameters_GD(t_observed, temp_observed, calc_timeidx, parameter_pr
 
     # 优化选项
     options = {
-        'disp': True,
+        'disp': disp,
         'maxiter': 10**7, 
         'maxfun': 10**7,
         'ftol': 10e-7,
         'xtol': 10e-7,      
     }
 
+    objective = loss_with_history
+    if instrumentation is not None:
+        objective = instrumentation.wrap_objective(loss_with_history)
+        start = perf_counter()
+
     # 使用梯度下降方法进行优化
-    result = minimize(loss_with_history, parameter_process, method=method, options=options)
+    result = minimize(objective, parameter_process, method=method, options=options, callback=callback)
+
+    if instrumentation is not None:
+        instrumentation.record_result('optimize_parameters_GD', depth, result,
+                                      perf_counter() - start, objective)
     parameter_estimated = result.x  # 最优参数
     rmse_std = result.fun  # 最优RMSE_std值
 
     return parameter_estimated, rmse_std, history
 
 # 优化参数——模拟退火法
-def optimize_parameters_SA(t_observed, temp_observed, calc_timeidx, parameter_process, bounds):
+def optimize_parameters_SA(t_observed, temp_observed, calc_timeidx, parameter_process, bounds,
+                           instrumentation=None, depth=None, callback=None, cache=None, context=None):
     """
     使用模拟退火方法优化模型参数，以最小化 RMSE 和标准差。
     :param t_observed: 观测时间数据
@@ -95,11 +170,29 @@ def optimize_parameters_SA(t_observed, temp_observed, calc_timeidx, parameter_pr
     :param calc_timeidx: 计算从该索引开始的数据
     :param parameter_process: 初始参数
     :param bounds: 参数的边界
+    :param instrumentation: 可选的 Instrumentation 对象，记录求解统计
+    :param depth: 记录统计时使用的深度序号
+    :param callback: 可选，每找到新的极小值时以 (x, f, context) 调用（传给 scipy.optimize.dual_annealing）
+    :param cache: 可选的 ResultCache 或缓存目录路径，输入相同时直接返回第一次计算的结果
+    :param context: 可选的 FitContext（由 t_observed 创建），目标函数复用其缓存的不变量和工作数组
     :return: 优化后的参数值、RMSE和求解路径
     """
-    # 定义损失函数（RMSE和标准差的加权平均）
-    def loss(parameter):
-        return calc_rmse_std(parameter, t_observed, temp_observed, calc_timeidx)
+    if context is not None:
+        context.check_time(t_observed)
+    if cache is not None:
+        return _cached_flow_fit(
+            cache, 'optimize_parameters_SA',
+            (t_observed, temp_observed, calc_timeidx, parameter_process, bounds),
+            lambda: optimize_parameters_SA(t_observed, temp_observed, calc_timeidx, parameter_process,
+                                           bounds, instrumentation, depth, callback, context=context),
+            context, instrumentation, depth
+        )
+
+    from scipy.optimize import dual_annealing
+    from .kernels import leaky_well_objective
+
+    # 定义损失函数（RMSE和标准差的加权平均），按当前计算后端取得
+    loss = leaky_well_objective(t_observed, temp_observed, calc_timeidx, context=context)
     
     # 用于记录求解路径
     history = []
@@ -110,13 +203,228 @@ def optimize_parameters_SA(t_observed, temp_observed, calc_timeidx, parameter_pr
         history.append((parameter.copy(), value))
         return value
 
+    objective = loss_with_history
+    if instrumentation is not None:
+        objective = instrumentation.wrap_objective(loss_with_history)
+        start = perf_counter()
+
     # 使用模拟退火方法进行优化
-    result = dual_annealing(loss_with_history, bounds=bounds, x0=parameter_process)
+    result = dual_annealing(objective, bounds=bounds, x0=parameter_process, callback=callback)
+
+    if instrumentation is not None:
+        instrumentation.record_result('optimize_parameters_SA', depth, result,
+                                      perf_counter() - start, objective)
     parameter_estimated = result.x  # 最优参数
     rmse_std = result.fun  # 最优RMSE_std值
 
     return parameter_estimated, rmse_std, history
 
+# 优化参数——差分进化法（整代种群批量评估）
+def optimize_parameters_DE(t_observed, temp_observed, calc_timeidx, bounds, parameter_process=None,
+                           popsize=15, maxiter=1000, tol=0.01, seed=None, polish=True,
+                           instrumentation=None, depth=None, callback=None, cache=None):
+    """
+    使用差分进化方法全局优化模型参数，以最小化 RMSE 和标准差。
+
+    每一代的整个种群通过 leaky_well_rmse_std_batch 一次向量化评估（scipy.optimize.differential_evolution
+    的 vectorized 模式，需要 SciPy >= 1.9），不再逐点调用 quad。
+    :param t_observed: 观测时间数据
+    :param temp_observed: 观测温度数据
+    :param calc_timeidx: 计算从该索引开始的数据
+    :param bounds: 参数的边界
+    :param parameter_process: 可选的初始参数，作为初始种群的一个个体
+    :param popsize: 种群规模系数（种群个体数为 popsize * 参数个数）
+    :param maxiter: 最大代数
+    :param tol: 种群目标值的相对收敛阈值
+    :param seed: 随机数种子、numpy SeedSequence 或 Generator（使用 cache 时不能是 Generator）
+    :param polish: 是否在最后用 Nelder-Mead 局部精化
+    :param instrumentation: 可选的 Instrumentation 对象，记录求解统计（objective_calls 为评估的代数）
+    :param depth: 记录统计时使用的深度序号
+    :param callback: 可选，每一代结束后以当前最优参数调用
+    :param cache: 可选的 ResultCache 或缓存目录路径，输入相同时直接返回第一次计算的结果
+    :return: 优化后的参数值、RMSE和求解路径（每一代的最优参数及其目标值）
+    """
+    if cache is not None:
+        return _cached_flow_fit(
+            cache, 'optimize_parameters_DE',
+            (t_observed, temp_observed, calc_timeidx, bounds, parameter_process, popsize, maxiter, tol,
+             _seed_key(seed), polish),
+            lambda: optimize_parameters_DE(t_observed, temp_observed, calc_timeidx, bounds, parameter_process,
+                                           popsize, maxiter, tol, seed, polish, instrumentation, depth,
+                                           callback),
+            instrumentation=instrumentation, depth=depth
+        )
+
+    from scipy.optimize import differential_evolution, minimize
+    from .kernels import _as_float_array, leaky_well_rmse_std_batch
+
+    if isinstance(seed, np.random.SeedSequence):
+        seed = np.random.default_rng(seed)
+    t_observed = _as_float_array(t_observed)
+    temp_observed = _as_float_array(temp_observed)
+
+    # 已评估的最小目标值。差分进化的选择是贪心的，它就是当前种群的最优目标值，
+    # 记录求解路径时不必再评估一次
+    best = [np.inf]
+
+    # scipy 以 (参数个数, S) 的形状传入整代种群，精化阶段传入单个参数向量
+    def loss(parameters):
+        values = leaky_well_rmse_std_batch(np.transpose(parameters), t_observed, temp_observed, calc_timeidx)
+        best[0] = min(best[0], float(np.min(values)))
+        return values if np.ndim(parameters) > 1 else values[0]
+
+    objective = loss
+    if instrumentation is not None:
+        objective = instrumentation.wrap_objective(loss)
+        start = perf_counter()
+
+    # 用于记录求解路径
+    history = []
+
+    def record_generation(xk, convergence=None):
+        history.append((xk.copy(), best[0]))
+        if callback is not None:
+            callback(xk)
+
+    x0 = None
+    if parameter_process is not None:
+        x0 = np.clip(parameter_process, *np.transpose(bounds))
+
+    result = differential_evolution(objective, bounds, popsize=popsize, maxiter=maxiter, tol=tol,
+                                    seed=seed, polish=False, x0=x0, callback=record_generation,
+                                    vectorized=True, updating='deferred')
+    if polish:
+        # 井函数求积的相对误差约 1e-6，差分梯度不可靠，因此用 Nelder-Mead 而不是 L-BFGS-B 精化
+        local = minimize(objective, result.x, method='Nelder-Mead', bounds=bounds,
+                         options={'xatol': 1e-8, 'fatol': 1e-12, 'maxiter': 10**4})
+        result.nfev += local.nfev
+        if local.fun < result.fun:
+            result.x, result.fun = local.x, local.fun
+            history.append((local.x.copy(), float(local.fun)))
+
+    if instrumentation is not None:
+        instrumentation.record_result('optimize_parameters_DE', depth, result,
+                                      perf_counter() - start, objective)
+    parameter_estimated = result.x  # 最优参数
+    rmse_std = result.fun  # 最优RMSE_std值
+
+    return parameter_estimated, rmse_std, history
+
+# 单个深度的参数优化（optimize_parameters_batch 在进程池中调用）
+def _fit_flow_depth(method, t_observed, temp_observed, calc_timeidx, x0, bounds, seed, depth,
+                    record=False, callback=None, cache=None, context=None):
+    instrumentation = None
+    if record:
+        from .instrumentation import Instrumentation
+        instrumentation = Instrumentation()
+    options = dict(instrumentation=instrumentation, depth=depth, callback=callback, cache=cache)
+    if method == 'SA':
+        parameter_estimated, rmse_std, _ = optimize_parameters_SA(
+            t_observed, temp_observed, calc_timeidx, x0, bounds, context=context, **options)
+    elif method == 'DE':
+        parameter_estimated, rmse_std, _ = optimize_parameters_DE(
+            t_observed, temp_observed, calc_timeidx, bounds, x0, seed=seed, **options)
+    else:
+        parameter_estimated, rmse_std, _ = optimize_parameters_GD(
+            t_observed, temp_observed, calc_timeidx, x0, method, context=context, **options)
+    return parameter_estimated, rmse_std, instrumentation.records if record else []
+
+# 多个深度依次优化参数（可断点续算）
+def optimize_parameters_batch(t_observed, temp_matrix, calc_timeidx, parameter_process, method='SA',
+                              bounds=None, instrumentation=None, checkpoint=None, checkpoint_interval=60.0,
+                              cache=None, processes=None, seed=None, context=None):
+    """
+    对多个深度的温度曲线依次调用 optimize_parameters_SA、optimize_parameters_DE 或 optimize_parameters_GD。
+
+    给出 checkpoint 时，已完成深度的结果和正在计算深度的当前最优解会定期原子地写入该 npz 文件；
+    以相同输入重新运行时跳过已完成的深度，中断的深度从保存的最优解重新开始搜索。
+    :param t_observed: 观测时间数据
+    :param temp_matrix: 温度矩阵 (n_depths, n_time)
+    :param calc_timeidx: 计算从该索引开始的数据
+    :param parameter_process: 初始参数 [T_steady, r_divide_B, A]
+    :param method: 'SA' 使用模拟退火，'DE' 使用差分进化，其余值作为 scipy.optimize.minimize 的方法名
+    :param bounds: 参数的边界（模拟退火和差分进化时必需）
+    :param instrumentation: 可选的 Instrumentation 对象，记录求解统计
+    :param checkpoint: 可选的检查点文件路径 (.npz)
+    :param checkpoint_interval: 两次写检查点之间的最短间隔（秒）
+    :param cache: 可选的 ResultCache 或缓存目录路径，按深度缓存结果
+    :param processes: 进程数；大于 1 时各深度在进程池中并行优化（此时检查点只保存已完成的深度）
+    :param seed: 差分进化的随机数种子，各深度使用由它派生的独立随机数序列
+    :param context: 可选的 FitContext（由 t_observed 创建），所有深度共享（差分进化使用种群批量目标函数，不使用它）
+    :return: 优化后的参数 (n_depths, 3) 和 RMSE_std (n_depths,)
+    """
+    temp_matrix = np.atleast_2d(np.asarray(temp_matrix, dtype=float))
+    n_depths = temp_matrix.shape[0]
+    if method in ('SA', 'DE') and bounds is None:
+        raise ValueError("模拟退火和差分进化方法需要给出参数边界 bounds")
+    if context is not None:
+        context.check_time(t_observed)
+    if cache is not None:
+        from .cache import as_result_cache
+        cache = as_result_cache(cache)
+
+    if checkpoint is not None:
+        from ._hashing import hash_inputs
+        from .checkpoint import Checkpoint
+        fingerprint = hash_inputs('optimize_parameters_batch', t_observed, temp_matrix, calc_timeidx,
+                                  list(parameter_process), method, bounds,
+                                  *((seed,) if method == 'DE' else ()))
+        checkpoint = Checkpoint(checkpoint, n_depths, fingerprint, interval=checkpoint_interval)
+
+    parameter_estimated = np.zeros((n_depths, len(parameter_process)))
+    rmse_std = np.zeros(n_depths)
+    seeds = [None] * n_depths
+    if method == 'DE':
+        # 传给各深度的是派生的 SeedSequence 而不是 Generator，缓存键只由种子本身决定
+        seeds = np.random.SeedSequence(seed).spawn(n_depths)
+
+    pending = []
+    for i in range(n_depths):
+        if checkpoint is not None and checkpoint.is_done(i):
+            parameter_estimated[i] = checkpoint.get('parameter_estimated', i)
+            rmse_std[i] = checkpoint.get('rmse_std', i)
+        else:
+            pending.append(i)
+
+    def finish(i, result):
+        parameter_estimated[i], rmse_std[i], records = result
+        if instrumentation is not None:
+            instrumentation.records.extend(records)
+        if checkpoint is not None:
+            checkpoint.complete(i, parameter_estimated=parameter_estimated[i], rmse_std=rmse_std[i])
+
+    if processes is not None and processes > 1 and len(pending) > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=min(processes, len(pending))) as executor:
+            futures = {
+                executor.submit(_fit_flow_depth, method, t_observed, temp_matrix[i], calc_timeidx,
+                                parameter_process, bounds, seeds[i], i, instrumentation is not None,
+                                cache=cache, context=context): i
+                for i in pending
+            }
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+    else:
+        for i in pending:
+            x0 = parameter_process
+            callback = None
+            if checkpoint is not None:
+                resumed = checkpoint.partial_state(i)
+                if resumed is not None:
+                    x0 = resumed
+                if method == 'SA':
+                    callback = lambda x, f, context, i=i: checkpoint.set_partial(i, x)
+                else:
+                    callback = lambda xk, i=i: checkpoint.set_partial(i, xk)
+            finish(i, _fit_flow_depth(method, t_observed, temp_matrix[i], calc_timeidx, x0, bounds,
+                                      seeds[i], i, instrumentation is not None, callback, cache, context))
+
+    if checkpoint is not None:
+        checkpoint.save()
+
+    return parameter_estimated, rmse_std
+
 # 计算温度
 def compute_temperature(parameter_estimated, time):
     """
@@ -125,6 +433,9 @@ def compute_temperature(parameter_estimated, time):
     :param time: 时间数据
     :return: 计算得到的温度数据
     """
+    quad = _scipy.integrate().quad
+    kv = _scipy.special().kv
+
     a = parameter_estimated[0]  # T_steady
     b = parameter_estimated[1]  # r_divide_B
     c = parameter_estimated[2]  # A
@@ -151,6 +462,38 @@ def compute_temperature(parameter_estimated, time):
 
     return temp_computed
 
+# 向量化的越流井函数
+def leaky_well_function(u, b, panels=8, nodes=16):
+    """
+    向量化计算井函数 W(u, b) = ∫_u^∞ exp(-s - b²/(4s)) / s ds。
+    作变量代换 s = e^y 后在有效积分区间上使用分段 Gauss-Legendre 求积，
+    可一次计算任意形状的 u、b 数组（按广播规则），相对误差约 1e-6 以内。
+    :param u: 积分下限（对应 compute_temperature 中的 A / t），须为正
+    :param b: 参数 r/B
+    :param panels: 分段数
+    :param nodes: 每段的 Gauss-Legendre 节点数
+    :return: 井函数值，形状为 u、b 广播后的形状
+    """
+    u, b = np.broadcast_arrays(np.asarray(u, dtype=float), np.asarray(b, dtype=float))
+    c = b ** 2 / 4
+
+    # 有效积分区间：s > u + 40 或 b²/(4s) > 40 时被积函数可忽略
+    with np.errstate(divide='ignore'):
+        y_low = np.maximum(np.log(u), np.log(c / 40))
+    y_high = np.maximum(np.log(u + 40), y_low)
+
+    x, w = np.polynomial.legendre.leggauss(nodes)
+    width = (y_high - y_low) / panels
+
+    result = np.zeros(u.shape)
+    for p in range(panels):
+        center = y_low + width * (p + 0.5)
+        y = center[..., np.newaxis] + (width / 2)[..., np.newaxis] * x
+        exp_y = np.exp(y)
+        integrand = np.exp(-exp_y - c[..., np.newaxis] / exp_y)
+        result += width / 2 * (integrand @ w)
+    return result
+
 # 计算地下水流速
 def calculate_flow_rate(parameter_estimated, rho_c_soil, thermal_conductivity_soil):
     """
@@ -0,0 +1,129 @@
+"""
+求解过程的计时与统计
+
+可选的轻量级插桩：记录每个深度的目标函数调用次数、目标函数耗时、迭代次数、
+总耗时和收敛状态，以及 load → extract → fit 等阶段的累计耗时。
+命中结果缓存（ResultCache）的深度同样记录一行，cached 列为 True，只有 wall_time 和 fun。
+多个深度共用一次批量求解时（如 optimize_CLHS_parameters），每个深度一行，batch_size 为该批的深度数，
+objective_calls、objective_time 和 wall_time 均为整批的值（按批汇总时每批只计一次）。
+优化函数通过 instrumentation 参数接收 Instrumentation 对象；不传入时没有任何额外开销。
+
+示例:
+    instrumentation = Instrumentation()
+    with instrumentation.stage('load'):
+        processor = DtsDataProcessing(data)
+    with instrumentation.stage('fit'):
+        optimize_soil_properties_RMSE(..., instrumentation=instrumentation)
+    instrumentation.to_frame()        # 每个深度一行
+    instrumentation.stage_frame()     # 每个阶段一行
+"""
+import time
+from contextlib import contextmanager
+
+
+class CountedObjective:
+    """包装目标函数，统计调用次数和累计耗时"""
+
+    __slots__ = ('function', 'calls', 'time')
+
+    def __init__(self, function):
+        self.function = function
+        self.calls = 0
+        self.time = 0.0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.function(*args, **kwargs)
+        finally:
+            self.time += time.perf_counter() - start
+            self.calls += 1
+
+
+class Instrumentation:
+    """
+    收集求解器统计信息和阶段耗时。
+
+    记录为普通的字典列表，开销仅为几次 perf_counter 调用和列表追加，可在生产环境中常开。
+    """
+
+    COLUMNS = ('solver', 'depth', 'nfev', 'nit', 'objective_calls', 'objective_time',
+               'wall_time', 'success', 'status', 'message', 'fun', 'cached', 'batch_size')
+
+    def __init__(self):
+        self.records = []
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """累计一个阶段（如 'load'、'extract'、'fit'）的耗时和执行次数"""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            total, count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + elapsed, count + 1)
+
+    def wrap_objective(self, function):
+        """返回统计调用次数和耗时的目标函数包装"""
+        return CountedObjective(function)
+
+    def record(self, solver, depth=None, **fields):
+        """追加一条记录，未给出的字段记为 None（cached 默认为 False，batch_size 默认为 1）"""
+        record = dict.fromkeys(self.COLUMNS)
+        record.update(cached=False, batch_size=1)
+        record.update(fields, solver=solver, depth=depth)
+        self.records.append(record)
+
+    def record_result(self, solver, depth, result, wall_time, objective=None):
+        """
+        从 scipy 的 OptimizeResult（或具有相同属性的对象）中提取统计信息并记录。
+
+        :param solver: 求解函数名称
+        :param depth: 深度（数据集）序号
+        :param result: 优化结果
+        :param wall_time: 该深度的总耗时（秒）
+        :param objective: 对应的 CountedObjective（可选）
+        """
+        self.record(
+            solver, depth,
+            nfev=getattr(result, 'nfev', None),
+            nit=getattr(result, 'nit', None),
+            objective_calls=None if objective is None else objective.calls,
+            objective_time=None if objective is None else objective.time,
+            wall_time=wall_time,
+            success=getattr(result, 'success', None),
+            status=getattr(result, 'status', None),
+            message=getattr(result, 'message', None),
+            fun=getattr(result, 'fun', None),
+        )
+
+    def record_cached(self, solver, depth, wall_time, fun=None):
+        """记录一次命中结果缓存的求解（没有求解统计，wall_time 为读取缓存的耗时）"""
+        self.record(solver, depth, wall_time=wall_time, fun=fun, cached=True)
+
+    def merge(self, other):
+        """合并另一个 Instrumentation（如工作进程返回的）的记录和阶段耗时"""
+        self.records.extend(other.records)
+        for name, (total, count) in other.stages.items():
+            previous_total, previous_count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (previous_total + total, previous_count + count)
+
+    def clear(self):
+        """清空所有记录"""
+        self.records.clear()
+        self.stages.clear()
+
+    def to_frame(self):
+        """以 pandas.DataFrame 返回逐深度的求解统计"""
+        import pandas as pd
+        return pd.DataFrame(self.records, columns=list(self.COLUMNS))
+
+    def stage_frame(self):
+        """以 pandas.DataFrame 返回各阶段的累计耗时"""
+        import pandas as pd
+        return pd.DataFrame(
+            [(name, total, count) for name, (total, count) in self.stages.items()],
+            columns=['stage', 'wall_time', 'count'],
+        )
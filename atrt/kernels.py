@@ -0,0 +1,490 @@
+"""
+正演模型与目标函数的计算内核
+
+优化器每次迭代都要调用一次目标函数，NFM_Kluitenberg 中的掩码数组、calc_rmse_std 中逐点的
+quad 数值积分都有较大的 Python 与临时数组开销。本模块为 Kluitenberg 脉冲模型、
+持续线热源 (CLHS) E1 模型和越流井函数模型提供把正演计算与 RMSE 归约融合在一起的内核：
+
+- 'scipy' : 原有的参考实现（NFM_Kluitenberg、calc_rmse_std），默认值，结果与以前完全相同
+- 'numpy' : 纯 NumPy/SciPy 向量化实现，越流井函数使用 leaky_well_function 代替逐点 quad
+- 'numba' : 安装 numba 时可用，标量循环经 JIT 编译，E1 与井函数积分在循环内计算，不产生临时数组
+- 'auto'  : 安装了 numba 时使用 'numba'，否则使用 'numpy'
+
+后端通过 set_kernel_backend 全局切换，optimize_soil_properties_RMSE、optimize_parameters_GD
+和 optimize_parameters_SA 通过 kluitenberg_objective / leaky_well_objective 取得目标函数。
+越流井函数的两种快速实现与 quad 参考结果的相对误差约 1e-6，其余模型在舍入误差以内一致。
+只依赖时间轴的不变量和工作数组可由 fit_context.FitContext 缓存，目标函数均接受 context 参数。
+
+示例:
+    from atrt.kernels import set_kernel_backend
+    set_kernel_backend('auto')
+    optimize_soil_properties_RMSE(time, data, variables, initial_guess)
+"""
+import math
+from types import SimpleNamespace
+
+import numpy as np
+
+from . import _scipy
+from .flowrate_function import leaky_well_function
+
+BACKENDS = ('scipy', 'numpy', 'numba')
+
+_backend = 'scipy'
+_loop_kernels = {}
+
+# expi/E1 参数的阈值，与 DTPM_calcfunc.MAX_EXPI_ARG 一致
+_MAX_E1_ARG = 700.0
+# 越流井函数的 Gauss-Legendre 求积设置，与 leaky_well_function 的默认值一致
+_WELL_PANELS = 8
+_WELL_NODES, _WELL_WEIGHTS = np.polynomial.legendre.leggauss(16)
+
+
+def numba_available():
+    """numba 是否已安装"""
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def set_kernel_backend(name):
+    """
+    设置计算后端。
+
+    :param name: 'scipy'、'numpy'、'numba' 或 'auto'
+    :return: 实际使用的后端名称
+    """
+    global _backend
+    if name == 'auto':
+        name = 'numba' if numba_available() else 'numpy'
+    if name not in BACKENDS:
+        raise ValueError(f"未知的计算后端: {name!r}，可选 {BACKENDS + ('auto',)}")
+    if name == 'numba':
+        _get_loop_kernels('numba')  # 未安装 numba 时在此抛出 ImportError
+    _backend = name
+    return name
+
+
+def get_kernel_backend():
+    """返回当前的计算后端名称"""
+    return _backend
+
+
+# ---------------------------------------------------------------------------
+# 标量循环内核。以普通 Python 函数编写，安装 numba 时经 numba.njit 编译；
+# 未编译时也可直接运行（较慢），用于在没有 numba 的环境中检查循环逻辑。
+# ---------------------------------------------------------------------------
+def _make_loop_kernels(jit):
+    euler_gamma = 0.5772156649015329
+
+    @jit
+    def e1(x):
+        # 指数积分 E1(x)，x > 0：x <= 1 时用级数，否则用连分式（修正 Lentz 法）
+        if x <= 1.0:
+            total = -euler_gamma - math.log(x)
+            term = 1.0
+            for k in range(1, 100):
+                term *= -x / k
+                contribution = -term / k
+                total += contribution
+                if abs(contribution) < 1e-17 * abs(total):
+                    break
+            return total
+        b = x + 1.0
+        c = 1e300
+        d = 1.0 / b
+        h = d
+        for i in range(1, 1000):
+            an = -float(i * i)
+            b += 2.0
+            d = 1.0 / (an * d + b)
+            c = b + an / c
+            delta = c * d
+            h *= delta
+            if abs(delta - 1.0) < 1e-16:
+                break
+        return h * math.exp(-x)
+
+    @jit
+    def kluitenberg_point(ti, k, coef, r, t0, limit):
+        # 单个时刻的温升；t <= 0 或 E1 参数不小于 limit 时返回 nan
+        if ti <= 0.0:
+            return np.nan
+        x1 = r * r / (4.0 * k * ti)
+        if not (0.0 < x1 < limit):
+            return np.nan
+        if ti <= t0:
+            return coef * e1(x1)
+        x2 = r * r / (4.0 * k * (ti - t0))
+        if not (0.0 < x2 < limit):
+            return np.nan
+        return coef * (e1(x1) - e1(x2))
+
+    @jit
+    def kluitenberg_rmse(Cv, lambda_, T_measured, t, r, q, t0):
+        k = lambda_ / Cv
+        coef = q / Cv / (4.0 * np.pi * k)
+        total = 0.0
+        count = 0
+        for i in range(t.shape[0]):
+            difference = T_measured[i] - kluitenberg_point(t[i], k, coef, r, t0, _MAX_E1_ARG)
+            if difference == difference:  # 跳过 nan，与 np.nanmean 一致
+                total += difference * difference
+                count += 1
+        if count == 0:
+            return np.nan
+        return math.sqrt(total / count)
+
+    @jit
+    def kluitenberg_temperature(Cv, lambda_, t, r, q, t0):
+        k = lambda_ / Cv
+        coef = q / Cv / (4.0 * np.pi * k)
+        out = np.empty(t.shape[0])
+        for i in range(t.shape[0]):
+            out[i] = kluitenberg_point(t[i], k, coef, r, t0, np.inf)
+        return out
+
+    @jit
+    def clhs_temperature(t, q, k, alpha, r):
+        coef = q / (4.0 * np.pi * k)
+        out = np.empty(t.shape[0])
+        for i in range(t.shape[0]):
+            out[i] = coef * e1(r * r / (4.0 * alpha * max(t[i], 1e-6)))
+        return out
+
+    @jit
+    def clhs_rmse(alpha, k, T_measured, t, q, r):
+        coef = q / (4.0 * np.pi * k)
+        total = 0.0
+        for i in range(t.shape[0]):
+            difference = T_measured[i] - coef * e1(r * r / (4.0 * alpha * max(t[i], 1e-6)))
+            total += difference * difference
+        return math.sqrt(total / t.shape[0])
+
+    @jit
+    def well(u, b, nodes, weights, panels):
+        # 与 leaky_well_function 相同的对数代换分段 Gauss-Legendre 求积
+        c = b * b / 4.0
+        y_low = math.log(u)
+        if c > 0.0:
+            y_low = max(y_low, math.log(c / 40.0))
+        y_high = max(math.log(u + 40.0), y_low)
+        width = (y_high - y_low) / panels
+        total = 0.0
+        for p in range(panels):
+            center = y_low + width * (p + 0.5)
+            for j in range(nodes.shape[0]):
+                exp_y = math.exp(center + width / 2.0 * nodes[j])
+                total += weights[j] * math.exp(-exp_y - c / exp_y)
+        return total * width / 2.0
+
+    @jit
+    def leaky_well_temperature(T_steady, b, A, t, k0, nodes, weights, panels):
+        out = np.zeros(t.shape[0])  # 第一个时刻按 calc_rmse_std 的约定取 0
+        for i in range(1, t.shape[0]):
+            out[i] = T_steady * well(A / t[i], b, nodes, weights, panels) / (2.0 * k0)
+        return out
+
+    @jit
+    def leaky_well_rmse_std(T_steady, b, A, t, T_measured, calc_timeidx, k0, nodes, weights, panels):
+        total = 0.0
+        total_squared = 0.0
+        count = 0
+        for i in range(calc_timeidx, t.shape[0]):
+            predicted = 0.0
+            if i > 0:
+                predicted = T_steady * well(A / t[i], b, nodes, weights, panels) / (2.0 * k0)
+            residual = predicted - T_measured[i]
+            total += residual
+            total_squared += residual * residual
+            count += 1
+        mean_squared = total_squared / count
+        mean = total / count
+        rmse = math.sqrt(mean_squared)
+        std = math.sqrt(max(mean_squared - mean * mean, 0.0))
+        return 0.5 * rmse + 0.5 * std
+
+    return SimpleNamespace(
+        e1=e1,
+        kluitenberg_rmse=kluitenberg_rmse,
+        kluitenberg_temperature=kluitenberg_temperature,
+        clhs_temperature=clhs_temperature,
+        clhs_rmse=clhs_rmse,
+        well=well,
+        leaky_well_temperature=leaky_well_temperature,
+        leaky_well_rmse_std=leaky_well_rmse_std,
+    )
+
+
+def _get_loop_kernels(kind):
+    """kind 为 'numba'（编译）或 'python'（不编译，用于测试）"""
+    if kind not in _loop_kernels:
+        if kind == 'numba':
+            import numba
+            jit = numba.njit(nogil=True)
+        else:
+            def jit(function):
+                return function
+        _loop_kernels[kind] = _make_loop_kernels(jit)
+    return _loop_kernels[kind]
+
+
+def _as_float_array(values):
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+# ---------------------------------------------------------------------------
+# NumPy 向量化实现
+# ---------------------------------------------------------------------------
+def _kluitenberg_temperature_numpy(Cv, lambda_, t, r, q, t0, mask_invalid):
+    exp1 = _scipy.special().exp1
+
+    k = lambda_ / Cv
+    coef = q / Cv / (4 * np.pi * k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x1 = r ** 2 / (4 * k * t)
+        x2 = r ** 2 / (4 * k * (t - t0))
+    heating = (t > 0) & (t <= t0)
+    cooling = t > t0
+    if mask_invalid:
+        heating = heating & (x1 < _MAX_E1_ARG)
+        cooling = cooling & (x1 < _MAX_E1_ARG) & (x2 < _MAX_E1_ARG)
+    e1_x1 = exp1(np.where(heating | cooling, x1, 1.0))
+    e1_x2 = exp1(np.where(cooling, x2, 1.0))
+    return np.where(heating, coef * e1_x1, np.where(cooling, coef * (e1_x1 - e1_x2), np.nan))
+
+
+def _clhs_temperature_numpy(t, q, k, alpha, r):
+    exp1 = _scipy.special().exp1
+
+    return (q / (4 * np.pi * k)) * exp1(r ** 2 / (4 * alpha * np.maximum(t, 1e-6)))
+
+
+def _leaky_well_temperature_numpy(T_steady, b, A, t, k0):
+    temperature = np.zeros(len(t))
+    temperature[1:] = T_steady * leaky_well_function(A / t[1:], b) / (2 * k0)
+    return temperature
+
+
+def _leaky_well_rmse_std_numpy(T_steady, b, A, t, T_measured, calc_timeidx, k0):
+    residuals = (_leaky_well_temperature_numpy(T_steady, b, A, t, k0) - T_measured)[calc_timeidx:]
+    return 0.5 * np.sqrt(np.mean(residuals ** 2)) + 0.5 * np.std(residuals)
+
+
+# ---------------------------------------------------------------------------
+# 按后端分派的公开内核
+# ---------------------------------------------------------------------------
+def _resolve(backend):
+    backend = _backend if backend is None else backend
+    if backend == 'auto':
+        backend = 'numba' if numba_available() else 'numpy'
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的计算后端: {backend!r}")
+    return backend
+
+
+def kluitenberg_temperature(Cv, lambda_, t, r, q, t0, backend=None):
+    """
+    Kluitenberg 脉冲模型的理论温升（与 calc_temp 相同）。
+
+    :param Cv: 体积热容 (J/(m^3·K))
+    :param lambda_: 导热系数 (W/(m·K))
+    :param t: 时间 (s)
+    :param r: 径向距离 (m)
+    :param q: 热源强度 (W/m)
+    :param t0: 加热持续时间 (s)
+    :param backend: 使用的后端，默认为当前全局后端
+    :return: 理论温升，t <= 0 处为 nan
+    """
+    backend = _resolve(backend)
+    t = _as_float_array(t)
+    if backend == 'scipy':
+        from .DTPM_calcfunc import calc_temp
+        return calc_temp([Cv, lambda_], t, [r, q, t0])
+    if backend == 'numpy':
+        return _kluitenberg_temperature_numpy(Cv, lambda_, t, r, q, t0, mask_invalid=False)
+    return _get_loop_kernels('numba').kluitenberg_temperature(
+        float(Cv), float(lambda_), t, float(r), float(q), float(t0))
+
+
+def kluitenberg_rmse(Cv, lambda_, T_measured, t, r, q, t0, backend=None):
+    """Kluitenberg 脉冲模型的 RMSE（与 NFM_Kluitenberg 相同，忽略无效时刻）"""
+    backend = _resolve(backend)
+    if backend == 'scipy':
+        from .DTPM_calcfunc import NFM_Kluitenberg
+        return NFM_Kluitenberg([Cv, lambda_], T_measured, _as_float_array(t), [r, q, t0])
+    t = _as_float_array(t)
+    T_measured = _as_float_array(T_measured)
+    if backend == 'numpy':
+        predicted = _kluitenberg_temperature_numpy(Cv, lambda_, t, r, q, t0, mask_invalid=True)
+        return np.sqrt(np.nanmean((T_measured - predicted) ** 2))
+    return _get_loop_kernels('numba').kluitenberg_rmse(
+        float(Cv), float(lambda_), T_measured, t, float(r), float(q), float(t0))
+
+
+def clhs_temperature(t, q, k, alpha, r=0.0007, backend=None):
+    """持续线热源模型的理论温升（与 temperature_response 相同）"""
+    backend = _resolve(backend)
+    t = _as_float_array(t)
+    if backend == 'scipy':
+        from .thermal_conductivity_function import temperature_response
+        return temperature_response(t, q, k, alpha, r)
+    if backend == 'numpy':
+        return _clhs_temperature_numpy(t, q, k, alpha, r)
+    return _get_loop_kernels('numba').clhs_temperature(t, float(q), float(k), float(alpha), float(r))
+
+
+def clhs_rmse(alpha, lambda_, T_measured, t, q, r=0.0007, backend=None):
+    """持续线热源模型的 RMSE（与 CLHS_RMSE 相同）"""
+    backend = _resolve(backend)
+    t = _as_float_array(t)
+    T_measured = _as_float_array(T_measured)
+    if backend == 'scipy':
+        from .thermal_conductivity_function import CLHS_RMSE
+        return CLHS_RMSE([alpha, lambda_], T_measured, t, q, r)
+    if backend == 'numpy':
+        return np.sqrt(np.mean((T_measured - _clhs_temperature_numpy(t, q, lambda_, alpha, r)) ** 2))
+    return _get_loop_kernels('numba').clhs_rmse(float(alpha), float(lambda_), T_measured, t,
+                                                float(q), float(r))
+
+
+def leaky_well_temperature(parameter_estimated, time, backend=None):
+    """越流井函数模型的理论温升（与 compute_temperature 相同，第一个时刻为 0）"""
+    backend = _resolve(backend)
+    time = _as_float_array(time)
+    if backend == 'scipy':
+        from .flowrate_function import compute_temperature
+        return compute_temperature(parameter_estimated, time)
+    kv = _scipy.special().kv
+
+    T_steady, b, A = (float(value) for value in parameter_estimated[:3])
+    k0 = float(kv(0, b))
+    if backend == 'numpy':
+        return _leaky_well_temperature_numpy(T_steady, b, A, time, k0)
+    return _get_loop_kernels('numba').leaky_well_temperature(
+        T_steady, b, A, time, k0, _WELL_NODES, _WELL_WEIGHTS, _WELL_PANELS)
+
+
+def leaky_well_rmse_std(parameter_process_0, t_observed, temp_observed, calc_timeidx, backend=None):
+    """
+    越流井函数模型的 RMSE 与残差标准差的加权平均（与 calc_rmse_std 相同）。
+
+    'numpy' 和 'numba' 后端在 A <= 0（井函数发散）时返回 inf。
+    """
+    backend = _resolve(backend)
+    if backend == 'scipy':
+        from .flowrate_function import calc_rmse_std
+        return calc_rmse_std(parameter_process_0, t_observed, temp_observed, calc_timeidx)
+    kv = _scipy.special().kv
+
+    T_steady, b, A = (float(value) for value in parameter_process_0[:3])
+    if not A > 0:
+        return np.inf
+    k0 = float(kv(0, b))
+    t_observed = _as_float_array(t_observed)
+    temp_observed = _as_float_array(temp_observed)
+    if backend == 'numpy':
+        return _leaky_well_rmse_std_numpy(T_steady, b, A, t_observed, temp_observed,
+                                          calc_timeidx, k0)
+    return _get_loop_kernels('numba').leaky_well_rmse_std(
+        T_steady, b, A, t_observed, temp_observed, int(calc_timeidx), k0,
+        _WELL_NODES, _WELL_WEIGHTS, _WELL_PANELS)
+
+
+def kluitenberg_objective(T_measured, t, variables, backend=None, context=None):
+    """
+    返回当前后端下的 Kluitenberg RMSE 目标函数 f([Cv, lambda])。
+
+    输入数组只在此处转换一次，每次调用不再复制。给出由 t 创建的 FitContext 时忽略 backend，
+    使用其缓存的不变量和工作数组。
+    """
+    r, q, t0 = variables
+    if context is not None:
+        context.check_time(t)
+        T_measured = context._check(T_measured)
+        return lambda x: context.kluitenberg_rmse(x[0], x[1], T_measured, r, q, t0)
+    backend = _resolve(backend)
+    if backend == 'scipy':
+        from functools import partial
+        from .DTPM_calcfunc import NFM_Kluitenberg
+        return partial(NFM_Kluitenberg, T_measured=T_measured, t=t, variables=list(variables))
+    t = _as_float_array(t)
+    T_measured = _as_float_array(T_measured)
+    if backend == 'numpy':
+        def objective(x):
+            predicted = _kluitenberg_temperature_numpy(x[0], x[1], t, r, q, t0, mask_invalid=True)
+            return np.sqrt(np.nanmean((T_measured - predicted) ** 2))
+        return objective
+    kernel = _get_loop_kernels('numba').kluitenberg_rmse
+    r, q, t0 = float(r), float(q), float(t0)
+    return lambda x: kernel(float(x[0]), float(x[1]), T_measured, t, r, q, t0)
+
+
+def leaky_well_objective(t_observed, temp_observed, calc_timeidx, backend=None, context=None):
+    """
+    返回当前后端下的越流井函数目标函数 f([T_steady, r_divide_B, A])。
+
+    给出由 t_observed 创建的 FitContext 时忽略 backend，使用其缓存的不变量和工作数组。
+    """
+    if context is not None:
+        context.check_time(t_observed)
+        temp_observed = context._check(temp_observed)
+        return lambda parameter: context.leaky_well_rmse_std(parameter, temp_observed, calc_timeidx)
+    backend = _resolve(backend)
+    if backend == 'scipy':
+        from .flowrate_function import calc_rmse_std
+        return lambda parameter: calc_rmse_std(parameter, t_observed, temp_observed, calc_timeidx)
+    t_observed = _as_float_array(t_observed)
+    temp_observed = _as_float_array(temp_observed)
+    return lambda parameter: leaky_well_rmse_std(parameter, t_observed, temp_observed,
+                                                 calc_timeidx, backend=backend)
+
+
+# ---------------------------------------------------------------------------
+# 种群批量目标函数（差分进化等全局优化一次评估整代种群）
+# ---------------------------------------------------------------------------
+def kluitenberg_rmse_batch(parameters, T_measured, t, r, q, t0):
+    """
+    一次计算一组参数 [Cv, lambda] 的 Kluitenberg RMSE（NumPy 向量化，不受全局后端影响）。
+
+    :param parameters: 参数数组 (S, 2)
+    :return: RMSE (S,)，与 kluitenberg_rmse 相同地忽略无效时刻；没有有效时刻时为 inf
+    """
+    parameters = np.atleast_2d(np.asarray(parameters, dtype=float))
+    t = _as_float_array(t)
+    T_measured = _as_float_array(T_measured)
+    predicted = _kluitenberg_temperature_numpy(parameters[:, 0:1], parameters[:, 1:2], t, r, q, t0,
+                                               mask_invalid=True)
+    squared = (T_measured - predicted) ** 2
+    valid = np.isfinite(squared)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse = np.sqrt(np.where(valid, squared, 0.0).sum(axis=1) / count)
+    return np.where(count > 0, rmse, np.inf)
+
+
+def leaky_well_rmse_std_batch(parameters, t_observed, temp_observed, calc_timeidx):
+    """
+    一次计算一组参数 [T_steady, r_divide_B, A] 的 RMSE 与残差标准差的加权平均
+    （calc_rmse_std 的向量化版本，越流井函数使用 leaky_well_function，不受全局后端影响）。
+
+    :param parameters: 参数数组 (S, 3)
+    :return: 目标函数值 (S,)，A <= 0 或 r_divide_B <= 0 时为 inf
+    """
+    kv = _scipy.special().kv
+
+    parameters = np.atleast_2d(np.asarray(parameters, dtype=float))
+    t_observed = _as_float_array(t_observed)
+    temp_observed = _as_float_array(temp_observed)
+    T_steady, b, A = (parameters[:, i:i + 1] for i in range(3))
+    feasible = (A[:, 0] > 0) & (b[:, 0] > 0)
+    b = np.where(feasible[:, np.newaxis], b, 1.0)
+    A = np.where(feasible[:, np.newaxis], A, 1.0)
+
+    temperature = np.zeros((len(parameters), len(t_observed)))
+    temperature[:, 1:] = T_steady * leaky_well_function(A / t_observed[1:], b) / (2 * kv(0, b))
+    residuals = (temperature - temp_observed)[:, calc_timeidx:]
+    value = 0.5 * np.sqrt(np.mean(residuals ** 2, axis=1)) + 0.5 * np.std(residuals, axis=1)
+    return np.where(feasible, value, np.inf)
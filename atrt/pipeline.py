@@ -0,0 +1,358 @@
+"""
+从 DTS 数据到物性剖面的流式分析流程
+
+AnalysisPipeline 以声明方式配置各分析阶段：
+
+    提取加热数据 → 功率校正 → 导热系数 / DTPM / 地下水流速反演 → 含水率换算
+
+加热深度段按固定大小的深度块依次提取并交给执行器处理，
+同一时刻最多只有有限个深度块在内存中，执行器可选串行、线程池或进程池。
+每个加热事件输出一张整洁的结果表（每个深度一行）。
+
+示例:
+    pipeline = AnalysisPipeline(
+        current=10, block_size=50, executor='process', max_workers=4,
+        thermal_conductivity={'start_calc_hour': 0.5, 'end_calc_hour': 2},
+        dtpm={'r': 0.006, 'initial_guess': [2.5e6, 1.5]},
+        moisture={'initial_guess': [1.5, 0.2]},
+    )
+    results = pipeline.run(processor, [
+        {'name': 'event1', 'start_str': '2024/01/01 10:00:00', 'end_str': '2024/01/01 12:00:00',
+         'top_idx': 10, 'bottom_idx': 400},
+    ])
+    results['event1']   # pandas.DataFrame
+"""
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from .instrumentation import Instrumentation
+
+
+class _SerialExecutor(Executor):
+    """在当前线程内立即执行任务的执行器"""
+
+    def submit(self, fn, *args, **kwargs):
+        from concurrent.futures import Future
+
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def _process_block(block, config):
+    """
+    处理一个深度块，返回 (结果列字典, Instrumentation 或 None)。
+
+    定义在模块顶层，以便进程池序列化。
+    """
+    from .thermal_conductivity_function import (
+        corrected_power_matrix,
+        calculate_thermal_conductivity,
+        scan_thermal_conductivity_windows,
+    )
+
+    seconds = block['seconds']
+    temperature = block['temperature']
+    natural_temp = block['natural_temp']
+    n_depths = temperature.shape[0]
+    instrumentation = Instrumentation() if config['instrumentation'] else None
+
+    def stage(name):
+        if instrumentation is None:
+            from contextlib import nullcontext
+            return nullcontext()
+        return instrumentation.stage(name)
+
+    columns = {
+        'depth_index': block['depth_index'],
+        'depth': block['depth'],
+        'natural_temp': natural_temp,
+    }
+    temperature_rise = temperature - natural_temp[:, np.newaxis]
+
+    # 功率校正
+    with stage('power'):
+        if config['current'] is not None:
+            _, heating_power = corrected_power_matrix(
+                config['current'], temperature, natural_temp,
+                R0=config['R0'], alpha=config['alpha'], time=seconds
+            )
+        else:
+            heating_power = np.full(n_depths, float(config['heating_power']))
+    columns['heating_power'] = heating_power
+
+    # 导热系数（ln(t) 线性拟合）
+    thermal_conductivity = None
+    options = config['thermal_conductivity']
+    if options is not None:
+        with stage('thermal_conductivity'):
+            if options.get('start_calc_hour') is None or options.get('end_calc_hour') is None:
+                scan = scan_thermal_conductivity_windows(
+                    temperature_rise, seconds, heating_power,
+                    **{key: value for key, value in options.items()
+                       if key not in ('start_calc_hour', 'end_calc_hour')}
+                )
+                thermal_conductivity = scan['best_thermal_conductivity']
+                columns['thermal_conductivity_error'] = scan['best_error']
+                columns['r_squared'] = scan['best_r_squared']
+                columns['start_calc_hour'] = scan['best_start_hour']
+                columns['end_calc_hour'] = scan['best_end_hour']
+            else:
+                thermal_conductivity = np.full(n_depths, np.nan)
+                error = np.full(n_depths, np.nan)
+                r_squared = np.full(n_depths, np.nan)
+                for i in range(n_depths):
+                    try:
+                        thermal_conductivity[i], error[i], r_squared[i], _, _ = \
+                            calculate_thermal_conductivity(
+                                temperature_rise[i], seconds, options['start_calc_hour'],
+                                options['end_calc_hour'], heating_power[i], cache=config['cache']
+                            )
+                    except (ValueError, RuntimeError):
+                        pass
+                columns['thermal_conductivity_error'] = error
+                columns['r_squared'] = r_squared
+        columns['thermal_conductivity'] = thermal_conductivity
+
+    # DTPM 反演
+    Cv = None
+    options = config['dtpm']
+    if options is not None:
+        from .DTPM_calcfunc import optimize_soil_properties_RMSE
+
+        with stage('dtpm'):
+            t0 = options.get('t0', seconds[-1])
+            Cv, lambda_dtpm, rmse = optimize_soil_properties_RMSE(
+                seconds, temperature_rise, [options['r'], heating_power, t0],
+                options['initial_guess'], instrumentation=instrumentation, cache=config['cache']
+            )
+        columns['Cv'] = Cv
+        columns['lambda_dtpm'] = lambda_dtpm
+        columns['rmse_dtpm'] = rmse
+        if thermal_conductivity is None:
+            thermal_conductivity = lambda_dtpm
+
+    # 地下水流速反演
+    options = config['flow']
+    if options is not None:
+        from .flowrate_function import optimize_parameters_GD, calculate_flow_rate
+
+        parameters = np.full((n_depths, 3), np.nan)
+        rmse_std = np.full(n_depths, np.nan)
+        with stage('flow'):
+            for i in range(n_depths):
+                parameters[i], rmse_std[i], _ = optimize_parameters_GD(
+                    seconds, temperature_rise[i], options.get('calc_timeidx', 1),
+                    options['initial_guess'], options.get('method', 'Nelder-Mead'),
+                    instrumentation=instrumentation, depth=i, cache=config['cache'], disp=False
+                )
+        columns['T_steady'] = parameters[:, 0]
+        columns['r_divide_B'] = parameters[:, 1]
+        columns['A'] = parameters[:, 2]
+        columns['rmse_std_flow'] = rmse_std
+
+        rho_c_soil = Cv if Cv is not None else options.get('rho_c_soil')
+        if rho_c_soil is not None and thermal_conductivity is not None:
+            columns['flow_rate'] = calculate_flow_rate(parameters.T, rho_c_soil,
+                                                       thermal_conductivity)
+
+    # 含水率与干密度换算（Cv 以 MJ/(m³·K) 计）
+    options = config['moisture']
+    if options is not None and Cv is not None and thermal_conductivity is not None:
+        from .DTPM_calcfunc import calc_mositureanddensities_micon
+
+        with stage('moisture'):
+            water_moisture, densities = calc_mositureanddensities_micon(
+                Cv / 1e6, thermal_conductivity, options['initial_guess'],
+                **{key: value for key, value in options.items() if key != 'initial_guess'}
+            )
+        columns['water_moisture'] = water_moisture
+        columns['density'] = densities
+
+    if instrumentation is not None:
+        # 求解记录中的深度序号改为全局深度索引
+        for record in instrumentation.records:
+            if record['depth'] is not None:
+                record['depth'] = int(block['depth_index'][record['depth']])
+
+    return columns, instrumentation
+
+
+class AnalysisPipeline:
+    """
+    声明式的流式分析流程。
+
+    各分析阶段通过字典参数配置，为 None 时跳过该阶段：
+
+    - thermal_conductivity : {'start_calc_hour', 'end_calc_hour'}；
+      两者缺省时改用 scan_thermal_conductivity_windows 自动选择窗口，
+      其余键作为扫描参数（如 hour_grid、min_r_squared）
+    - dtpm : {'r', 'initial_guess', 't0'(可选，默认为整个提取时段)}
+    - flow : {'initial_guess', 'calc_timeidx'(默认 1), 'method'(默认 'Nelder-Mead'),
+      'rho_c_soil'(无 DTPM 结果时使用)}
+    - moisture : {'initial_guess', 其余键传给 calc_mositureanddensities_micon}
+
+    加热功率：给定 current 时使用 corrected_power_matrix 按深度校正，
+    否则所有深度使用常数 heating_power。
+    """
+
+    def __init__(self, current=None, heating_power=None, R0=0.08, alpha=0.00393,
+                 thermal_conductivity=None, dtpm=None, flow=None, moisture=None,
+                 block_size=50, executor='serial', max_workers=None, max_pending=None,
+                 instrumentation=None, cache=None):
+        """
+        Parameters:
+        -----------
+        current : float, optional
+            加热电流 (A)
+        heating_power : float, optional
+            未给定 current 时使用的常数加热功率 (W/m)
+        R0, alpha : float, optional
+            传给 corrected_power_matrix 的电阻参数
+        thermal_conductivity, dtpm, flow, moisture : dict, optional
+            各分析阶段的配置，见类说明
+        block_size : int, optional
+            每个深度块的深度数，默认为 50
+        executor : str or concurrent.futures.Executor, optional
+            'serial'、'thread'、'process' 或已有的执行器实例，默认为 'serial'
+        max_workers : int, optional
+            线程池/进程池的工作者数，默认与 concurrent.futures 相同；executor 为已有执行器实例时
+            应给出其工作者数，用于确定 max_pending 的默认值（不给出时按 1 计）
+        max_pending : int, optional
+            同时在处理中的深度块数上限，默认为工作者数的两倍；用于限制内存占用
+        instrumentation : Instrumentation, optional
+            记录各阶段耗时和求解统计
+        cache : ResultCache or str, optional
+            拟合结果缓存或缓存目录路径，重新运行时跳过输入未变的深度
+        """
+        if current is None and heating_power is None:
+            raise ValueError("current和heating_power至少需要给定一个")
+        if block_size < 1:
+            raise ValueError("block_size必须为正整数")
+        if moisture is not None and dtpm is None:
+            raise ValueError("含水率换算需要DTPM阶段提供Cv")
+
+        from .cache import as_result_cache
+
+        self.config = {
+            'current': current,
+            'heating_power': heating_power,
+            'R0': R0,
+            'alpha': alpha,
+            'thermal_conductivity': thermal_conductivity,
+            'dtpm': dtpm,
+            'flow': flow,
+            'moisture': moisture,
+            'instrumentation': instrumentation is not None,
+            # 目录路径只在此处转换一次，各深度的拟合共用同一个 ResultCache
+            'cache': as_result_cache(cache),
+        }
+        self.block_size = int(block_size)
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.instrumentation = instrumentation
+
+    def _make_executor(self):
+        """返回 (执行器, 是否由本对象负责关闭, 工作者数)"""
+        if isinstance(self.executor, Executor):
+            return self.executor, False, self.max_workers or 1
+        if self.executor == 'serial':
+            return _SerialExecutor(), True, 1
+        if self.executor == 'thread':
+            workers = self.max_workers or min(32, (os.cpu_count() or 1) + 4)
+            return ThreadPoolExecutor(max_workers=workers), True, workers
+        if self.executor == 'process':
+            workers = self.max_workers or os.cpu_count() or 1
+            return ProcessPoolExecutor(max_workers=workers), True, workers
+        raise ValueError(f"未知的执行器: {self.executor}")
+
+    def iter_blocks(self, processor, event):
+        """按深度块依次提取加热数据，每次只生成一个块"""
+        top_idx = event.get('top_idx', 0)
+        bottom_idx = event.get('bottom_idx', len(processor.depth) - 1)
+
+        for block_top in range(top_idx, bottom_idx + 1, self.block_size):
+            block_bottom = min(block_top + self.block_size - 1, bottom_idx)
+            if self.instrumentation is not None:
+                with self.instrumentation.stage('extract'):
+                    extracted = processor.extraction_heating_data(
+                        block_top, block_bottom, event['start_str'], event['end_str'])
+            else:
+                extracted = processor.extraction_heating_data(
+                    block_top, block_bottom, event['start_str'], event['end_str'])
+            seconds, temperature, natural_temp = extracted
+            depth_index = np.arange(block_top, block_bottom + 1)
+            yield {
+                'seconds': np.asarray(seconds, dtype=float),
+                'temperature': np.array(temperature, dtype=float),
+                'natural_temp': np.asarray(natural_temp, dtype=float),
+                'depth_index': depth_index,
+                'depth': processor.depth[depth_index],
+            }
+
+    def run_event(self, processor, event):
+        """
+        分析单个加热事件。
+
+        Parameters:
+        -----------
+        processor : DtsDataProcessing
+            DTS 数据
+        event : dict
+            {'start_str', 'end_str', 'top_idx'(可选), 'bottom_idx'(可选), 'name'(可选)}
+
+        Returns:
+        --------
+        pandas.DataFrame
+            每个深度一行的结果表
+        """
+        import pandas as pd
+
+        executor, owned, workers = self._make_executor()
+        max_pending = self.max_pending
+        if max_pending is None:
+            max_pending = 2 * workers
+
+        pending = deque()
+        blocks = []
+
+        def collect(future):
+            columns, instrumentation = future.result()
+            blocks.append(pd.DataFrame(columns))
+            if instrumentation is not None:
+                self.instrumentation.merge(instrumentation)
+
+        try:
+            for block in self.iter_blocks(processor, event):
+                # 处理中的块达到上限时等待最早的块完成（背压）
+                while len(pending) >= max_pending:
+                    collect(pending.popleft())
+                pending.append(executor.submit(_process_block, block, self.config))
+            while pending:
+                collect(pending.popleft())
+        finally:
+            if owned:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        table = pd.concat(blocks, ignore_index=True)
+        table.insert(0, 'event', event.get('name', event['start_str']))
+        return table
+
+    def run(self, processor, events):
+        """
+        依次分析多个加热事件。
+
+        Returns:
+        --------
+        dict
+            事件名称（未给出 name 时为 start_str）到结果表的映射
+        """
+        return {event.get('name', event['start_str']): self.run_event(processor, event)
+                for event in events}
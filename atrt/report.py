@@ -0,0 +1,328 @@
+"""
+导热系数拟合结果的批量出图
+
+plot_thermal_conductivity_fit 适合交互式查看单个深度；本模块面向批量 QA 出图：
+- 直接使用 Agg 画布，不依赖 pyplot 全局状态，可在无显示环境的计算节点上运行
+- 图形和绘图对象只创建一次，逐深度只更新数据，静态背景缓存后复用
+- 使用预先计算好的拟合结果，不重复拟合
+- 可按深度分块分发到多个进程
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .thermal_conductivity_function import calculate_thermal_conductivity, find_nearest_index
+
+
+def collect_fit_results(delta_temperature, seconds, start_calc_hour, end_calc_hour,
+                        heating_power):
+    """
+    对每个深度调用 calculate_thermal_conductivity，整理成批量出图所需的结果字典。
+
+    Parameters:
+    -----------
+    delta_temperature : array_like
+        温度变化数组，形状为 (n_depths, n_time)
+    seconds : array_like
+        时间数组（秒）
+    start_calc_hour, end_calc_hour : float or array_like
+        计算开始/结束时间（小时），标量或长度为 n_depths 的数组
+    heating_power : float or array_like
+        加热功率，标量或长度为 n_depths 的数组
+
+    Returns:
+    --------
+    dict
+        各项均为长度 n_depths 的数组：
+        thermal_conductivity, error, r_squared, fitted_params (n_depths, 2),
+        start_calc_hour, end_calc_hour
+    """
+    delta_temperature = np.atleast_2d(np.asarray(delta_temperature, dtype=float))
+    n_depths = delta_temperature.shape[0]
+    start_calc_hour = np.broadcast_to(np.asarray(start_calc_hour, dtype=float), (n_depths,))
+    end_calc_hour = np.broadcast_to(np.asarray(end_calc_hour, dtype=float), (n_depths,))
+    heating_power = np.broadcast_to(np.asarray(heating_power, dtype=float), (n_depths,))
+
+    results = {
+        'thermal_conductivity': np.full(n_depths, np.nan),
+        'error': np.full(n_depths, np.nan),
+        'r_squared': np.full(n_depths, np.nan),
+        'fitted_params': np.full((n_depths, 2), np.nan),
+        'start_calc_hour': start_calc_hour.copy(),
+        'end_calc_hour': end_calc_hour.copy(),
+    }
+    for i in range(n_depths):
+        tc, error, r_squared, fitted_params, _ = calculate_thermal_conductivity(
+            delta_temperature[i], seconds, start_calc_hour[i], end_calc_hour[i], heating_power[i]
+        )
+        results['thermal_conductivity'][i] = tc
+        results['error'][i] = error
+        results['r_squared'][i] = r_squared
+        results['fitted_params'][i] = fitted_params
+    return results
+
+
+class ThermalConductivityFitRenderer:
+    """
+    可复用的导热系数拟合图渲染器。
+
+    图形、坐标轴和所有绘图对象在构造时创建一次。坐标轴范围固定，
+    静态部分（坐标轴、刻度、网格）只绘制一次并缓存为背景，
+    render 只更新数据并重绘散点、拟合线、结果文本和标题。
+    图形样式与 plot_thermal_conductivity_fit 一致。
+    """
+
+    def __init__(self, seconds, ylim, figsize=(10, 7), dpi=80):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.seconds = np.asarray(seconds, dtype=float)
+        self.ln_time_full = np.log(self.seconds[1:])
+        self.dpi = dpi
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        ax = self.axes = self.figure.add_subplot(111)
+
+        empty = np.empty((0, 2))
+        self.all_points = ax.scatter(empty[:, 0], empty[:, 1], alpha=0.5, s=20,
+                                     color='lightgray', label='All data points', zorder=1)
+        self.start_line = ax.axvline(x=0, color='green', linestyle='--', alpha=0.7,
+                                     label='Start', zorder=2)
+        self.end_line = ax.axvline(x=0, color='orange', linestyle='--', alpha=0.7,
+                                   label='End', zorder=2)
+        self.fit_points = ax.scatter(empty[:, 0], empty[:, 1], color='blue', s=20, alpha=0.5,
+                                     label='Fitting data', zorder=3)
+        self.fit_line, = ax.plot([], [], 'r-', linewidth=3, label='Linear fit', zorder=4)
+        # 图例文字固定不变，逐深度变化的数值写在右下角的文本框中
+        self.info = ax.text(0.98, 0.03, '', transform=ax.transAxes, fontsize=10,
+                            ha='right', va='bottom', zorder=5,
+                            bbox=dict(boxstyle='square', facecolor='white', alpha=0.8))
+
+        ax.set_xlabel('ln(t) [ln(seconds)]', fontsize=12)
+        ax.set_ylabel('Temperature Rise (°C)', fontsize=12)
+        self.title = ax.set_title('Thermal Conductivity Analysis: ln(t) vs Temperature Rise',
+                                  fontsize=14, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        self.legend = ax.legend(fontsize=10, loc='upper left', framealpha=1)
+
+        # 固定坐标轴范围，使刻度和网格成为静态背景
+        x_min, x_max = self.ln_time_full.min(), self.ln_time_full.max()
+        x_pad = 0.05 * (x_max - x_min or 1.0)
+        ax.set_xlim(x_min - x_pad, x_max + x_pad)
+        ax.set_ylim(*ylim)
+        self.figure.tight_layout()
+
+        # 图例布局计算代价较高：连同背景一起只绘制一次，图例区域单独缓存，
+        # 重绘数据后再覆盖回去，使图例保持在数据点上方
+        self.data_artists = [self.all_points, self.start_line, self.end_line,
+                             self.fit_points, self.fit_line]
+        self.text_artists = [self.info, self.title]
+        self._set_animated(True)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.legend_background = self.canvas.copy_from_bbox(
+            self.legend.get_window_extent(self.canvas.get_renderer())
+        )
+
+    def _set_animated(self, animated):
+        for artist in self.data_artists + self.text_artists:
+            artist.set_animated(animated)
+
+    def update(self, delta_temperature, start_calc_hour, end_calc_hour,
+               thermal_conductivity, r_squared, fitted_params, label=None):
+        """更新单个深度的数据（不重新创建任何绘图对象）"""
+        delta_temperature = np.asarray(delta_temperature, dtype=float)
+        ln_start = np.log(start_calc_hour * 3600)
+        ln_end = np.log(end_calc_hour * 3600)
+        start_calc_index = find_nearest_index(self.ln_time_full, ln_start)
+        end_calc_index = find_nearest_index(self.ln_time_full, ln_end)
+
+        # 与 plot_thermal_conductivity_fit 相同的数据配对方式
+        x_data = self.ln_time_full[start_calc_index:end_calc_index]
+        y_data = delta_temperature[start_calc_index:end_calc_index]
+
+        self.all_points.set_offsets(np.column_stack([self.ln_time_full, delta_temperature[1:]]))
+        self.fit_points.set_offsets(np.column_stack([x_data, y_data]))
+        self.start_line.set_xdata([ln_start, ln_start])
+        self.end_line.set_xdata([ln_end, ln_end])
+
+        if len(x_data):
+            x_fit = np.array([x_data.min(), x_data.max()])
+        else:
+            x_fit = np.array([ln_start, ln_end])
+        self.fit_line.set_data(x_fit, fitted_params[0] * x_fit + fitted_params[1])
+
+        self.info.set_text(
+            f'λ = {thermal_conductivity:.4f} W/(m·K), R² = {r_squared:.4f}\n'
+            f'Fitting data: {start_calc_hour:g}-{end_calc_hour:g} hours'
+        )
+
+        title = 'Thermal Conductivity Analysis: ln(t) vs Temperature Rise'
+        if label is not None:
+            title = f'{title} ({label})'
+        self.title.set_text(title)
+
+    def render(self, path=None, pdf_pages=None, **kwargs):
+        """
+        更新数据并输出图像。
+
+        Parameters:
+        -----------
+        path : str, optional
+            图片输出路径，格式由扩展名决定；PNG 直接由 Agg 缓冲区写出，
+            其他格式退回到完整的 savefig
+        pdf_pages : matplotlib.backends.backend_pdf.PdfPages, optional
+            多页 PDF 对象，当前图像作为新的一页写入
+        **kwargs :
+            传递给 update 的参数
+        """
+        self.update(**kwargs)
+
+        if path is not None and path.lower().endswith('.png'):
+            from PIL import Image
+
+            # 恢复缓存的背景，只重绘动态对象
+            renderer = self.canvas.get_renderer()
+            self.canvas.restore_region(self.background)
+            for artist in self.data_artists:
+                artist.draw(renderer)
+            self.canvas.restore_region(self.legend_background)
+            for artist in self.text_artists:
+                artist.draw(renderer)
+            width, height = self.canvas.get_width_height()
+            image = Image.frombuffer('RGBA', (width, height), self.canvas.buffer_rgba(),
+                                     'raw', 'RGBA', 0, 1)
+            image.convert('RGB').save(path, compress_level=1)
+            path = None
+
+        if path is not None or pdf_pages is not None:
+            # 矢量格式无法使用缓存背景，需完整绘制
+            self._set_animated(False)
+            try:
+                if path is not None:
+                    self.figure.savefig(path, dpi=self.dpi)
+                if pdf_pages is not None:
+                    pdf_pages.savefig(self.figure)
+            finally:
+                self._set_animated(True)
+
+
+def _render_chunk(seconds, delta_temperature, fit_results, labels, indices, output_dir,
+                  fmt, pdf_path, ylim, figsize, dpi):
+    """在单个进程内渲染一组深度，返回生成的文件列表"""
+    renderer = ThermalConductivityFitRenderer(seconds, ylim, figsize=figsize, dpi=dpi)
+    written = []
+
+    pdf_pages = None
+    if pdf_path is not None:
+        from matplotlib.backends.backend_pdf import PdfPages
+        pdf_pages = PdfPages(pdf_path)
+
+    try:
+        for i in indices:
+            path = None
+            if fmt is not None:
+                path = os.path.join(output_dir, f'thermal_conductivity_{labels[i]}.{fmt}')
+                written.append(path)
+            renderer.render(
+                path=path,
+                pdf_pages=pdf_pages,
+                delta_temperature=delta_temperature[i],
+                start_calc_hour=fit_results['start_calc_hour'][i],
+                end_calc_hour=fit_results['end_calc_hour'][i],
+                thermal_conductivity=fit_results['thermal_conductivity'][i],
+                r_squared=fit_results['r_squared'][i],
+                fitted_params=fit_results['fitted_params'][i],
+                label=labels[i],
+            )
+    finally:
+        if pdf_pages is not None:
+            pdf_pages.close()
+            written.append(pdf_path)
+    return written
+
+
+def render_thermal_conductivity_reports(delta_temperature, seconds, fit_results, output_dir,
+                                        labels=None, fmt='png', pdf=False, n_workers=1,
+                                        ylim=None, figsize=(10, 7), dpi=80):
+    """
+    批量输出各深度的导热系数拟合图。
+
+    Parameters:
+    -----------
+    delta_temperature : array_like
+        温度变化数组，形状为 (n_depths, n_time)
+    seconds : array_like
+        时间数组（秒）
+    fit_results : dict
+        预先计算的拟合结果，格式同 collect_fit_results 的返回值
+    output_dir : str
+        输出目录，不存在时自动创建
+    labels : sequence, optional
+        各深度的标签（用于文件名和标题），默认为深度序号
+    fmt : str or None, optional
+        单张图片格式（如 'png'），为 None 时不输出单张图片
+    pdf : bool, optional
+        是否输出多页 PDF。单进程时输出 thermal_conductivity_report.pdf；
+        多进程时每个进程输出一个 thermal_conductivity_report_partXXX.pdf
+    n_workers : int, optional
+        进程数，默认为 1（在当前进程内渲染）
+    ylim : tuple, optional
+        所有图共用的温升坐标范围，默认取全部深度数据的范围
+    figsize : tuple, optional
+        图像大小，默认为 (10, 7)
+    dpi : int, optional
+        输出分辨率，默认为 80
+
+    Returns:
+    --------
+    list of str
+        生成的文件路径
+    """
+    delta_temperature = np.atleast_2d(np.asarray(delta_temperature, dtype=float))
+    n_depths = delta_temperature.shape[0]
+    if labels is None:
+        labels = [f'{i:04d}' for i in range(n_depths)]
+    labels = list(labels)
+    if len(labels) != n_depths:
+        raise ValueError("labels的长度必须与深度数相同")
+    if fmt is None and not pdf:
+        raise ValueError("fmt为None时必须输出pdf")
+
+    os.makedirs(output_dir, exist_ok=True)
+    fit_results = {key: np.asarray(fit_results[key]) for key in (
+        'start_calc_hour', 'end_calc_hour', 'thermal_conductivity', 'r_squared', 'fitted_params'
+    )}
+
+    if ylim is None:
+        y_min, y_max = np.nanmin(delta_temperature[:, 1:]), np.nanmax(delta_temperature[:, 1:])
+        y_pad = 0.05 * (y_max - y_min or 1.0)
+        ylim = (y_min - y_pad, y_max + y_pad)
+
+    n_workers = max(1, min(int(n_workers), n_depths))
+    chunks = np.array_split(np.arange(n_depths), n_workers)
+
+    def pdf_path(k):
+        if not pdf:
+            return None
+        if n_workers == 1:
+            return os.path.join(output_dir, 'thermal_conductivity_report.pdf')
+        return os.path.join(output_dir, f'thermal_conductivity_report_part{k:03d}.pdf')
+
+    tasks = [
+        (seconds, delta_temperature[chunk], fit_results_subset, [labels[i] for i in chunk],
+         range(len(chunk)), output_dir, fmt, pdf_path(k), ylim, figsize, dpi)
+        for k, chunk in enumerate(chunks)
+        for fit_results_subset in [{key: value[chunk] for key, value in fit_results.items()}]
+    ]
+
+    if n_workers == 1:
+        return _render_chunk(*tasks[0])
+
+    written = []
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for files in executor.map(_render_chunk, *zip(*tasks)):
+            written.extend(files)
+    return written
@@ -0,0 +1,155 @@
+"""
+变功率加热的叠加正演模型
+
+线热源模型（temperature_response、calc_temp、compute_temperature 中的井函数）
+均假设加热功率 q 恒定，而 corrected_power_per_meter 表明加热过程中功率会漂移。
+根据叠加原理，变功率下的温升为单位功率阶跃响应与功率增量的卷积：
+
+    T(t_n) = Σ_j ΔP_j · U(t_n - t_j),  ΔP_j = P_j - P_(j-1)
+
+在均匀时间网格上 U(t_n - t_j) = U((n - j)·dt)，上式是离散卷积，
+使用 FFT 计算只需 O(n log n)，且可按深度批量计算。
+"""
+import numpy as np
+
+from .thermal_conductivity_function import temperature_response
+from .flowrate_function import leaky_well_function
+
+
+def _lag_grid(t, tolerance=0.01):
+    """
+    检查时间网格是否均匀，返回以 t[0] 为起点的时间滞后网格 k·dt。
+
+    功率在 t[0] 时刻开始施加，各时间步的功率 P_j 作用于 [t_j, t_(j+1))。
+    """
+    t = np.asarray(t, dtype=float)
+    if t.ndim != 1 or len(t) < 2:
+        raise ValueError("t必须是长度至少为2的一维数组")
+    dt = (t[-1] - t[0]) / (len(t) - 1)
+    if dt <= 0 or np.max(np.abs(np.diff(t) - dt)) > tolerance * dt:
+        raise ValueError("叠加计算要求均匀的时间网格")
+    return np.arange(len(t)) * dt
+
+
+def superpose_step_response(step_response, P_array):
+    """
+    将单位功率阶跃响应与功率序列做叠加（FFT 卷积）。
+
+    Parameters:
+    -----------
+    step_response : array_like
+        单位功率阶跃响应 U(k·dt)，形状为 (..., n_time)，U(0) 通常为 0
+    P_array : array_like
+        各时间点的加热功率，形状为 (..., n_time)，与 step_response 按广播规则批量计算
+
+    Returns:
+    --------
+    np.ndarray
+        变功率下的温升，形状为两者广播后的形状
+    """
+    from scipy import fft
+
+    step_response = np.asarray(step_response, dtype=float)
+    P_array = np.asarray(P_array, dtype=float)
+    n_time = step_response.shape[-1]
+    if P_array.shape[-1] != n_time:
+        raise ValueError("step_response与P_array的时间维度长度必须相同")
+
+    # 功率增量：第一步为从 0 开始的阶跃
+    delta_P = np.diff(P_array, axis=-1, prepend=0.0)
+
+    n_fft = fft.next_fast_len(2 * n_time - 1, real=True)
+    spectrum = fft.rfft(step_response, n_fft, axis=-1) * fft.rfft(delta_P, n_fft, axis=-1)
+    return fft.irfft(spectrum, n_fft, axis=-1)[..., :n_time]
+
+
+def temperature_response_variable_power(t, P_array, k, alpha, r=0.0007):
+    """
+    变功率下的持续线热源温升（temperature_response 的叠加形式）。
+
+    Parameters:
+    -----------
+    t : array_like
+        均匀时间网格（秒），形状为 (n_time,)
+    P_array : array_like
+        加热功率 (W/m)，形状为 (n_time,) 或 (n_depths, n_time)
+    k : float or array_like
+        导热系数，标量或长度为 n_depths 的数组
+    alpha : float or array_like
+        热扩散系数，标量或长度为 n_depths 的数组
+    r : float or array_like, optional
+        径向距离，默认为 0.0007
+
+    Returns:
+    --------
+    np.ndarray
+        温升，形状为 (n_time,) 或 (n_depths, n_time)
+    """
+    lags = _lag_grid(t)
+    k = np.asarray(k, dtype=float)[..., np.newaxis]
+    alpha = np.asarray(alpha, dtype=float)[..., np.newaxis]
+    r = np.asarray(r, dtype=float)[..., np.newaxis]
+
+    step_response = temperature_response(lags, 1.0, k, alpha, r)
+    step_response[..., 0] = 0.0
+    return superpose_step_response(step_response, P_array)
+
+
+def calc_temp_variable_power(parameters, t, P_array, r, t0=None):
+    """
+    变功率下的 Kluitenberg 线热源温升（calc_temp 的叠加形式）。
+
+    输入:
+        parameters - [Cv, lambda]，各项可为标量或长度为 n_depths 的数组
+        t - 均匀时间网格 (s)，从加热开始时刻起算
+        P_array - 加热功率 (W/m)，形状为 (n_time,) 或 (n_depths, n_time)
+        r - 径向距离 (m)
+        t0 - 加热持续时间 (s)；给定时 t - t[0] >= t0 之后的功率置为 0（可选）
+
+    输出:
+        T_theoretical - 理论温度，形状为 (n_time,) 或 (n_depths, n_time)
+    """
+    from scipy.special import expi
+
+    lags = _lag_grid(t)
+    Cv = np.asarray(parameters[0], dtype=float)[..., np.newaxis]
+    lambda_ = np.asarray(parameters[1], dtype=float)[..., np.newaxis]
+
+    # 单位功率的持续线热源响应：-Ei(-r²/(4κτ)) / (4πλ)
+    k = lambda_ / Cv
+    step_response = np.zeros(np.broadcast_shapes(k.shape, lags.shape))
+    step_response[..., 1:] = -expi(-r**2 / (4 * k * lags[1:])) / (4 * np.pi * lambda_)
+
+    P_array = np.asarray(P_array, dtype=float)
+    if t0 is not None:
+        P_array = np.where(lags >= t0, 0.0, P_array)
+    return superpose_step_response(step_response, P_array)
+
+
+def compute_temperature_variable_power(parameter_estimated, time, P_array, P_reference=None):
+    """
+    变功率下的越流井函数温升（compute_temperature 的叠加形式）。
+    compute_temperature 中的 T_steady 对应参考功率 P_reference 下的稳态温升，
+    其他时刻按功率比例叠加。
+    :param parameter_estimated: [T_steady, r_divide_B, A]，各项可为标量或长度为 n_depths 的数组
+    :param time: 均匀时间网格
+    :param P_array: 加热功率，形状为 (n_time,) 或 (n_depths, n_time)
+    :param P_reference: 参考功率，默认取 P_array 的平均值
+    :return: 计算得到的温度数据
+    """
+    from scipy.special import kv
+
+    lags = _lag_grid(time)
+    a = np.asarray(parameter_estimated[0], dtype=float)[..., np.newaxis]  # T_steady
+    b = np.asarray(parameter_estimated[1], dtype=float)[..., np.newaxis]  # r_divide_B
+    c = np.asarray(parameter_estimated[2], dtype=float)[..., np.newaxis]  # A
+
+    P_array = np.asarray(P_array, dtype=float)
+    if P_reference is None:
+        P_reference = np.mean(P_array, axis=-1, keepdims=True)
+    else:
+        P_reference = np.asarray(P_reference, dtype=float)[..., np.newaxis]
+
+    step_response = np.zeros(np.broadcast_shapes(a.shape, b.shape, c.shape, lags.shape))
+    step_response[..., 1:] = a / P_reference * leaky_well_function(c / lags[1:], b) / (2 * kv(0, b))
+    return superpose_step_response(step_response, P_array)
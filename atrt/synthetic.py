@@ -0,0 +1,163 @@
+"""
+合成 DTS / 加热试验数据生成器
+
+使用包内已有的正演模型（temperature_response、calc_temp、compute_temperature）
+加上高斯噪声，生成任意规模的深度×时间温度矩阵，用于基准测试和单元测试。
+"""
+import numpy as np
+import pandas as pd
+
+from .thermal_conductivity_function import temperature_response
+from .DTPM_calcfunc import calc_temp
+from .flowrate_function import compute_temperature
+
+TIME_FORMAT = '%Y/%m/%d %H:%M:%S'
+
+
+def synthetic_heating_curves(n_depths=20, n_time=240, dt=30.0, model='clhs', noise=0.05,
+                             seed=None):
+    """
+    生成各深度的加热温升曲线。
+
+    Parameters:
+    -----------
+    n_depths : int, optional
+        深度数，默认为 20
+    n_time : int, optional
+        时间点数，默认为 240
+    dt : float, optional
+        采样间隔（秒），默认为 30
+    model : str, optional
+        正演模型：
+        - 'clhs' : 持续线热源 temperature_response，参数 [alpha, lambda]
+        - 'kluitenberg' : 有限时长线热源 calc_temp，参数 [Cv, lambda]，加热时长为总时长的一半
+        - 'well' : 越流井函数 compute_temperature，参数 [T_steady, r_divide_B, A]
+    noise : float, optional
+        高斯噪声标准差 (°C)，默认为 0.05
+    seed : int, optional
+        随机数种子
+
+    Returns:
+    --------
+    dict
+        - seconds : array, (n_time,)  时间数组（秒），从 0 开始
+        - temperature : array, (n_depths, n_time)  含噪声的温升
+        - parameters : dict  各深度的真实参数
+        - variables : list  正演所用的附加参数（'clhs' 为 [r, q]，
+          'kluitenberg' 为 [r, q, t0]，'well' 为空）
+    """
+    rng = np.random.default_rng(seed)
+    seconds = np.arange(n_time) * float(dt)
+
+    if model == 'clhs':
+        r, q = 0.0007, 20.0
+        lambda_ = rng.uniform(1.0, 3.0, n_depths)
+        Cv = rng.uniform(1.5e6, 3.0e6, n_depths)
+        alpha = lambda_ / Cv
+        temperature = temperature_response(seconds, q, lambda_[:, np.newaxis],
+                                           alpha[:, np.newaxis], r)
+        temperature[:, 0] = 0.0
+        parameters = {'alpha': alpha, 'lambda': lambda_}
+        variables = [r, q]
+    elif model == 'kluitenberg':
+        r, q, t0 = 0.006, 50.0, seconds[-1] / 2
+        lambda_ = rng.uniform(1.0, 3.0, n_depths)
+        Cv = rng.uniform(1.5e6, 3.0e6, n_depths)
+        temperature = np.zeros((n_depths, n_time))
+        for i in range(n_depths):
+            temperature[i, 1:] = calc_temp([Cv[i], lambda_[i]], seconds[1:], [r, q, t0])
+        parameters = {'Cv': Cv, 'lambda': lambda_}
+        variables = [r, q, t0]
+    elif model == 'well':
+        T_steady = rng.uniform(2.0, 5.0, n_depths)
+        r_divide_B = rng.uniform(0.1, 1.0, n_depths)
+        A = rng.uniform(500.0, 3000.0, n_depths)
+        temperature = np.zeros((n_depths, n_time))
+        for i in range(n_depths):
+            temperature[i] = compute_temperature([T_steady[i], r_divide_B[i], A[i]], seconds)
+        parameters = {'T_steady': T_steady, 'r_divide_B': r_divide_B, 'A': A}
+        variables = []
+    else:
+        raise ValueError(f"未知的模型: {model}")
+
+    temperature = temperature + rng.normal(0, noise, temperature.shape)
+    return {
+        'seconds': seconds,
+        'temperature': temperature,
+        'parameters': parameters,
+        'variables': variables,
+    }
+
+
+def synthetic_dts_data(n_depths=100, n_time=240, dt=30.0, depth_step=0.5, n_before=10,
+                       heated_fraction=0.5, noise=0.05, start='2024/01/01 10:00:00', seed=None):
+    """
+    生成 DtsDataProcessing 可直接读取的 DTS 数据表（第一行为时间，第一列为深度）。
+
+    加热前为带地温梯度的自然温度，加热开始后在加热深度段叠加持续线热源温升。
+
+    Parameters:
+    -----------
+    n_depths : int, optional
+        深度点数，默认为 100
+    n_time : int, optional
+        加热期间的时间点数，默认为 240
+    dt : float, optional
+        采样间隔（秒），默认为 30
+    depth_step : float, optional
+        深度间隔 (m)，默认为 0.5
+    n_before : int, optional
+        加热前的时间点数，默认为 10
+    heated_fraction : float, optional
+        加热深度段占全部深度的比例（居中），默认为 0.5
+    noise : float, optional
+        高斯噪声标准差 (°C)，默认为 0.05
+    start : str, optional
+        记录开始时间，'YYYY/MM/DD HH:MM:SS' 格式
+    seed : int, optional
+        随机数种子
+
+    Returns:
+    --------
+    dict
+        - data : pd.DataFrame  DTS 数据表
+        - start_str, end_str : str  加热开始/结束时间
+        - top_idx, bottom_idx : int  加热深度段的起止索引
+        - lambda : array  加热深度段的真实导热系数
+        - heating_power : float  加热功率 (W/m)
+    """
+    rng = np.random.default_rng(seed)
+    depths = np.arange(n_depths) * depth_step
+    n_total = n_before + n_time
+    times = pd.Timestamp(pd.to_datetime(start, format=TIME_FORMAT)) + \
+        pd.to_timedelta(np.arange(n_total) * dt, unit='s')
+
+    natural = 15 + 0.03 * depths
+    temperature = np.repeat(natural[:, np.newaxis], n_total, axis=1)
+
+    n_heated = max(1, int(round(n_depths * heated_fraction)))
+    top_idx = (n_depths - n_heated) // 2
+    bottom_idx = top_idx + n_heated - 1
+
+    heating = synthetic_heating_curves(n_heated, n_time, dt, model='clhs', noise=0.0,
+                                       seed=rng.integers(2**32))
+    temperature[top_idx:bottom_idx + 1, n_before:] += heating['temperature']
+    temperature += rng.normal(0, noise, temperature.shape)
+
+    time_strings = times.strftime(TIME_FORMAT)
+    table = np.empty((n_depths + 1, n_total + 1), dtype=object)
+    table[0, 0] = 'Time'
+    table[0, 1:] = ''
+    table[1:, 0] = depths
+    table[1:, 1:] = temperature
+    data = pd.DataFrame(table, columns=['Depth'] + list(time_strings))
+
+    return {
+        'data': data,
+        'start_str': time_strings[n_before],
+        'end_str': time_strings[-1],
+        'top_idx': top_idx,
+        'bottom_idx': bottom_idx,
+        'lambda': heating['parameters']['lambda'],
+        'heating_power': heating['variables'][1],
+    }
@@ -1,7 +1,11 @@
+import warnings
+from time import perf_counter
 import numpy as np
-from scipy.optimize import curve_fit
-import matplotlib.pyplot as plt
-from scipy.special import exp1
+
+from . import _scipy
+
+# scipy 与 matplotlib 在用到的函数内部导入，避免仅使用部分功能时的导入开销；
+# 正演模型中的 exp1 经 _scipy.special() 取得，只在第一次调用时导入
 
 # 查找最接近的索引函数
 def find_nearest_index(array, value):
@@ -38,9 +42,58 @@ def corrected_power_per_meter(I, T, T0,R0=0.08, alpha=0.00393, time= None):
 
     return P_array, P_avg
 
+# 计算所有深度的加热功率矩阵
+def corrected_power_matrix(I, temperature, natural_temp, R0=0.08, alpha=0.00393, time=None):
+    """
+    一次性计算所有深度、所有时间点的单位长度加热功率（W/m）及各深度的平均功率，
+    是 corrected_power_per_meter 的向量化版本。
+
+    参数:
+    - I: 恒定电流 (A)
+    - temperature: 温度矩阵 (°C)，形状为 (n_depths, n_time)，
+      即 DtsDataProcessing.extraction_heating_data 返回的 delta_temp
+    - natural_temp: 各深度的参考温度 (°C)，形状为 (n_depths,)，
+      即 extraction_heating_data 返回的 natural_temp；也可为标量
+    - R0: 参考温度下的单位长度电阻 (Ω/m)，默认 0.08
+    - alpha: 铜的电阻温度系数 (1/°C)，默认 0.00393
+    - time: 时间点数组 (s)，形状为 (n_time,)，给定时按梯形积分求平均功率（可选）
+
+    返回:
+    - P_matrix: 单位长度加热功率矩阵 (W/m)，形状为 (n_depths, n_time)
+    - P_avg: 各深度的平均单位长度加热功率 (W/m)，形状为 (n_depths,)，
+      可直接作为 scan_thermal_conductivity_windows 的 heating_power、
+      optimize_CLHS_parameters 的 q 或 optimize_soil_properties_RMSE 的 variables[1]
+    """
+    temperature = np.atleast_2d(np.asarray(temperature, dtype=float))
+    natural_temp = np.asarray(natural_temp, dtype=float)
+    if natural_temp.ndim == 1:
+        natural_temp = natural_temp[:, np.newaxis]
+
+    P_matrix = I**2 * R0 * (1 + alpha * (temperature - natural_temp))
+
+    # 计算平均功率
+    if time is not None:
+        time = np.asarray(time, dtype=float)
+        P_avg = np.trapz(P_matrix, time, axis=1) / (time[-1] - time[0])
+    else:
+        P_avg = np.mean(P_matrix, axis=1)
+
+    return P_matrix, P_avg
+
+# 导热系数计算区间
+def _calc_window(seconds, start_calc_hour, end_calc_hour):
+    """返回计算区间的起止索引和对应的 ln(t)"""
+    # 计算ln(t)，从第二个元素开始，因为第一个元素是0
+    ln_time = np.log(seconds[1:])
+    
+    # 找到计算区间的索引
+    start_calc_index = find_nearest_index(ln_time, np.log(start_calc_hour * 3600))
+    end_calc_index = find_nearest_index(ln_time, np.log(end_calc_hour * 3600))
+    return start_calc_index, end_calc_index, ln_time[start_calc_index:end_calc_index]
+
 # 导热系数计算函数
 def calculate_thermal_conductivity(delta_temperature, seconds, start_calc_hour, 
-                                 end_calc_hour, heating_power):
+                                 end_calc_hour, heating_power, cache=None):
     """
     计算导热系数及其相关参数
     
@@ -56,6 +109,8 @@ def calculate_thermal_conductivity(delta_temperature, seconds, start_calc_hour,
         计算结束时间（小时）
     heating_power : float
         加热功率
+    cache : ResultCache or str, optional
+        结果缓存或缓存目录路径，输入相同时直接返回缓存的结果
         
     Returns:
     --------
@@ -77,6 +132,18 @@ def calculate_thermal_conductivity(delta_temperature, seconds, start_calc_hour,
     ValueError
         当输入参数不合法时抛出异常
     """
+    if cache is not None:
+        from .cache import as_result_cache, cached_call
+        return cached_call(
+            as_result_cache(cache), 'calculate_thermal_conductivity',
+            (delta_temperature, seconds, start_calc_hour, end_calc_hour, heating_power),
+            lambda: calculate_thermal_conductivity(delta_temperature, seconds, start_calc_hour,
+                                                   end_calc_hour, heating_power),
+            ('thermal_conductivity', 'error', 'r_squared', 'fitted_params', 'x_fitted'),
+        )
+
+    from scipy.optimize import curve_fit
+
     # 输入验证
     if len(delta_temperature) != len(seconds):
         raise ValueError("delta_temperature和seconds数组长度必须相同")
@@ -87,16 +154,9 @@ def calculate_thermal_conductivity(delta_temperature, seconds, start_calc_hour,
     if heating_power <= 0:
         raise ValueError("heating_power必须大于0")
 
-    # 计算ln(t)，从第二个元素开始，因为第一个元素是0
-    ln_time = np.log(seconds[1:])
-    
-    # 找到计算区间的索引
-    start_calc_index = find_nearest_index(ln_time, np.log(start_calc_hour * 3600))
-    end_calc_index = find_nearest_index(ln_time, np.log(end_calc_hour * 3600))
-
     # 提取计算区间的数据
+    start_calc_index, end_calc_index, x_data = _calc_window(seconds, start_calc_hour, end_calc_hour)
     y_data = delta_temperature[start_calc_index:end_calc_index]
-    x_data = ln_time[start_calc_index:end_calc_index]
  
     def linear_function(x, slope, intercept):
         """线性拟合函数"""
@@ -122,6 +182,171 @@ def calculate_thermal_conductivity(delta_temperature, seconds, start_calc_hour,
 
     return thermal_conductivity, error, r_squared, fitted_params, x_data
 
+# 导热系数计算窗口扫描（前缀和，O(1) 每窗口）
+def scan_thermal_conductivity_windows(delta_temperature, seconds, heating_power,
+                                      hour_grid=None, n_grid=20, min_points=5,
+                                      min_r_squared=0.9):
+    """
+    在时间网格上扫描所有 (start, end) 计算窗口，批量计算各深度的导热系数、
+    误差和 R²，并自动选择最稳定的计算窗口。
+
+    利用 x、y、x²、xy、y² 的前缀和，每个窗口的线性回归只需 O(1) 次运算，
+    结果与对同一窗口调用 calculate_thermal_conductivity 一致。
+
+    Parameters:
+    -----------
+    delta_temperature : array_like
+        温度变化数组，形状为 (n_time,) 或 (n_depths, n_time)
+    seconds : array_like
+        时间数组（秒）
+    heating_power : float or array_like
+        加热功率，标量或长度为 n_depths 的数组
+    hour_grid : array_like, optional
+        候选的窗口边界（小时）；默认在 ln(t) 上等间距取 n_grid 个点
+    n_grid : int, optional
+        未给定 hour_grid 时的网格点数，默认为 20
+    min_points : int, optional
+        窗口内的最少数据点数，默认为 5
+    min_r_squared : float, optional
+        参与最优窗口选择的最低拟合优度，默认为 0.9
+
+    Returns:
+    --------
+    dict
+        包含扫描结果的字典（n_depths 为深度数，n_grid 为网格点数）：
+        - hour_grid : array, (n_grid,)
+            窗口边界（小时）
+        - thermal_conductivity : array, (n_depths, n_grid, n_grid)
+            各窗口的导热系数，[:, i, j] 对应 start=hour_grid[i], end=hour_grid[j]
+        - error : array, (n_depths, n_grid, n_grid)
+            各窗口导热系数的误差
+        - r_squared : array, (n_depths, n_grid, n_grid)
+            各窗口的拟合优度 R²
+        - n_points : array, (n_grid, n_grid)
+            各窗口的数据点数
+        - stability : array, (n_depths, n_grid, n_grid)
+            稳定性指标（相对误差 + 相邻窗口的最大相对变化），越小越稳定
+        - best_start_hour, best_end_hour : array, (n_depths,)
+            各深度最稳定窗口的起止时间（小时）
+        - best_thermal_conductivity, best_error, best_r_squared : array, (n_depths,)
+            各深度最稳定窗口对应的结果；无有效窗口时为 NaN
+
+    Raises:
+    -------
+    ValueError
+        当输入参数不合法时抛出异常
+    """
+    delta_temperature = np.asarray(delta_temperature, dtype=float)
+    seconds = np.asarray(seconds, dtype=float)
+    if delta_temperature.ndim == 1:
+        delta_temperature = delta_temperature[np.newaxis, :]
+
+    # 输入验证
+    if delta_temperature.shape[1] != len(seconds):
+        raise ValueError("delta_temperature的时间维度与seconds数组长度必须相同")
+
+    n_depths = delta_temperature.shape[0]
+    heating_power = np.broadcast_to(np.asarray(heating_power, dtype=float), (n_depths,))
+    if np.any(heating_power <= 0):
+        raise ValueError("heating_power必须大于0")
+
+    if min_points < 3:
+        raise ValueError("min_points至少为3")
+
+    # 计算ln(t)，从第二个元素开始，因为第一个元素是0
+    ln_time = np.log(seconds[1:])
+
+    if hour_grid is None:
+        hour_grid = np.exp(np.linspace(ln_time[0], ln_time[-1], n_grid)) / 3600
+    hour_grid = np.sort(np.asarray(hour_grid, dtype=float))
+    if hour_grid.ndim != 1 or len(hour_grid) < 2 or np.any(hour_grid <= 0):
+        raise ValueError("hour_grid必须是至少包含两个正数的一维数组")
+
+    # 窗口边界对应的索引（与 calculate_thermal_conductivity 的取法相同）
+    grid_index = np.abs(ln_time[:, np.newaxis] - np.log(hour_grid * 3600)).argmin(axis=0)
+
+    # 与 calculate_thermal_conductivity 保持相同的数据配对方式
+    x_data = ln_time
+    y_data = delta_temperature[:, :len(ln_time)]
+
+    # 先中心化，避免前缀和相减时损失精度（不影响斜率与 R²）
+    x_data = x_data - x_data.mean()
+    y_data = y_data - y_data.mean(axis=1, keepdims=True)
+
+    def prefix_sum(values):
+        cumulative = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+        np.cumsum(values, axis=-1, out=cumulative[..., 1:])
+        return cumulative
+
+    sum_x = prefix_sum(x_data)
+    sum_xx = prefix_sum(x_data**2)
+    sum_y = prefix_sum(y_data)
+    sum_yy = prefix_sum(y_data**2)
+    sum_xy = prefix_sum(x_data * y_data)
+
+    start = grid_index[:, np.newaxis]
+    end = grid_index[np.newaxis, :]
+    n = (end - start).astype(float)
+
+    def window(cumulative):
+        return cumulative[..., end] - cumulative[..., start]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sx, sxx = window(sum_x), window(sum_xx)
+        sy, syy, sxy = window(sum_y), window(sum_yy), window(sum_xy)
+
+        sxx_c = sxx - sx**2 / n
+        syy_c = syy - sy**2 / n
+        sxy_c = sxy - sx * sy / n
+
+        slope = sxy_c / sxx_c
+        sum_squared_residuals = np.maximum(syy_c - slope * sxy_c, 0.0)
+        r_squared = 1 - sum_squared_residuals / syy_c
+        slope_error = np.sqrt(sum_squared_residuals / (n - 2) / sxx_c)
+
+        power = heating_power[:, np.newaxis, np.newaxis]
+        thermal_conductivity = power / (4 * np.pi * slope)
+        error = np.abs(power / (4 * np.pi * slope**2)) * slope_error
+
+    valid = (n >= min_points) & (slope > 0) & (syy_c > 0)
+    thermal_conductivity = np.where(valid, thermal_conductivity, np.nan)
+    error = np.where(valid, error, np.nan)
+    r_squared = np.where(valid, r_squared, np.nan)
+
+    # 稳定性：相对误差 + 与相邻窗口（起点或终点移动一个网格）的最大相对变化
+    padded = np.pad(thermal_conductivity, ((0, 0), (1, 1), (1, 1)), constant_values=np.nan)
+    neighbours = np.stack([padded[:, :-2, 1:-1], padded[:, 2:, 1:-1],
+                           padded[:, 1:-1, :-2], padded[:, 1:-1, 2:]])
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        variation = np.nanmax(np.abs(neighbours - thermal_conductivity), axis=0)
+    variation = np.where(np.isnan(variation), 0.0, variation)
+    stability = (error + variation) / thermal_conductivity
+
+    # 选择满足 R² 要求且最稳定的窗口
+    candidate = np.where(r_squared >= min_r_squared, stability, np.inf)
+    candidate = candidate.reshape(n_depths, -1)
+    best = candidate.argmin(axis=1)
+    found = np.isfinite(candidate[np.arange(n_depths), best])
+    best_i, best_j = np.unravel_index(best, thermal_conductivity.shape[1:])
+
+    def pick(values):
+        return np.where(found, values[np.arange(n_depths), best_i, best_j], np.nan)
+
+    return {
+        'hour_grid': hour_grid,
+        'thermal_conductivity': thermal_conductivity,
+        'error': error,
+        'r_squared': r_squared,
+        'n_points': np.where(n > 0, n, 0).astype(int),
+        'stability': stability,
+        'best_start_hour': np.where(found, hour_grid[best_i], np.nan),
+        'best_end_hour': np.where(found, hour_grid[best_j], np.nan),
+        'best_thermal_conductivity': pick(thermal_conductivity),
+        'best_error': pick(error),
+        'best_r_squared': pick(r_squared),
+    }
+
 # 可视化拟合结果
 def plot_thermal_conductivity_fit(delta_temperature, seconds, start_calc_hour, 
                                 end_calc_hour, heating_power, figsize=(10, 7)):
@@ -156,7 +381,8 @@ def plot_thermal_conductivity_fit(delta_temperature, seconds, start_calc_hour,
         - fitted_params : array
             拟合参数 [slope, intercept]
     """
-    
+    import matplotlib.pyplot as plt
+
     # 调用原函数获取计算结果
     thermal_conductivity, error, r_squared, fitted_params, x_data = calculate_thermal_conductivity(
         delta_temperature, seconds, start_calc_hour, end_calc_hour, heating_power
@@ -215,20 +441,152 @@ def plot_thermal_conductivity_fit(delta_temperature, seconds, start_calc_hour,
     }
 
 # === 温升解析函数（无限介质线热源）===
-def temperature_response(t, q, k, alpha):
+def temperature_response(t, q, k, alpha, r=0.0007):
+    exp1 = _scipy.special().exp1
 
-    r = 0.0007
     t = np.maximum(t, 1e-6)  # 避免除零
     ei_arg = r**2 / (4 * alpha * t)
     return (q / (4 * np.pi * k)) * exp1(ei_arg)
 
 # === 持续线热源理论的损失函数 ===
-def CLHS_RMSE(x, T_measured, t, q):
+def CLHS_RMSE(x, T_measured, t, q, r=0.0007, context=None):
     
     alpha = x[0]
     lambda_ = x[1]
     # alpha = lambda_ / Cv
+
+    # 给出由 t 创建的 FitContext 时复用其缓存的 r²/4t 和工作数组
+    if context is not None:
+        context.check_time(t)
+        return context.clhs_rmse(alpha, lambda_, T_measured, q, r)
     
-    T_predicted = temperature_response(t, q, lambda_, alpha)
+    T_predicted = temperature_response(t, q, lambda_, alpha, r)
     rmse = np.sqrt(np.mean((T_measured - T_predicted) ** 2))
-    return rmse
\ No newline at end of file
+    return rmse
+
+# === 持续线热源理论的批量反演 ===
+def optimize_CLHS_parameters(T_measured, t, q, r=0.0007, initial_guess=(5e-7, 1.5),
+                             max_iter=200, tol=1e-12, instrumentation=None):
+    """
+    基于持续线热源 (CLHS) 模型，同时反演所有深度的热扩散系数 α 和导热系数 λ。
+
+    在对数参数空间中对所有深度同时执行 Levenberg-Marquardt 迭代，
+    使用 E1 解的解析雅可比：
+        T = q / (4πλ) · E1(u),  u = r² / (4αt)
+        ∂T/∂ln(λ) = -T,  ∂T/∂ln(α) = q / (4πλ) · exp(-u)
+
+    Parameters:
+    -----------
+    T_measured : array_like
+        实测温升，形状为 (n_time,) 或 (n_depths, n_time)，NaN 点不参与拟合
+    t : array_like
+        时间数组（秒），形状为 (n_time,)
+    q : float or array_like
+        加热功率 (W/m)，标量或长度为 n_depths 的数组
+    r : float or array_like, optional
+        径向距离 (m)，标量或长度为 n_depths 的数组，默认为 0.0007
+    initial_guess : tuple, optional
+        [alpha, lambda] 初始猜测，也可为 (n_depths, 2) 数组
+    max_iter : int, optional
+        最大迭代次数，默认为 200
+    tol : float, optional
+        相对代价下降的收敛阈值，默认为 1e-12
+    instrumentation : Instrumentation, optional
+        记录求解统计；所有深度同时求解，每个深度一行，调用次数和耗时为整批的值，batch_size 为深度数
+
+    Returns:
+    --------
+    dict
+        包含反演结果的字典（均为长度 n_depths 的数组）：
+        - alpha : 热扩散系数 (m²/s)
+        - thermal_conductivity : 导热系数 (W/(m·K))
+        - alpha_error : 热扩散系数标准误差
+        - thermal_conductivity_error : 导热系数标准误差
+        - RMSE : 均方根误差
+        - n_iterations : 迭代次数
+        - converged : 是否收敛
+
+    Raises:
+    -------
+    ValueError
+        当输入参数不合法时抛出异常
+    """
+    exp1 = _scipy.special().exp1
+    from ._solvers import batched_levenberg_marquardt, parameter_covariance
+
+    T_measured = np.asarray(T_measured, dtype=float)
+    if T_measured.ndim == 1:
+        T_measured = T_measured[np.newaxis, :]
+    t = np.maximum(np.asarray(t, dtype=float), 1e-6)  # 避免除零
+
+    if T_measured.shape[1] != len(t):
+        raise ValueError("T_measured的时间维度与t数组长度必须相同")
+
+    n_depths = T_measured.shape[0]
+    q = np.broadcast_to(np.asarray(q, dtype=float), (n_depths,))[:, np.newaxis]
+    r = np.broadcast_to(np.asarray(r, dtype=float), (n_depths,))[:, np.newaxis]
+    if np.any(q <= 0) or np.any(r <= 0):
+        raise ValueError("q和r必须大于0")
+
+    p0 = np.broadcast_to(np.asarray(initial_guess, dtype=float), (n_depths, 2))
+    if np.any(p0 <= 0):
+        raise ValueError("initial_guess必须为正值")
+
+    valid = np.isfinite(T_measured)
+    T_filled = np.where(valid, T_measured, 0.0)
+    r_squared_over_4t = r**2 / (4 * t)
+
+    def residual_jacobian(log_params, rows):
+        alpha = np.exp(log_params[:, 0:1])
+        lambda_ = np.exp(log_params[:, 1:2])
+        u = r_squared_over_4t[rows] / alpha
+        amplitude = q[rows] / (4 * np.pi * lambda_)
+        T_predicted = amplitude * exp1(u)
+
+        mask = valid[rows]
+        residuals = np.where(mask, T_predicted - T_filled[rows], 0.0)
+        jacobian = np.stack([amplitude * np.exp(-u), -T_predicted], axis=-1)
+        jacobian[~mask] = 0.0
+        return residuals, jacobian
+
+    if instrumentation is not None:
+        residual_jacobian = instrumentation.wrap_objective(residual_jacobian)
+        start = perf_counter()
+
+    result = batched_levenberg_marquardt(residual_jacobian, np.log(p0),
+                                         max_iter=max_iter, tol=tol)
+
+    if instrumentation is not None:
+        # 所有深度共用一次批量求解：每行记录整批的调用次数与耗时，batch_size 标明批内深度数
+        wall_time = perf_counter() - start
+        cost = result['cost']
+        for i in range(n_depths):
+            instrumentation.record(
+                'optimize_CLHS_parameters', i,
+                nfev=int(result['nit'][i]) + 1,
+                nit=int(result['nit'][i]),
+                objective_calls=residual_jacobian.calls,
+                objective_time=residual_jacobian.time,
+                wall_time=wall_time,
+                success=bool(result['converged'][i]),
+                fun=float(np.sqrt(cost[i] / max(valid[i].sum(), 1))),
+                batch_size=n_depths,
+            )
+
+    alpha = np.exp(result['x'][:, 0])
+    lambda_ = np.exp(result['x'][:, 1])
+    n_observations = valid.sum(axis=1)
+
+    # 对数参数的协方差 → 原参数的标准误差
+    covariance = parameter_covariance(result['jacobian'], result['cost'], n_observations)
+    log_errors = np.sqrt(np.maximum(np.einsum('bii->bi', covariance), 0.0))
+
+    return {
+        'alpha': alpha,
+        'thermal_conductivity': lambda_,
+        'alpha_error': alpha * log_errors[:, 0],
+        'thermal_conductivity_error': lambda_ * log_errors[:, 1],
+        'RMSE': np.sqrt(result['cost'] / np.maximum(n_observations, 1)),
+        'n_iterations': result['nit'],
+        'converged': result['converged'],
+    }
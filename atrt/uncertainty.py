@@ -0,0 +1,294 @@
+"""
+残差自助法（bootstrap）不确定性估计
+
+对点估计的拟合残差有放回地重采样，叠加到拟合曲线上得到 n_resamples 条重采样曲线，
+然后把所有重采样曲线堆叠成一批，用向量化的求解器一次拟合，而不是逐条调用
+optimize_soil_properties_RMSE / optimize_parameters_GD：
+
+- bootstrap_thermal_conductivity  温升-ln(t) 线性拟合的导热系数（闭式批量最小二乘）
+- bootstrap_soil_properties       DTPM 方法的 Cv、lambda（批量 Levenberg-Marquardt，解析雅可比）
+- bootstrap_flow_parameters       越流井函数参数 [T_steady, r_divide_B, A] 及地下水流速
+
+结果为字典，每个量 name 包含点估计 name、百分位置信区间 name_interval（最后一维为
+[下限, 上限]）和全部重采样估计 name_samples。DTS 残差在时间上相关时可设置 block_length
+使用移动块自助法。
+"""
+import numpy as np
+
+
+def _resample_indices(rng, shape, n_points, n_out, block_length):
+    """
+    生成重采样索引，形状为 shape + (n_out,)，取值在 [0, n_points) 内。
+
+    n_points 可以是能广播到 shape 的数组（各问题的有效点数不同）；block_length > 1 时
+    按移动块自助法抽取连续的块。
+    """
+    n_points = np.asarray(n_points)[..., np.newaxis]
+    if block_length <= 1:
+        return (rng.random(shape + (n_out,)) * n_points).astype(np.intp)
+    block_length = int(min(block_length, np.min(n_points)))
+    n_blocks = -(-n_out // block_length)
+    starts = (rng.random(shape + (n_blocks,)) * (n_points - block_length + 1)).astype(np.intp)
+    indices = (starts[..., np.newaxis] + np.arange(block_length)).reshape(shape + (n_blocks * block_length,))
+    return indices[..., :n_out]
+
+
+def _percentile_interval(samples, confidence, axis=-1):
+    """百分位置信区间，最后一维为 [下限, 上限]"""
+    if not 0 < confidence < 1:
+        raise ValueError("confidence必须在0和1之间")
+    tail = 50 * (1 - confidence)
+    return np.moveaxis(np.nanpercentile(samples, [tail, 100 - tail], axis=axis), 0, -1)
+
+
+def bootstrap_thermal_conductivity(delta_temperature, seconds, start_calc_hour, end_calc_hour,
+                                   heating_power, n_resamples=1000, confidence=0.95, block_length=1,
+                                   seed=None):
+    """
+    导热系数的残差自助法置信区间。
+
+    计算区间与 calculate_thermal_conductivity 相同；所有重采样曲线的线性拟合
+    以闭式最小二乘一次完成。
+
+    Parameters:
+    -----------
+    delta_temperature, seconds, start_calc_hour, end_calc_hour, heating_power :
+        同 calculate_thermal_conductivity
+    n_resamples : int, optional
+        重采样次数，默认为 1000
+    confidence : float, optional
+        置信水平，默认为 0.95
+    block_length : int, optional
+        移动块自助法的块长度，默认为 1（独立重采样）
+    seed : int, optional
+        随机数种子
+
+    Returns:
+    --------
+    dict
+        - thermal_conductivity, thermal_conductivity_interval, thermal_conductivity_samples
+        - slope, slope_interval, slope_samples : 温升-ln(t) 直线的斜率
+    """
+    from .thermal_conductivity_function import _calc_window, calculate_thermal_conductivity
+
+    thermal_conductivity, _, _, fitted_params, x_data = calculate_thermal_conductivity(
+        delta_temperature, seconds, start_calc_hour, end_calc_hour, heating_power)
+    start_calc_index, end_calc_index, _ = _calc_window(seconds, start_calc_hour, end_calc_hour)
+    y_data = np.asarray(delta_temperature, dtype=float)[start_calc_index:end_calc_index]
+    n_points = len(x_data)
+
+    fitted = fitted_params[0] * x_data + fitted_params[1]
+    residuals = y_data - fitted
+    residuals = residuals - residuals.mean()
+
+    rng = np.random.default_rng(seed)
+    y_resampled = fitted + residuals[_resample_indices(rng, (n_resamples,), n_points, n_points, block_length)]
+
+    x_centered = x_data - x_data.mean()
+    slope_samples = (y_resampled @ x_centered) / (x_centered @ x_centered)
+    with np.errstate(divide='ignore'):
+        conductivity_samples = heating_power / (4 * np.pi * slope_samples)
+
+    return {
+        'thermal_conductivity': thermal_conductivity,
+        'thermal_conductivity_interval': _percentile_interval(conductivity_samples, confidence),
+        'thermal_conductivity_samples': conductivity_samples,
+        'slope': fitted_params[0],
+        'slope_interval': _percentile_interval(slope_samples, confidence),
+        'slope_samples': slope_samples,
+    }
+
+
+def bootstrap_soil_properties(time, temperature_data, variables, initial_guess=(2.5e6, 1.5), estimate=None,
+                              n_resamples=200, confidence=0.95, block_length=1, seed=None,
+                              max_iter=100, tol=1e-10):
+    """
+    DTPM 方法 Cv、lambda 的残差自助法置信区间。
+
+    点估计最小化与 optimize_soil_properties_RMSE 相同的 RMSE；所有深度的所有重采样曲线
+    堆叠为 n_depths * n_resamples 个问题，以点估计为初值用批量 Levenberg-Marquardt
+    （Kluitenberg 模型的解析雅可比）一次求解。
+
+    Parameters:
+    -----------
+    time, temperature_data, variables :
+        同 optimize_soil_properties_RMSE；q 可以为每个深度一个值的数组
+    initial_guess : tuple, optional
+        点估计的初值 [Cv, lambda]
+    estimate : tuple, optional
+        已有的点估计 (Cv, lambda)，如 optimize_soil_properties_RMSE 的结果；给出时不再重新拟合
+    n_resamples : int, optional
+        每个深度的重采样次数，默认为 200
+    confidence : float, optional
+        置信水平，默认为 0.95
+    block_length : int, optional
+        移动块自助法的块长度，默认为 1
+    seed : int, optional
+        随机数种子
+    max_iter, tol :
+        Levenberg-Marquardt 的最大迭代次数和收敛阈值
+
+    Returns:
+    --------
+    dict
+        - Cv, Cv_interval, Cv_samples : 形状 (n_depths,)、(n_depths, 2)、(n_depths, n_resamples)
+        - lambda, lambda_interval, lambda_samples
+        - RMSE : 点估计的均方根误差
+    """
+    from ._solvers import batched_levenberg_marquardt
+    from .DTPM_calcfunc import _kluitenberg_log_derivatives
+
+    t = np.asarray(time, dtype=float)
+    temperature_data = np.atleast_2d(np.asarray(temperature_data, dtype=float))
+    n_depths, n_time = temperature_data.shape
+    r, t0 = variables[0], variables[2]
+    q = np.broadcast_to(np.asarray(variables[1], dtype=float), (n_depths,))
+
+    valid = (t > 0) & np.isfinite(temperature_data)
+    n_valid = valid.sum(axis=1)
+    if np.any(n_valid == 0):
+        raise ValueError("存在没有有效观测的数据集")
+
+    def least_squares(target, mask, q_rows, p0):
+        target = np.where(mask, target, 0.0)
+
+        def residual_jacobian(log_params, rows):
+            temperature, d_log_Cv, d_log_lambda = _kluitenberg_log_derivatives(
+                log_params[:, 0:1], log_params[:, 1:2], t, r, q_rows[rows, np.newaxis], t0, mask[rows])
+            residuals = np.where(mask[rows], temperature - target[rows], 0.0)
+            jacobian = np.stack([d_log_Cv, d_log_lambda], axis=-1)
+            jacobian[~mask[rows]] = 0.0
+            return residuals, jacobian
+
+        return batched_levenberg_marquardt(residual_jacobian, p0, max_iter=max_iter, tol=tol)
+
+    if estimate is None:
+        p0 = np.log(np.broadcast_to(np.asarray(initial_guess, dtype=float), (n_depths, 2)))
+        log_estimate = least_squares(temperature_data, valid, q, p0)['x']
+    else:
+        log_estimate = np.log(np.column_stack([np.broadcast_to(np.asarray(value, dtype=float), (n_depths,))
+                                               for value in estimate]))
+
+    fitted = _kluitenberg_log_derivatives(log_estimate[:, 0:1], log_estimate[:, 1:2], t, r,
+                                          q[:, np.newaxis], t0, valid)[0]
+    residuals = np.where(valid, temperature_data - fitted, np.nan)
+    RMSE = np.sqrt(np.nanmean(residuals ** 2, axis=1))
+    residuals = residuals - np.nanmean(residuals, axis=1, keepdims=True)
+
+    # 只在每个深度的有效点之间重采样：有效残差依次排在前面，无效位置的目标值由 mask 屏蔽
+    order = np.argsort(~valid, axis=1, kind='stable')
+    compact = np.take_along_axis(np.nan_to_num(residuals), order, axis=1)
+    rng = np.random.default_rng(seed)
+    indices = _resample_indices(rng, (n_depths, n_resamples), n_valid[:, np.newaxis], n_time, block_length)
+    target = fitted[:, np.newaxis, :] + np.take_along_axis(compact[:, np.newaxis, :], indices, axis=2)
+
+    mask = np.repeat(valid, n_resamples, axis=0)
+    result = least_squares(target.reshape(-1, n_time), mask, np.repeat(q, n_resamples),
+                           np.repeat(log_estimate, n_resamples, axis=0))
+    samples = np.exp(result['x']).reshape(n_depths, n_resamples, 2)
+
+    Cv, lambda_ = np.exp(log_estimate).T
+    return {
+        'Cv': Cv,
+        'Cv_interval': _percentile_interval(samples[..., 0], confidence),
+        'Cv_samples': samples[..., 0],
+        'lambda': lambda_,
+        'lambda_interval': _percentile_interval(samples[..., 1], confidence),
+        'lambda_samples': samples[..., 1],
+        'RMSE': RMSE,
+    }
+
+
+def bootstrap_flow_parameters(t_observed, temp_observed, calc_timeidx, parameter_estimated,
+                              rho_c_soil=None, thermal_conductivity_soil=None, n_resamples=200,
+                              confidence=0.95, block_length=1, seed=None, max_iter=100, tol=1e-10):
+    """
+    越流井函数参数和地下水流速的残差自助法置信区间。
+
+    以 optimize_parameters_GD / optimize_parameters_SA 的结果为点估计，从 calc_timeidx
+    开始的残差重采样后，以点估计为初值用批量 Levenberg-Marquardt 最小化各重采样曲线的
+    残差平方和（在 [T_steady, ln r_divide_B, ln A] 空间中求解，r_divide_B 的导数用差分近似）。
+
+    Parameters:
+    -----------
+    t_observed, temp_observed, calc_timeidx :
+        同 optimize_parameters_GD
+    parameter_estimated : array_like
+        点估计 [T_steady, r_divide_B, A]
+    rho_c_soil, thermal_conductivity_soil : float or array_like, optional
+        同 calculate_flow_rate；都给出时同时估计流速。也可以是长度为 n_resamples 的
+        重采样估计（如 bootstrap_soil_properties 在该深度的 Cv_samples、lambda_samples），
+        此时与流动参数的重采样逐个配对，流速的点估计使用其中位数
+    n_resamples : int, optional
+        重采样次数，默认为 200
+    confidence : float, optional
+        置信水平，默认为 0.95
+    block_length : int, optional
+        移动块自助法的块长度，默认为 1
+    seed : int, optional
+        随机数种子
+    max_iter, tol :
+        Levenberg-Marquardt 的最大迭代次数和收敛阈值
+
+    Returns:
+    --------
+    dict
+        - parameters, parameters_interval, parameters_samples : 形状 (3,)、(3, 2)、(n_resamples, 3)
+        - flow_rate, flow_rate_interval, flow_rate_samples : 给出土体参数时
+    """
+    from scipy.special import kv
+    from ._solvers import batched_levenberg_marquardt
+    from .flowrate_function import calculate_flow_rate, leaky_well_function
+
+    t = np.asarray(t_observed, dtype=float)[calc_timeidx:]
+    observed = np.asarray(temp_observed, dtype=float)[calc_timeidx:]
+    parameter_estimated = np.asarray(parameter_estimated, dtype=float)[:3]
+    if not np.all(parameter_estimated[1:] > 0):
+        raise ValueError("r_divide_B和A必须大于0")
+    positive = t > 0  # compute_temperature 中 t = 0 时刻的温度恒为 0
+    t_safe = np.where(positive, t, 1.0)
+
+    def unit_response(b, A):
+        """T_steady = 1 时的温升"""
+        return np.where(positive, leaky_well_function(A / t_safe, b) / (2 * kv(0, b)), 0.0)
+
+    fitted = parameter_estimated[0] * unit_response(*parameter_estimated[1:])
+    residuals = observed - fitted
+    residuals = residuals - residuals.mean()
+    rng = np.random.default_rng(seed)
+    target = fitted + residuals[_resample_indices(rng, (n_resamples,), len(t), len(t), block_length)]
+
+    step = 1e-4  # ln r_divide_B 的差分步长
+
+    def residual_jacobian(params, rows):
+        T_steady, b, A = params[:, 0:1], np.exp(params[:, 1:2]), np.exp(params[:, 2:3])
+        response = unit_response(b, A)
+        predicted = T_steady * response
+        # dW/du = -exp(-u - b²/(4u)) / u，du/dlnA = u
+        u = A / t_safe
+        d_log_A = np.where(positive, -T_steady * np.exp(-u - b ** 2 / (4 * u)) / (2 * kv(0, b)), 0.0)
+        d_log_b = T_steady * (unit_response(b * np.exp(step), A) - response) / step
+        return predicted - target[rows], np.stack([response, d_log_b, d_log_A], axis=-1)
+
+    p0 = np.array([parameter_estimated[0], np.log(parameter_estimated[1]), np.log(parameter_estimated[2])])
+    result = batched_levenberg_marquardt(residual_jacobian, np.tile(p0, (n_resamples, 1)),
+                                         max_iter=max_iter, tol=tol)
+    samples = np.column_stack([result['x'][:, 0], np.exp(result['x'][:, 1:])])
+
+    output = {
+        'parameters': parameter_estimated,
+        'parameters_interval': _percentile_interval(samples, confidence, axis=0),
+        'parameters_samples': samples,
+    }
+    if rho_c_soil is not None and thermal_conductivity_soil is not None:
+        soil = []
+        for value in (rho_c_soil, thermal_conductivity_soil):
+            value = np.asarray(value, dtype=float)
+            if value.ndim and value.shape != (n_resamples,):
+                raise ValueError("土体参数的重采样估计长度必须等于n_resamples")
+            soil.append(value)
+        flow_samples = calculate_flow_rate(samples.T, *soil)
+        output['flow_rate'] = calculate_flow_rate(parameter_estimated, *(np.median(value) for value in soil))
+        output['flow_rate_interval'] = _percentile_interval(flow_samples, confidence)
+        output['flow_rate_samples'] = flow_samples
+    return output
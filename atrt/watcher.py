@@ -0,0 +1,259 @@
+"""
+监测目录的持续数据接入服务
+
+长期监测井的 DTS 导出文件每隔几分钟写入一个目录。DtsDirectoryWatcher 基于 asyncio
+轮询该目录：发现新文件后在线程池中并发解析，按时间顺序追加到内存中的
+DtsDataProcessing 记录，然后只对时间窗口与新数据重叠的加热事件重新运行
+AnalysisPipeline（导热系数/流速反演）。
+
+背压：同时解析的文件数不超过 max_pending；一次轮询中到达的多个文件合并为一次追加，
+每个受影响的事件只重新计算一次，计算期间到达的文件留到下一次轮询处理。
+
+示例:
+    pipeline = AnalysisPipeline(heating_power=20,
+                                thermal_conductivity={'start_calc_hour': 0.5, 'end_calc_hour': 2})
+    watcher = DtsDirectoryWatcher('/data/well1', pipeline,
+                                  events=[{'name': 'h1', 'start_str': '2024/01/01 10:00:00',
+                                           'end_str': '2024/01/02 10:00:00'}])
+    asyncio.run(watcher.run())          # 持续运行，watcher.stop() 结束
+    # 或在已有事件循环中逐次轮询：
+    updated = await watcher.poll_once()
+"""
+import asyncio
+import fnmatch
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from time import time as wall_clock
+
+import pandas as pd
+
+from .dts_dataprocessing import DtsDataProcessing
+
+TIME_FORMAT = '%Y/%m/%d %H:%M:%S'
+
+
+def read_dts_csv(path):
+    """读取一个 DTS 导出 CSV 文件（与 DtsDataProcessing 相同的表格布局）"""
+    return pd.read_csv(path)
+
+
+class DtsDirectoryWatcher:
+    """
+    监测目录中的新 DTS 文件，追加数据并增量地重新计算受影响的加热事件。
+
+    每个文件只处理一次（按路径记录）；最后修改时间距今不足 settle_time 秒的文件
+    视为仍在写入，留到下一次轮询。事件在记录中尚无加热前数据或加热时段内不足两个时刻时
+    跳过、等待后续文件；无法处理的文件和计算失败的事件记录在 errors 中（键为文件路径或事件名）。
+    """
+
+    def __init__(self, directory, pipeline=None, events=(), processor=None, pattern='*.csv',
+                 parser=read_dts_csv, poll_interval=5.0, settle_time=1.0, max_pending=4,
+                 max_workers=None, on_update=None):
+        """
+        Parameters:
+        -----------
+        directory : str
+            监测的目录
+        pipeline : AnalysisPipeline, optional
+            对受影响事件重新运行的分析流程；为 None 时只接入数据
+        events : iterable of dict, optional
+            加热事件，格式同 AnalysisPipeline.run_event；可随后用 add_event 添加
+        processor : DtsDataProcessing, optional
+            已有的记录，为 None 时由第一批文件创建
+        pattern : str, optional
+            文件名匹配模式，默认为 '*.csv'
+        parser : callable, optional
+            path -> pandas.DataFrame 的解析函数，默认为 read_dts_csv
+        poll_interval : float, optional
+            run() 的轮询间隔（秒）
+        settle_time : float, optional
+            文件最后修改后需要经过的秒数，避免读取写到一半的文件
+        max_pending : int, optional
+            同时解析的文件数上限
+        max_workers : int, optional
+            解析线程池的线程数，默认为 max_pending
+        on_update : callable, optional
+            每个事件重新计算后以 (事件名, 结果表) 调用
+        """
+        if max_pending < 1:
+            raise ValueError("max_pending必须为正整数")
+        self.directory = os.fspath(directory)
+        self.pipeline = pipeline
+        self.events = {}
+        for event in events:
+            self.add_event(event)
+        self.processor = processor
+        self.pattern = pattern
+        self.parser = parser
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.max_pending = max_pending
+        self.max_workers = max_workers or max_pending
+        self.on_update = on_update
+
+        self.results = {}
+        self.errors = {}
+        self.processed_files = []
+        self._seen = set()
+        self._executor = None
+        self._stopping = None
+
+    def add_event(self, event):
+        """添加加热事件，下一次有重叠数据到达时计算"""
+        self.events[event.get('name', event['start_str'])] = event
+
+    def _new_files(self):
+        """返回可以处理的新文件路径（按文件名排序）"""
+        now = wall_clock()
+        paths = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or not fnmatch.fnmatch(entry.name, self.pattern):
+                    continue
+                if entry.path in self._seen:
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if now - mtime >= self.settle_time:
+                    paths.append(entry.path)
+        return sorted(paths)
+
+    async def _parse_all(self, paths):
+        """在线程池中并发解析，同时进行的解析不超过 max_pending 个"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_pending)
+
+        async def parse(path):
+            async with semaphore:
+                try:
+                    return path, await loop.run_in_executor(self._executor, self.parser, path)
+                except Exception as e:
+                    return path, e
+
+        return await asyncio.gather(*(parse(path) for path in paths))
+
+    def _append(self, frames):
+        """按第一个时间戳的顺序追加，返回新数据的时间范围"""
+        ordered = []
+        for path, frame in frames:
+            try:
+                ordered.append((pd.to_datetime(frame.columns[1:]).min(), path, frame))
+            except (ValueError, IndexError) as e:
+                self.errors[path] = e
+                warnings.warn(f"文件 {path} 的列名不是时间: {e}")
+        ordered.sort(key=lambda item: item[0])
+
+        new_times = []
+        for _, path, frame in ordered:
+            try:
+                if self.processor is None:
+                    self.processor = DtsDataProcessing(frame)
+                    added = len(self.processor.time)
+                else:
+                    added = self.processor.append(frame)
+            except (ValueError, KeyError, IndexError) as e:
+                self.errors[path] = e
+                warnings.warn(f"无法追加文件 {path}: {e}")
+                continue
+            self.processed_files.append(path)
+            if added:
+                times = pd.to_datetime(frame.columns[1:])
+                new_times.extend([times.min(), times.max()])
+        if not new_times:
+            return None
+        return min(new_times), max(new_times)
+
+    def _affected_events(self, time_range):
+        """时间窗口（含加热前 1 分钟）与新数据重叠的事件"""
+        first, last = time_range
+        affected = []
+        for name, event in self.events.items():
+            start = pd.to_datetime(event['start_str'], format=TIME_FORMAT) - pd.Timedelta(minutes=1)
+            end = pd.to_datetime(event['end_str'], format=TIME_FORMAT)
+            if first <= end and last >= start:
+                affected.append(name)
+        return affected
+
+    def _has_event_data(self, event):
+        """记录中是否已有加热开始前的数据以及加热时段内至少两个时刻（extraction_heating_data 的要求）"""
+        time = self.processor.time
+        start = pd.to_datetime(event['start_str'], format=TIME_FORMAT)
+        end = pd.to_datetime(event['end_str'], format=TIME_FORMAT)
+        if len(time) == 0 or time[0] >= start:
+            return False
+        return int(((time >= start) & (time <= end)).sum()) >= 2
+
+    async def poll_once(self):
+        """
+        处理目录中的新文件，并重新计算受影响的事件。
+
+        Returns:
+        --------
+        dict
+            本次重新计算的事件名到结果表的映射
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        paths = self._new_files()
+        if not paths:
+            return {}
+        self._seen.update(paths)
+
+        frames = []
+        for path, result in await self._parse_all(paths):
+            if isinstance(result, Exception):
+                self.errors[path] = result
+                warnings.warn(f"无法解析文件 {path}: {result}")
+            else:
+                frames.append((path, result))
+        time_range = self._append(frames)
+        if time_range is None or self.pipeline is None:
+            return {}
+
+        loop = asyncio.get_running_loop()
+        updated = {}
+        for name in self._affected_events(time_range):
+            event = dict(self.events[name], name=name)
+            if not self._has_event_data(event):
+                # 事件的数据尚不足（如加热刚开始），等待后续文件
+                continue
+            try:
+                # 反演在后台线程中运行，事件循环保持响应
+                table = await loop.run_in_executor(None, self.pipeline.run_event,
+                                                   self.processor, event)
+            except Exception as e:
+                self.errors[name] = e
+                warnings.warn(f"事件 {name} 计算失败: {e}")
+                continue
+            self.errors.pop(name, None)
+            self.results[name] = updated[name] = table
+            if self.on_update is not None:
+                self.on_update(name, table)
+        return updated
+
+    async def run(self):
+        """持续轮询目录，直到调用 stop()"""
+        self._stopping = asyncio.Event()
+        try:
+            while not self._stopping.is_set():
+                await self.poll_once()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.close()
+
+    def stop(self):
+        """请求 run() 在当前轮询结束后退出（须在事件循环线程中调用）"""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    def close(self):
+        """关闭解析线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
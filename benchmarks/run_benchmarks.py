@@ -0,0 +1,312 @@
+"""
+ATRT 性能基准测试
+
+使用 atrt.synthetic 生成可配置规模的合成数据，对主要计算路径计时，
+结果保存为 JSON 文件，可与之前的结果对比以发现性能回退。
+
+用法:
+    python benchmarks/run_benchmarks.py --scale small
+    python benchmarks/run_benchmarks.py --scale medium --compare benchmarks/results/xxx.json
+    python benchmarks/run_benchmarks.py --only dts_construction,dts_extraction
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+# 添加包路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from atrt import (
+    DtsDataProcessing,
+    optimize_soil_properties_RMSE,
+    calculate_thermal_conductivity,
+    calc_mositureanddensities_micon,
+    optimize_parameters_GD,
+    optimize_parameters_DE,
+    optimize_parameters_SA,
+)
+from atrt import kernels
+from atrt.fit_context import FitContext
+from atrt.filters import denoise_temperature
+from atrt.synthetic import synthetic_dts_data, synthetic_heating_curves
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# 各规模的数据量。优化器（尤其是 optimize_parameters_SA）单个深度就需要数秒到数分钟，
+# 因此流速反演只使用少量深度和较短的序列。
+SCALES = {
+    'small': {
+        'dts_depths': 200, 'dts_time': 240,
+        'dtpm_depths': 5, 'dtpm_time': 120,
+        'tc_depths': 50,
+        'flow_depths': 1, 'flow_time': 30,
+        'moisture_depths': 50,
+    },
+    'medium': {
+        'dts_depths': 1000, 'dts_time': 720,
+        'dtpm_depths': 20, 'dtpm_time': 240,
+        'tc_depths': 200,
+        'flow_depths': 2, 'flow_time': 60,
+        'moisture_depths': 200,
+    },
+    'large': {
+        'dts_depths': 4000, 'dts_time': 2880,
+        'dtpm_depths': 100, 'dtpm_time': 480,
+        'tc_depths': 1000,
+        'flow_depths': 4, 'flow_time': 120,
+        'moisture_depths': 1000,
+    },
+}
+
+BENCHMARKS = {}
+
+
+def benchmark(name, repeat=3):
+    """
+    注册基准测试。被装饰的函数接收规模配置，完成数据准备后返回待计时的无参函数。
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, repeat)
+        return setup
+    return decorator
+
+
+@benchmark('dts_construction')
+def bench_dts_construction(scale):
+    dataset = synthetic_dts_data(scale['dts_depths'], scale['dts_time'], seed=0)
+    return lambda: DtsDataProcessing(dataset['data'])
+
+
+@benchmark('dts_extraction')
+def bench_dts_extraction(scale):
+    dataset = synthetic_dts_data(scale['dts_depths'], scale['dts_time'], seed=0)
+    processor = DtsDataProcessing(dataset['data'])
+    return lambda: processor.extraction_heating_data(
+        dataset['top_idx'], dataset['bottom_idx'], dataset['start_str'], dataset['end_str']
+    )
+
+
+@benchmark('denoise_temperature')
+def bench_denoise(scale):
+    rng = np.random.default_rng(0)
+    temp = rng.normal(15, 0.1, (scale['dts_depths'], 10 * scale['dts_time']))
+    out = np.empty_like(temp)
+    return lambda: denoise_temperature(temp, time_window=5, out=out)
+
+
+@benchmark('optimize_soil_properties_RMSE', repeat=1)
+def bench_dtpm(scale):
+    curves = synthetic_heating_curves(scale['dtpm_depths'], scale['dtpm_time'], dt=2.0,
+                                      model='kluitenberg', noise=0.01, seed=0)
+    t = curves['seconds'][1:]
+    temperature = curves['temperature'][:, 1:]
+    return lambda: optimize_soil_properties_RMSE(t, temperature, curves['variables'], [2.5e6, 1.5])
+
+
+@benchmark('calculate_thermal_conductivity')
+def bench_thermal_conductivity(scale):
+    curves = synthetic_heating_curves(scale['tc_depths'], scale['dts_time'], model='clhs',
+                                      noise=0.02, seed=0)
+
+    def run():
+        for row in curves['temperature']:
+            calculate_thermal_conductivity(row, curves['seconds'], 0.5, 1.5, curves['variables'][1])
+    return run
+
+
+@benchmark('optimize_parameters_GD', repeat=1)
+def bench_flow_gd(scale):
+    curves = synthetic_heating_curves(scale['flow_depths'], scale['flow_time'], dt=120.0,
+                                      model='well', noise=0.02, seed=0)
+
+    def run():
+        for row in curves['temperature']:
+            optimize_parameters_GD(curves['seconds'], row, 1, [3.0, 0.5, 1500.0], 'Nelder-Mead')
+    return run
+
+
+@benchmark('optimize_parameters_SA', repeat=1)
+def bench_flow_sa(scale):
+    curves = synthetic_heating_curves(scale['flow_depths'], scale['flow_time'], dt=120.0,
+                                      model='well', noise=0.02, seed=0)
+    bounds = [(0.1, 10.0), (0.01, 5.0), (10.0, 1e4)]
+
+    def run():
+        for row in curves['temperature']:
+            optimize_parameters_SA(curves['seconds'], row, 1, [3.0, 0.5, 1500.0], bounds)
+    return run
+
+
+@benchmark('optimize_parameters_DE', repeat=1)
+def bench_flow_de(scale):
+    curves = synthetic_heating_curves(scale['flow_depths'], scale['flow_time'], dt=120.0,
+                                      model='well', noise=0.02, seed=0)
+    bounds = [(0.1, 10.0), (0.01, 5.0), (10.0, 1e4)]
+
+    def run():
+        for row in curves['temperature']:
+            optimize_parameters_DE(curves['seconds'], row, 1, bounds, [3.0, 0.5, 1500.0], seed=0)
+    return run
+
+
+def _register_objective_benchmarks(backend):
+    """各计算后端下单次目标函数求值的耗时（每个深度调用一次）"""
+    @benchmark(f'kluitenberg_objective[{backend}]')
+    def bench_kluitenberg_objective(scale):
+        curves = synthetic_heating_curves(scale['dtpm_depths'], scale['dtpm_time'], dt=2.0,
+                                          model='kluitenberg', noise=0.01, seed=0)
+        objectives = [kernels.kluitenberg_objective(row[1:], curves['seconds'][1:], curves['variables'],
+                                                    backend=backend)
+                      for row in curves['temperature']]
+        return lambda: [objective([2.5e6, 1.5]) for objective in objectives]
+
+    @benchmark(f'leaky_well_objective[{backend}]')
+    def bench_leaky_well_objective(scale):
+        curves = synthetic_heating_curves(scale['dtpm_depths'], scale['flow_time'], dt=120.0,
+                                          model='well', noise=0.02, seed=0)
+        objectives = [kernels.leaky_well_objective(curves['seconds'], row, 1, backend=backend)
+                      for row in curves['temperature']]
+        return lambda: [objective([3.0, 0.5, 1500.0]) for objective in objectives]
+
+
+for _backend in ('scipy', 'numpy') + (('numba',) if kernels.numba_available() else ()):
+    _register_objective_benchmarks(_backend)
+
+
+@benchmark('kluitenberg_objective[fit_context]')
+def bench_kluitenberg_objective_context(scale):
+    curves = synthetic_heating_curves(scale['dtpm_depths'], scale['dtpm_time'], dt=2.0,
+                                      model='kluitenberg', noise=0.01, seed=0)
+    context = FitContext(curves['seconds'][1:])
+    objectives = [kernels.kluitenberg_objective(row[1:], curves['seconds'][1:], curves['variables'],
+                                                context=context)
+                  for row in curves['temperature']]
+    return lambda: [objective([2.5e6, 1.5]) for objective in objectives]
+
+
+@benchmark('leaky_well_objective[fit_context]')
+def bench_leaky_well_objective_context(scale):
+    curves = synthetic_heating_curves(scale['dtpm_depths'], scale['flow_time'], dt=120.0,
+                                      model='well', noise=0.02, seed=0)
+    context = FitContext(curves['seconds'])
+    objectives = [kernels.leaky_well_objective(curves['seconds'], row, 1, context=context)
+                  for row in curves['temperature']]
+    return lambda: [objective([3.0, 0.5, 1500.0]) for objective in objectives]
+
+
+@benchmark('calc_mositureanddensities_micon')
+def bench_moisture(scale):
+    rng = np.random.default_rng(0)
+    Cv = rng.uniform(1.5, 3.0, scale['moisture_depths'])
+    lamda = rng.uniform(0.8, 2.0, scale['moisture_depths'])
+    return lambda: calc_mositureanddensities_micon(Cv, lamda, [1.5, 0.2])
+
+
+def time_callable(function, repeat):
+    """多次运行并返回耗时统计（秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {
+        'min': min(timings),
+        'median': float(np.median(timings)),
+        'repeat': repeat,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scale_name, names=None, repeat=None):
+    """运行基准测试，返回结果字典"""
+    scale = SCALES[scale_name]
+    names = names or list(BENCHMARKS)
+    results = {}
+    for name in names:
+        setup, default_repeat = BENCHMARKS[name]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            function = setup(scale)
+            results[name] = time_callable(function, repeat or default_repeat)
+        print(f"{name:<36s} {results[name]['min']:>10.4f} s")
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'scale': scale_name,
+        'config': scale,
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(current, previous, threshold=1.2):
+    """与之前的结果对比，返回耗时增加超过 threshold 倍的基准测试名称"""
+    regressions = []
+    print(f"\n与 {previous.get('git_commit')} ({previous.get('timestamp')}) 对比:")
+    for name, result in current['results'].items():
+        if name not in previous['results']:
+            continue
+        ratio = result['min'] / previous['results'][name]['min']
+        flag = '  <-- 回退' if ratio > threshold else ''
+        print(f"{name:<36s} {ratio:>8.2f}x{flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ATRT 性能基准测试')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--only', help='只运行指定的基准测试（逗号分隔）')
+    parser.add_argument('--repeat', type=int, help='覆盖默认的重复次数')
+    parser.add_argument('--output', help='结果文件路径，默认保存到 benchmarks/results/')
+    parser.add_argument('--compare', help='用于对比的历史结果文件')
+    parser.add_argument('--threshold', type=float, default=1.2, help='判定为回退的耗时倍数')
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else None
+    if names:
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            parser.error(f"未知的基准测试: {', '.join(sorted(unknown))}")
+
+    current = run_benchmarks(args.scale, names, args.repeat)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{args.scale}-{stamp}.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if compare(current, previous, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
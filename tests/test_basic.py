@@ -3,6 +3,7 @@
 """
 
 import unittest
+import subprocess
 import numpy as np
 import pandas as pd
 import sys
@@ -78,5 +79,63 @@ class TestHelperFunctions(unittest.TestCase):
         self.assertEqual(idx, 2)  # 应该找到索引2（值为5）
 
 
+class TestLazyImport(unittest.TestCase):
+    """测试包的延迟导入"""
+
+    # import atrt 的时间预算（秒）
+    IMPORT_TIME_BUDGET = 0.2
+
+    def run_python(self, code):
+        """在新的解释器进程中运行代码并返回标准输出"""
+        package_root = os.path.join(os.path.dirname(__file__), '..')
+        result = subprocess.run([sys.executable, '-c', code], cwd=package_root,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+
+    def test_import_time(self):
+        """import atrt 不加载重量级依赖，且在时间预算之内"""
+        output = self.run_python(
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import atrt\n"
+            "elapsed = time.perf_counter() - start\n"
+            "heavy = [m for m in ('numpy', 'pandas', 'scipy', 'matplotlib') if m in sys.modules]\n"
+            "print(elapsed, ','.join(heavy))"
+        )
+        elapsed, _, heavy = output.partition(' ')
+        self.assertEqual(heavy, '')
+        self.assertLess(float(elapsed), self.IMPORT_TIME_BUDGET)
+
+    def test_data_processing_without_plotting(self):
+        """只使用 DtsDataProcessing 时不加载 scipy 和 matplotlib"""
+        output = self.run_python(
+            "import sys\n"
+            "from atrt import DtsDataProcessing\n"
+            "print(','.join(m for m in ('scipy', 'matplotlib') if m in sys.modules))"
+        )
+        self.assertEqual(output, '')
+
+    def test_calculation_modules_defer_scipy(self):
+        """导入计算模块不加载 scipy，第一次求值时才导入 scipy.special"""
+        output = self.run_python(
+            "import sys\n"
+            "import numpy as np\n"
+            "from atrt.DTPM_calcfunc import calc_temp\n"
+            "from atrt import flowrate_function, kernels, thermal_conductivity_function\n"
+            "before = 'scipy' in sys.modules\n"
+            "calc_temp([2.4e6, 1.4], np.array([1.0, 2.0]), [0.006, 20.0, 1.5])\n"
+            "print(before, 'scipy.special' in sys.modules)"
+        )
+        self.assertEqual(output, 'False True')
+
+    def test_public_api_resolves(self):
+        """__all__ 中的名称均可访问"""
+        import atrt
+        for name in atrt.__all__:
+            self.assertTrue(callable(getattr(atrt, name)), name)
+        with self.assertRaises(AttributeError):
+            atrt.not_a_function
+
+
 if __name__ == '__main__':
     unittest.main()
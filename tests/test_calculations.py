@@ -0,0 +1,559 @@
+"""
+测试ATRT包的计算函数
+"""
+
+import unittest
+import numpy as np
+import sys
+import os
+import tempfile
+
+# 添加包路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from atrt.thermal_conductivity_function import (
+    corrected_power_per_meter,
+    corrected_power_matrix,
+    calculate_thermal_conductivity,
+    scan_thermal_conductivity_windows,
+    temperature_response,
+    CLHS_RMSE,
+    optimize_CLHS_parameters
+)
+from atrt.DTPM_calcfunc import (
+    calc_temp,
+    optimize_soil_properties_DE,
+    optimize_soil_properties_joint,
+    optimize_soil_properties_RMSE,
+)
+from atrt.instrumentation import Instrumentation
+from atrt.checkpoint import Checkpoint
+from atrt.cache import ResultCache
+from atrt._hashing import hash_inputs
+from atrt.synthetic import synthetic_heating_curves
+from atrt.uncertainty import (
+    bootstrap_flow_parameters,
+    bootstrap_soil_properties,
+    bootstrap_thermal_conductivity,
+)
+from atrt.flowrate_function import (
+    calc_rmse_std,
+    calculate_flow_rate,
+    compute_temperature,
+    optimize_parameters_batch,
+    optimize_parameters_DE,
+)
+from atrt.superposition import (
+    temperature_response_variable_power,
+    calc_temp_variable_power,
+    compute_temperature_variable_power
+)
+
+
+def create_heating_curve(slopes, seconds, noise=0.02, seed=0):
+    """创建 ln(t) 线性温升曲线"""
+    rng = np.random.default_rng(seed)
+    ln_time = np.log(np.maximum(seconds, 1))
+    slopes = np.atleast_1d(slopes)[:, np.newaxis]
+    return slopes * ln_time + 1 + rng.normal(0, noise, (slopes.shape[0], len(seconds)))
+
+
+class TestPowerMatrix(unittest.TestCase):
+    """测试加热功率矩阵"""
+
+    def test_matches_per_depth_power(self):
+        """与逐深度的 corrected_power_per_meter 一致"""
+        rng = np.random.default_rng(2)
+        seconds = np.arange(0, 3600, 60.0)
+        natural_temp = np.array([15.0, 16.0, 17.0])
+        temperature = natural_temp[:, np.newaxis] + rng.uniform(0, 5, (3, len(seconds)))
+
+        P_matrix, P_avg = corrected_power_matrix(10, temperature, natural_temp, time=seconds)
+        self.assertEqual(P_matrix.shape, temperature.shape)
+        for i in range(3):
+            P_array, P_avg_i = corrected_power_per_meter(10, temperature[i], natural_temp[i],
+                                                         time=seconds)
+            np.testing.assert_allclose(P_matrix[i], P_array)
+            self.assertAlmostEqual(P_avg[i], P_avg_i)
+
+
+class TestThermalConductivityScan(unittest.TestCase):
+    """测试导热系数窗口扫描"""
+
+    def setUp(self):
+        self.seconds = np.arange(0, 3 * 3600 + 1, 30.0)
+        self.heating_power = np.array([20.0, 15.0])
+        self.delta_temp = create_heating_curve([0.5, 0.3], self.seconds)
+        self.hour_grid = [0.25, 0.5, 1, 2, 3]
+
+    def test_matches_single_window_fit(self):
+        """扫描结果与单窗口拟合一致"""
+        result = scan_thermal_conductivity_windows(
+            self.delta_temp, self.seconds, self.heating_power, hour_grid=self.hour_grid
+        )
+        for depth, power in enumerate(self.heating_power):
+            tc, error, r_squared, _, _ = calculate_thermal_conductivity(
+                self.delta_temp[depth], self.seconds, 0.5, 2, power
+            )
+            self.assertAlmostEqual(result['thermal_conductivity'][depth, 1, 3], tc, places=6)
+            self.assertAlmostEqual(result['error'][depth, 1, 3], error, places=6)
+            self.assertAlmostEqual(result['r_squared'][depth, 1, 3], r_squared, places=6)
+
+    def test_best_window(self):
+        """自动选择的窗口有效且接近真值"""
+        result = scan_thermal_conductivity_windows(
+            self.delta_temp, self.seconds, self.heating_power, hour_grid=self.hour_grid
+        )
+        expected = self.heating_power / (4 * np.pi * np.array([0.5, 0.3]))
+        np.testing.assert_allclose(result['best_thermal_conductivity'], expected, rtol=0.05)
+        self.assertTrue(np.all(result['best_start_hour'] < result['best_end_hour']))
+        # 起点不早于终点的窗口无效
+        self.assertTrue(np.all(np.isnan(result['thermal_conductivity'][:, 2, 1])))
+
+    def test_invalid_power(self):
+        """非正加热功率抛出异常"""
+        with self.assertRaises(ValueError):
+            scan_thermal_conductivity_windows(self.delta_temp, self.seconds, 0)
+
+
+class TestCLHSInversion(unittest.TestCase):
+    """测试持续线热源批量反演"""
+
+    def setUp(self):
+        self.t = np.arange(0, 7200, 30.0)
+        self.alpha = np.array([4e-7, 8e-7, 6e-7])
+        self.lambda_ = np.array([1.2, 2.0, 1.6])
+        self.q = np.array([20.0, 25.0, 18.0])
+        self.r = np.array([0.0007, 0.001, 0.0007])
+        rng = np.random.default_rng(1)
+        self.T_measured = np.stack([
+            temperature_response(self.t, self.q[i], self.lambda_[i], self.alpha[i], self.r[i])
+            for i in range(3)
+        ]) + rng.normal(0, 0.02, (3, len(self.t)))
+
+    def test_recovers_parameters(self):
+        """所有深度同时反演，结果接近真值"""
+        result = optimize_CLHS_parameters(self.T_measured, self.t, self.q, self.r)
+        self.assertTrue(np.all(result['converged']))
+        np.testing.assert_allclose(result['thermal_conductivity'], self.lambda_, rtol=0.02)
+        np.testing.assert_allclose(result['alpha'], self.alpha, rtol=0.05)
+        self.assertTrue(np.all(result['thermal_conductivity_error'] > 0))
+
+    def test_rmse_consistent(self):
+        """返回的 RMSE 与 CLHS_RMSE 一致"""
+        result = optimize_CLHS_parameters(self.T_measured, self.t, self.q, self.r)
+        rmse = CLHS_RMSE([result['alpha'][1], result['thermal_conductivity'][1]],
+                         self.T_measured[1], self.t, self.q[1], self.r[1])
+        self.assertAlmostEqual(result['RMSE'][1], rmse, places=10)
+
+    def test_instrumentation_totals(self):
+        """每个深度一行，记录整批的整数调用次数、耗时和批内深度数"""
+        class KeepObjective(Instrumentation):
+            def wrap_objective(self, function):
+                self.objective = super().wrap_objective(function)
+                return self.objective
+
+        instrumentation = KeepObjective()
+        optimize_CLHS_parameters(self.T_measured, self.t, self.q, self.r, instrumentation=instrumentation)
+        table = instrumentation.to_frame()
+        self.assertEqual(len(table), 3)
+        self.assertEqual(list(table['objective_calls']), [instrumentation.objective.calls] * 3)
+        self.assertIsInstance(instrumentation.records[0]['objective_calls'], int)
+        self.assertEqual(list(table['batch_size']), [3] * 3)
+        self.assertTrue((table['objective_time'] == instrumentation.objective.time).all())
+
+
+class TestVariablePowerSuperposition(unittest.TestCase):
+    """测试变功率叠加正演模型"""
+
+    def setUp(self):
+        self.t = np.arange(0, 7200.0, 10)
+        self.P_constant = np.full(len(self.t), 20.0)
+
+    def test_constant_power_matches_models(self):
+        """恒定功率时与原有正演模型一致"""
+        expected = temperature_response(self.t, 20.0, 1.5, 5e-7)
+        expected[0] = 0.0
+        np.testing.assert_allclose(
+            temperature_response_variable_power(self.t, self.P_constant, 1.5, 5e-7),
+            expected, atol=1e-10)
+
+        expected = calc_temp([2e6, 1.5], self.t, [0.006, 20.0, 3600])
+        result = calc_temp_variable_power([2e6, 1.5], self.t, self.P_constant, 0.006, t0=3600)
+        np.testing.assert_allclose(result[1:], expected[1:], atol=1e-10)
+
+        np.testing.assert_allclose(
+            compute_temperature_variable_power([3.0, 0.5, 2000.0], self.t, self.P_constant),
+            compute_temperature([3.0, 0.5, 2000.0], self.t), atol=1e-7)
+
+    def test_matches_direct_convolution(self):
+        """变功率、多深度时与直接 O(n²) 叠加一致"""
+        P_array = 20 + 0.001 * self.t
+        k = np.array([1.2, 1.8])
+        result = temperature_response_variable_power(self.t, P_array, k, 5e-7)
+        self.assertEqual(result.shape, (2, len(self.t)))
+
+        delta_P = np.diff(P_array, prepend=0.0)
+        for i in range(2):
+            U = temperature_response(self.t - self.t[0], 1.0, k[i], 5e-7)
+            U[0] = 0.0
+            direct = np.array([np.sum(delta_P[:n + 1] * U[n::-1]) for n in range(len(self.t))])
+            np.testing.assert_allclose(result[i], direct, atol=1e-10)
+
+    def test_requires_uniform_grid(self):
+        """非均匀时间网格抛出异常"""
+        with self.assertRaises(ValueError):
+            temperature_response_variable_power(self.t ** 1.1, self.P_constant, 1.5, 5e-7)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """测试求解统计"""
+
+    def test_records_per_depth_statistics(self):
+        """每个深度一条记录，并累计阶段耗时"""
+        instrumentation = Instrumentation()
+        curves = synthetic_heating_curves(2, 60, dt=4.0, model='kluitenberg', noise=0.01, seed=0)
+        with instrumentation.stage('fit'):
+            optimize_soil_properties_RMSE(curves['seconds'][1:], curves['temperature'][:, 1:],
+                                          curves['variables'], [2.5e6, 1.5],
+                                          instrumentation=instrumentation)
+
+        table = instrumentation.to_frame()
+        self.assertEqual(len(table), 2)
+        self.assertEqual(list(table['depth']), [0, 1])
+        # minimize 报告的函数调用次数与包装器统计一致
+        self.assertTrue((table['nfev'] == table['objective_calls']).all())
+        self.assertTrue((table['objective_time'] <= table['wall_time']).all())
+
+        stages = instrumentation.stage_frame()
+        self.assertEqual(list(stages['stage']), ['fit'])
+        self.assertEqual(stages['count'][0], 1)
+
+
+class TestJointInversion(unittest.TestCase):
+    """测试联合深度正则化反演"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.t = np.arange(1, 61) * 4.0
+        depth = np.linspace(0, 1, 40)
+        cls.lambda_true = 1.5 + 0.5 * np.sin(3 * depth)
+        cls.Cv_true = 2.2e6 + 0.3e6 * np.cos(2 * depth)
+        cls.variables = [0.006, 50.0, cls.t[-1] / 2]
+        clean = np.array([calc_temp([Cv, lambda_], cls.t, cls.variables)
+                          for Cv, lambda_ in zip(cls.Cv_true, cls.lambda_true)])
+        cls.T = clean + np.random.default_rng(0).normal(0, 0.3, clean.shape)
+        cls.independent = optimize_soil_properties_RMSE(cls.t, cls.T, cls.variables, [2.5e6, 1.5])
+
+    def error(self, lambda_):
+        return np.sqrt(np.mean((lambda_ / self.lambda_true - 1) ** 2))
+
+    def test_without_regularization_matches_independent(self):
+        """正则化系数为 0 时等价于逐深度独立拟合"""
+        Cv, lambda_, RMSE = optimize_soil_properties_joint(self.t, self.T, self.variables, [2.5e6, 1.5],
+                                                           regularization=0)
+        np.testing.assert_allclose(lambda_, self.independent[1], rtol=1e-3)
+        np.testing.assert_allclose(RMSE, self.independent[2], rtol=1e-3)
+
+    def test_regularization_reduces_error(self):
+        """平滑惩罚与全变差惩罚都使剖面更接近真值"""
+        baseline = self.error(self.independent[1])
+        for penalty in ('smooth', 'tv'):
+            with self.subTest(penalty=penalty):
+                instrumentation = Instrumentation()
+                _, lambda_, _ = optimize_soil_properties_joint(
+                    self.t, self.T, self.variables, self.independent[:2], regularization=1e-2,
+                    penalty=penalty, instrumentation=instrumentation)
+                self.assertLess(self.error(lambda_), baseline)
+                self.assertEqual(list(instrumentation.to_frame()['solver']),
+                                 ['optimize_soil_properties_joint'])
+
+    def test_invalid_penalty(self):
+        with self.assertRaises(ValueError):
+            optimize_soil_properties_joint(self.t, self.T, self.variables, [2.5e6, 1.5], penalty='l1')
+
+
+class TestBootstrap(unittest.TestCase):
+    """测试自助法不确定性估计"""
+
+    def test_thermal_conductivity_matches_covariance(self):
+        """重采样估计的标准差与协方差误差传播一致"""
+        curves = synthetic_heating_curves(1, 240, dt=30.0, model='clhs', noise=0.05, seed=0)
+        args = (curves['temperature'][0], curves['seconds'], 0.3, 1.8, 20)
+        result = bootstrap_thermal_conductivity(*args, seed=0)
+        thermal_conductivity, error = calculate_thermal_conductivity(*args)[:2]
+        self.assertEqual(result['thermal_conductivity'], thermal_conductivity)
+        self.assertEqual(result['thermal_conductivity_samples'].shape, (1000,))
+        self.assertAlmostEqual(np.std(result['thermal_conductivity_samples']), error, delta=0.2 * error)
+        lower, upper = result['thermal_conductivity_interval']
+        self.assertLess(lower, thermal_conductivity)
+        self.assertGreater(upper, thermal_conductivity)
+
+    def test_soil_properties(self):
+        """点估计与 optimize_soil_properties_RMSE 一致，区间包含真值"""
+        curves = synthetic_heating_curves(3, 60, dt=4.0, model='kluitenberg', noise=0.05, seed=1)
+        result = bootstrap_soil_properties(curves['seconds'], curves['temperature'], curves['variables'],
+                                           n_resamples=100, seed=0)
+        Cv, lambda_, RMSE = optimize_soil_properties_RMSE(curves['seconds'][1:], curves['temperature'][:, 1:],
+                                                          curves['variables'], [2.5e6, 1.5])
+        np.testing.assert_allclose(result['lambda'], lambda_, rtol=1e-4)
+        np.testing.assert_allclose(result['RMSE'], RMSE, rtol=1e-4)
+        self.assertEqual(result['Cv_samples'].shape, (3, 100))
+        interval = result['lambda_interval']
+        self.assertTrue(np.all((interval[:, 0] <= curves['parameters']['lambda'])
+                               & (curves['parameters']['lambda'] <= interval[:, 1])))
+
+    def test_flow_parameters_and_rate(self):
+        """流动参数区间包含真值，流速与土体参数的重采样逐个配对"""
+        curves = synthetic_heating_curves(1, 120, dt=120.0, model='well', noise=0.02, seed=2)
+        truth = [curves['parameters'][name][0] for name in ('T_steady', 'r_divide_B', 'A')]
+        soil_samples = np.linspace(2.0e6, 2.2e6, 50), np.linspace(1.4, 1.6, 50)
+        result = bootstrap_flow_parameters(curves['seconds'], curves['temperature'][0], 1, truth,
+                                           *soil_samples, n_resamples=50, seed=0)
+        interval = result['parameters_interval']
+        self.assertTrue(np.all((interval[:, 0] <= truth) & (truth <= interval[:, 1])))
+        expected = calculate_flow_rate(result['parameters_samples'].T, *soil_samples)
+        np.testing.assert_allclose(result['flow_rate_samples'], expected)
+        with self.assertRaises(ValueError):
+            bootstrap_flow_parameters(curves['seconds'], curves['temperature'][0], 1, truth,
+                                      np.ones(3), 1.5, n_resamples=50)
+
+
+class TestDifferentialEvolution(unittest.TestCase):
+    """测试种群批量评估的差分进化全局优化"""
+
+    def test_soil_properties(self):
+        """不依赖初始猜测，达到与 Nelder-Mead 相同的极小值"""
+        curves = synthetic_heating_curves(2, 60, dt=4.0, model='kluitenberg', noise=0.05, seed=1)
+        instrumentation = Instrumentation()
+        Cv, lambda_, RMSE = optimize_soil_properties_DE(curves['seconds'], curves['temperature'],
+                                                        curves['variables'], seed=0,
+                                                        instrumentation=instrumentation)
+        reference = optimize_soil_properties_RMSE(curves['seconds'][1:], curves['temperature'][:, 1:],
+                                                  curves['variables'], [2.5e6, 1.5])
+        np.testing.assert_allclose(RMSE, reference[2], rtol=1e-8)
+        np.testing.assert_allclose(lambda_, reference[1], rtol=1e-4)
+        self.assertEqual(list(instrumentation.to_frame()['solver']), ['optimize_soil_properties_DE'] * 2)
+
+    def test_flow_batch_in_process_pool(self):
+        """进程池与依次求解的结果相同，目标值不高于真实参数处的值"""
+        curves = synthetic_heating_curves(2, 60, dt=120.0, model='well', noise=0.02, seed=2)
+        bounds = [(0.5, 10.0), (0.01, 3.0), (10.0, 10000.0)]
+        args = (curves['seconds'], curves['temperature'], 1, [3.0, 0.5, 1000.0], 'DE', bounds)
+        parameters, rmse_std = optimize_parameters_batch(*args, seed=0)
+        pooled = optimize_parameters_batch(*args, seed=0, processes=2)
+        np.testing.assert_allclose(pooled[0], parameters)
+        for i in range(2):
+            truth = [curves['parameters'][name][i] for name in ('T_steady', 'r_divide_B', 'A')]
+            self.assertLessEqual(rmse_std[i], calc_rmse_std(truth, curves['seconds'], curves['temperature'][i], 1))
+
+    def test_flow_batch_cache_across_runs(self):
+        """在另一个进程中以相同种子重新运行时各深度都命中缓存（缓存键不含随机数生成器对象）"""
+        import subprocess
+
+        script = (
+            "import sys; sys.path.insert(0, {root!r})\n"
+            "from atrt.flowrate_function import optimize_parameters_batch\n"
+            "from atrt.synthetic import synthetic_heating_curves\n"
+            "curves = synthetic_heating_curves(2, 40, dt=120.0, model='well', noise=0.02, seed=2)\n"
+            "bounds = [(0.5, 10.0), (0.01, 3.0), (10.0, 10000.0)]\n"
+            "optimize_parameters_batch(curves['seconds'], curves['temperature'], 1, [3.0, 0.5, 1000.0], 'DE',\n"
+            "                          bounds, seed=0, cache={directory!r})\n"
+        )
+        curves = synthetic_heating_curves(2, 40, dt=120.0, model='well', noise=0.02, seed=2)
+        bounds = [(0.5, 10.0), (0.01, 3.0), (10.0, 10000.0)]
+        with tempfile.TemporaryDirectory() as directory:
+            root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+            subprocess.run([sys.executable, '-c', script.format(root=root, directory=directory)], check=True)
+            cache = ResultCache(directory)
+            optimize_parameters_batch(curves['seconds'], curves['temperature'], 1, [3.0, 0.5, 1000.0], 'DE',
+                                      bounds, seed=0, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (2, 0))
+            self.assertEqual(len(cache), 2)
+
+    def test_flow_history_without_extra_evaluations(self):
+        """求解路径记录每一代最优个体的目标值，不额外评估目标函数"""
+        from unittest import mock
+        from atrt import kernels
+
+        curves = synthetic_heating_curves(1, 40, dt=120.0, model='well', noise=0.02, seed=2)
+        bounds = [(0.5, 10.0), (0.01, 3.0), (10.0, 10000.0)]
+        args = (curves['seconds'], curves['temperature'][0], 1)
+        instrumentation = Instrumentation()
+        with mock.patch.object(kernels, 'leaky_well_rmse_std_batch',
+                               wraps=kernels.leaky_well_rmse_std_batch) as batch:
+            _, _, history = optimize_parameters_DE(*args, bounds, seed=0, maxiter=20,
+                                                   instrumentation=instrumentation)
+        self.assertEqual(batch.call_count, instrumentation.to_frame()['objective_calls'][0])
+        parameters = np.array([x for x, _ in history])
+        np.testing.assert_allclose([value for _, value in history],
+                                   kernels.leaky_well_rmse_std_batch(parameters, *args))
+
+
+class TestCheckpoint(unittest.TestCase):
+    """测试检查点续算"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'dtpm.npz')
+        curves = synthetic_heating_curves(3, 60, dt=4.0, model='kluitenberg', noise=0.01, seed=1)
+        self.args = (curves['seconds'][1:], curves['temperature'][:, 1:], curves['variables'], [2.5e6, 1.5])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume_skips_finished_depths(self):
+        """重新运行时直接读取已完成深度的结果"""
+        reference = optimize_soil_properties_RMSE(*self.args, checkpoint=self.path)
+        self.assertTrue(os.path.exists(self.path))
+
+        # 模拟中断：只保留第 0 个深度，并写入可识别的值
+        with np.load(self.path) as data:
+            fingerprint = str(data['__fingerprint__'])
+        os.remove(self.path)
+        checkpoint = Checkpoint(self.path, 3, fingerprint)
+        checkpoint.complete(0, Cv=1.0, **{'lambda': 2.0}, RMSE=3.0)
+        checkpoint.save()
+
+        instrumentation = Instrumentation()
+        Cv, lambda_, RMSE = optimize_soil_properties_RMSE(*self.args, instrumentation=instrumentation,
+                                                          checkpoint=self.path)
+        self.assertEqual((Cv[0], lambda_[0], RMSE[0]), (1.0, 2.0, 3.0))
+        np.testing.assert_allclose(Cv[1:], reference[0][1:])
+        self.assertEqual(list(instrumentation.to_frame()['depth']), [1, 2])
+
+    def test_rejects_different_inputs(self):
+        """输入不同时不覆盖已有检查点"""
+        optimize_soil_properties_RMSE(*self.args, checkpoint=self.path)
+        with self.assertRaises(ValueError):
+            optimize_soil_properties_RMSE(self.args[0], self.args[1] + 0.1, *self.args[2:],
+                                          checkpoint=self.path)
+
+    def test_partial_state_round_trip(self):
+        """中断深度的当前最优解可以恢复"""
+        fingerprint = hash_inputs('test', np.arange(3), [1, 2.0])
+        self.assertEqual(fingerprint, hash_inputs('test', np.arange(3.0), [1.0, 2]))
+        checkpoint = Checkpoint(self.path, 4, fingerprint, interval=0)
+        checkpoint.complete(0, parameter_estimated=[1.0, 2.0, 3.0], rmse_std=0.1)
+        checkpoint.set_partial(1, [4.0, 5.0, 6.0])
+
+        resumed = Checkpoint(self.path, 4, fingerprint)
+        self.assertEqual(resumed.n_done, 1)
+        np.testing.assert_array_equal(resumed.get('parameter_estimated', 0), [1.0, 2.0, 3.0])
+        np.testing.assert_array_equal(resumed.partial_state(1), [4.0, 5.0, 6.0])
+        self.assertIsNone(resumed.partial_state(2))
+        self.assertEqual(os.listdir(self.directory.name), ['dtpm.npz'])
+
+
+class TestResultCache(unittest.TestCase):
+    """测试拟合结果缓存"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_dtpm_hits_per_depth(self):
+        """只有输入改变的深度重新优化"""
+        curves = synthetic_heating_curves(3, 60, dt=4.0, model='kluitenberg', noise=0.01, seed=2)
+        time, temperature = curves['seconds'][1:], curves['temperature'][:, 1:]
+        reference = optimize_soil_properties_RMSE(time, temperature, curves['variables'], [2.5e6, 1.5],
+                                                  cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 3))
+
+        temperature = temperature.copy()
+        temperature[1] += 0.05
+        instrumentation = Instrumentation()
+        result = optimize_soil_properties_RMSE(time, temperature, curves['variables'], [2.5e6, 1.5],
+                                               instrumentation=instrumentation, cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 4))
+        # 命中的深度也记录一行，cached 为 True 且没有求解统计
+        table = instrumentation.to_frame()
+        self.assertEqual(list(table['depth']), [0, 1, 2])
+        self.assertEqual(list(table['cached']), [True, False, True])
+        self.assertTrue(table.loc[table['cached'], 'nfev'].isna().all())
+        np.testing.assert_array_equal(table['fun'][[0, 2]], reference[2][[0, 2]])
+        np.testing.assert_array_equal(result[0][[0, 2]], reference[0][[0, 2]])
+
+    def test_thermal_conductivity(self):
+        """命中时返回与直接计算相同的结果"""
+        seconds = np.arange(0, 7200, 30.0)
+        delta_temperature = create_heating_curve(0.8, seconds)[0][1:]
+        seconds = seconds[1:]
+        direct = calculate_thermal_conductivity(delta_temperature, seconds, 0.5, 1.5, 20)
+        for _ in range(2):
+            cached = calculate_thermal_conductivity(delta_temperature, seconds, 0.5, 1.5, 20,
+                                                    cache=self.directory.name)
+            for expected, value in zip(direct, cached):
+                np.testing.assert_allclose(value, expected)
+
+    def test_key_includes_format_version(self):
+        """缓存格式版本改变后旧条目不再命中"""
+        from unittest import mock
+        from atrt import cache as cache_module
+
+        key = self.cache.key('f', np.arange(3))
+        self.assertTrue(key.startswith(f'f-v{cache_module.CACHE_FORMAT}-'))
+        with mock.patch.object(cache_module, 'CACHE_FORMAT', cache_module.CACHE_FORMAT + 1):
+            self.assertNotEqual(self.cache.key('f', np.arange(3))[-64:], key[-64:])
+        with mock.patch.object(cache_module, '__version__', '0.0.0'):
+            self.assertNotEqual(self.cache.key('f', np.arange(3)), key)
+
+    def test_flow_hit_is_recorded(self):
+        """流速拟合命中缓存时记录 cached=True 的一行"""
+        from atrt.fit_context import FitContext
+        from atrt.flowrate_function import optimize_parameters_GD
+
+        curves = synthetic_heating_curves(1, 40, dt=120.0, model='well', noise=0.02, seed=2)
+        args = (curves['seconds'], curves['temperature'][0], 1, [3.0, 0.5, 1000.0], 'Nelder-Mead')
+        context = FitContext(curves['seconds'])
+        instrumentation = Instrumentation()
+        first = optimize_parameters_GD(*args, instrumentation=instrumentation, depth=4,
+                                       cache=self.cache, context=context, disp=False)
+        second = optimize_parameters_GD(*args, instrumentation=instrumentation, depth=4,
+                                        cache=self.cache, context=context, disp=False)
+        table = instrumentation.to_frame()
+        self.assertEqual(list(table['cached']), [False, True])
+        self.assertEqual(list(table['depth']), [4, 4])
+        self.assertEqual(table['fun'][1], second[1])
+        self.assertEqual(second[1], first[1])
+
+    def test_lru_eviction(self):
+        """超过大小上限时淘汰最久未使用的条目"""
+        for i, name in enumerate('abc'):
+            self.cache.put(name, value=np.zeros(100))
+            os.utime(os.path.join(self.directory.name, name + '.npz'), ns=(i, i))
+        self.cache.get('a')  # 'a' 变为最近使用
+        entry_size = self.cache.size_bytes // 3
+        self.cache.max_bytes = 3 * entry_size
+        self.cache.put('d', value=np.zeros(100))
+
+        self.assertIsNone(self.cache.get('b'))
+        for name in 'acd':
+            self.assertIsNotNone(self.cache.get(name))
+
+    def test_unhashable_objects_rejected(self):
+        """repr 含内存地址的对象不能参与哈希"""
+        with self.assertRaises(TypeError):
+            hash_inputs(np.random.default_rng(0))
+        self.assertEqual(hash_inputs([(1e-6, None)], 'a'), hash_inputs([(1e-6, None)], 'a'))
+
+    def test_overwrite_does_not_grow_size(self):
+        """重复写入同一个键不累加大小，不会提前淘汰其他条目"""
+        from unittest import mock
+
+        self.cache.put('a', value=np.zeros(100))
+        self.cache.max_bytes = 3 * self.cache.size_bytes
+        self.cache.put('b', value=np.zeros(100))
+        with mock.patch.object(self.cache, 'evict', wraps=self.cache.evict) as evict:
+            for _ in range(10):
+                self.cache.put('b', value=np.ones(100))
+        evict.assert_not_called()
+        self.assertEqual(self.cache._size, self.cache.size_bytes)
+        self.assertIsNotNone(self.cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+"""
+测试DTS数据处理与合成数据生成
+"""
+
+import unittest
+import numpy as np
+import sys
+import os
+import tempfile
+
+# 添加包路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from atrt import DtsDataProcessing
+from atrt.synthetic import synthetic_dts_data, synthetic_heating_curves
+from atrt.filters import StreamingDenoiser, denoise_temperature
+from atrt.archive import DtsArchive
+
+
+class TestSyntheticData(unittest.TestCase):
+    """测试合成数据生成器"""
+
+    def test_dts_data_round_trip(self):
+        """合成数据可被 DtsDataProcessing 读取并提取加热段"""
+        dataset = synthetic_dts_data(n_depths=20, n_time=60, seed=1)
+        processor = DtsDataProcessing(dataset['data'])
+        self.assertEqual(processor.temp.shape, (20, 70))
+
+        seconds, delta_temp, natural_temp = processor.extraction_heating_data(
+            dataset['top_idx'], dataset['bottom_idx'], dataset['start_str'], dataset['end_str']
+        )
+        self.assertEqual(len(seconds), 60)
+        self.assertEqual(delta_temp.shape, (10, 60))
+        # 加热段温度明显高于加热前
+        self.assertTrue(np.all(delta_temp[:, -1] - natural_temp > 1.0))
+
+    def test_heating_curves_models(self):
+        """三种正演模型的输出形状与可重复性"""
+        for model in ('clhs', 'kluitenberg', 'well'):
+            first = synthetic_heating_curves(3, 50, model=model, seed=0)
+            second = synthetic_heating_curves(3, 50, model=model, seed=0)
+            self.assertEqual(first['temperature'].shape, (3, 50))
+            np.testing.assert_array_equal(first['temperature'], second['temperature'])
+
+        with self.assertRaises(ValueError):
+            synthetic_heating_curves(model='unknown')
+
+
+class TestAppend(unittest.TestCase):
+    """测试 DtsDataProcessing.append"""
+
+    def setUp(self):
+        self.data = synthetic_dts_data(n_depths=6, n_time=40, n_before=5, seed=0)['data']
+        self.full = DtsDataProcessing(self.data)
+
+    def part(self, first, last):
+        return self.data[[self.data.columns[0]] + list(self.data.columns[1 + first:1 + last])]
+
+    def test_in_order_and_out_of_order(self):
+        """分批追加（含乱序和重复列）后与一次性读取相同"""
+        processor = DtsDataProcessing(self.part(0, 10))
+        self.assertEqual(processor.append(self.part(10, 20)), 10)
+        self.assertEqual(processor.append(self.part(30, 45)), 15)
+        self.assertEqual(processor.append(self.part(15, 30)), 10)  # 乱序，其中 5 列已存在
+        self.assertEqual(processor.append(self.part(0, 5)), 0)
+        self.assertTrue(processor.time.equals(self.full.time))
+        np.testing.assert_array_equal(processor.temp, self.full.temp)
+
+    def test_depth_mismatch(self):
+        processor = DtsDataProcessing(self.part(0, 10))
+        other = synthetic_dts_data(n_depths=7, n_time=40, n_before=5, seed=0)['data']
+        with self.assertRaises(ValueError):
+            processor.append(other)
+
+
+class TestFromFiles(unittest.TestCase):
+    """测试 DtsDataProcessing.from_files"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data = synthetic_dts_data(n_depths=6, n_time=40, n_before=5, seed=0)['data']
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, first, last, data=None):
+        data = self.data if data is None else data
+        path = os.path.join(self.directory.name, name)
+        data[[data.columns[0]] + list(data.columns[1 + first:1 + last])].to_csv(path, index=False)
+        return path
+
+    def test_matches_single_file(self):
+        """乱序、重叠的多个文件合并后与一次性读取相同"""
+        import pandas as pd
+
+        full = DtsDataProcessing(pd.read_csv(self.write('full.csv', 0, 45)))
+        paths = [self.write('c.csv', 30, 45), self.write('a.csv', 0, 20), self.write('b.csv', 15, 32)]
+        processor = DtsDataProcessing.from_files(paths, max_workers=2)
+        self.assertIsNone(processor.data)
+        self.assertTrue(processor.time.equals(full.time))
+        np.testing.assert_array_equal(processor.depth, full.depth)
+        np.testing.assert_array_equal(processor.temp, full.temp)
+        self.assertEqual(processor.append(self.data), 0)
+
+    def test_depth_mismatch(self):
+        other = synthetic_dts_data(n_depths=7, n_time=40, n_before=5, seed=0)['data']
+        paths = [self.write('a.csv', 0, 20), self.write('b.csv', 20, 45, other)]
+        with self.assertRaises(ValueError):
+            DtsDataProcessing.from_files(paths)
+        with self.assertRaises(ValueError):
+            DtsDataProcessing.from_files([])
+
+
+class TestArchive(unittest.TestCase):
+    """测试压缩归档格式"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'record.atrt')
+        self.dataset = synthetic_dts_data(n_depths=30, n_time=300, n_before=10, seed=0)
+        self.processor = DtsDataProcessing(self.dataset['data'])
+        self.processor.temp[3, 5] = np.nan
+        self.processor.temp[7, 100:120] = np.nan
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """还原误差不超过分辨率的一半，NaN 原样保留，各压缩方式结果相同"""
+        for codec in ('zlib', 'lzma', 'bz2', 'none'):
+            with self.subTest(codec=codec):
+                size = self.processor.to_archive(self.path, chunk_shape=(8, 64), codec=codec)
+                self.assertEqual(size, os.path.getsize(self.path))
+                restored = DtsDataProcessing.from_archive(self.path)
+                self.assertTrue(restored.time.equals(self.processor.time))
+                np.testing.assert_array_equal(restored.depth, self.processor.depth)
+                np.testing.assert_array_equal(np.isnan(restored.temp), np.isnan(self.processor.temp))
+                self.assertLessEqual(np.nanmax(np.abs(restored.temp - self.processor.temp)), 0.005 + 1e-9)
+        self.assertEqual(os.listdir(self.directory.name), ['record.atrt'])
+
+    def test_window_decodes_overlapping_chunks_only(self):
+        """读取加热窗口只解压重叠的块，结果可直接提取加热数据"""
+        from unittest import mock
+
+        self.processor.to_archive(self.path, chunk_shape=(8, 64))
+        archive = DtsArchive(self.path)
+        end_str = self.processor.time[100].strftime('%Y/%m/%d %H:%M:%S')
+        with mock.patch.object(DtsArchive, '_decode_chunk', autospec=True,
+                               side_effect=DtsArchive._decode_chunk) as decode:
+            window = archive.load(self.dataset['start_str'], end_str)
+        self.assertEqual(decode.call_count, 4 * 2)  # 4 个深度块 × 2 个时间块
+        args = (self.dataset['top_idx'], self.dataset['bottom_idx'], self.dataset['start_str'], end_str)
+        expected = self.processor.extraction_heating_data(*args)
+        for value, reference in zip(window.extraction_heating_data(*args), expected):
+            np.testing.assert_allclose(value, reference, atol=0.005 + 1e-9)
+
+
+class TestDenoise(unittest.TestCase):
+    """测试流式去噪"""
+
+    def setUp(self):
+        self.temp = np.random.default_rng(0).normal(0, 1, (23, 301))
+
+    def reference(self, time_window, polyorder, depth_window):
+        from scipy.ndimage import median_filter
+        from scipy.signal import savgol_filter
+        temp = self.temp
+        if depth_window:
+            temp = median_filter(temp, size=(depth_window, 1), mode='nearest')
+        return savgol_filter(temp, time_window, polyorder, axis=1, mode='nearest')
+
+    def test_chunked_matches_whole_array(self):
+        """任意分块大小的结果都与整体滤波相同"""
+        for time_window, polyorder, depth_window in [(5, 0, None), (9, 2, 3), (7, 3, 5)]:
+            expected = self.reference(time_window, polyorder, depth_window)
+            for chunk_size in (1, 4, 64, 1000):
+                with self.subTest(time_window=time_window, chunk_size=chunk_size):
+                    result = denoise_temperature(self.temp, time_window, polyorder, depth_window,
+                                                 chunk_size=chunk_size)
+                    np.testing.assert_allclose(result, expected, atol=1e-12)
+
+    def test_streaming_push(self):
+        """逐批输入的输出滞后半个窗口，拼接后与整体滤波相同"""
+        denoiser = StreamingDenoiser(time_window=7, polyorder=2)
+        parts = [denoiser.push(self.temp[:, start:start + 10]) for start in range(0, 301, 10)]
+        self.assertEqual(parts[0].shape, (23, 7))
+        parts.append(denoiser.flush())
+        np.testing.assert_allclose(np.concatenate(parts, axis=1), self.reference(7, 2, None), atol=1e-12)
+
+    def test_in_place_on_memmap(self):
+        """可以在磁盘映射的矩阵上原地去噪"""
+        expected = self.reference(5, 0, 3)
+        with tempfile.TemporaryDirectory() as directory:
+            temp = np.lib.format.open_memmap(os.path.join(directory, 'temp.npy'), mode='w+',
+                                             dtype=float, shape=self.temp.shape)
+            temp[:] = self.temp
+            denoise_temperature(temp, 5, depth_window=3, chunk_size=16, out=temp)
+            np.testing.assert_allclose(temp, expected, atol=1e-12)
+            del temp
+
+    def test_processor_denoise(self):
+        """DtsDataProcessing.denoise 降低噪声"""
+        clean = synthetic_dts_data(n_depths=10, n_time=120, noise=0.0, seed=0)['data']
+        noisy = synthetic_dts_data(n_depths=10, n_time=120, noise=0.1, seed=0)['data']
+        truth = DtsDataProcessing(clean).temp
+        processor = DtsDataProcessing(noisy)
+        # 加热开始时的陡峭温升会被平滑，只比较其后的时段
+        before = np.std((processor.temp - truth)[:, 40:])
+        processor.denoise(time_window=9)
+        self.assertLess(np.std((processor.temp - truth)[:, 40:]), 0.6 * before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,252 @@
+"""
+测试计算内核与参考实现的一致性
+"""
+
+import unittest
+import numpy as np
+import sys
+import os
+
+# 添加包路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from scipy.special import exp1, kv
+
+from atrt import kernels
+from atrt.DTPM_calcfunc import NFM_Kluitenberg, calc_temp, optimize_soil_properties_RMSE
+from atrt.fit_context import FitContext
+from atrt.flowrate_function import calc_rmse_std
+from atrt.thermal_conductivity_function import CLHS_RMSE
+from atrt.synthetic import synthetic_heating_curves
+
+FAST_BACKENDS = ['numpy'] + (['numba'] if kernels.numba_available() else [])
+
+
+class TestKernelAgreement(unittest.TestCase):
+    """各后端与 scipy 参考实现一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        curves = synthetic_heating_curves(1, 60, dt=4.0, model='kluitenberg', noise=0.01, seed=0)
+        cls.t = curves['seconds']  # 包含 t = 0，检查无效时刻的处理
+        cls.T = curves['temperature'][0]
+        cls.variables = curves['variables']
+        well = synthetic_heating_curves(1, 40, dt=120.0, model='well', noise=0.01, seed=0)
+        cls.well_t = well['seconds']
+        cls.well_T = well['temperature'][0]
+        cls.well_parameters = [5.2, 0.27, 668.0]
+
+    def test_kluitenberg(self):
+        reference_T = kernels.kluitenberg_temperature(2.4e6, 1.4, self.t, *self.variables, backend='scipy')
+        reference = kernels.kluitenberg_rmse(2.4e6, 1.4, self.T, self.t, *self.variables, backend='scipy')
+        for backend in FAST_BACKENDS:
+            with self.subTest(backend=backend):
+                np.testing.assert_allclose(
+                    kernels.kluitenberg_temperature(2.4e6, 1.4, self.t, *self.variables, backend=backend),
+                    reference_T, rtol=1e-12)
+                self.assertAlmostEqual(
+                    kernels.kluitenberg_rmse(2.4e6, 1.4, self.T, self.t, *self.variables, backend=backend),
+                    reference, places=12)
+
+    def test_clhs(self):
+        reference_T = kernels.clhs_temperature(self.t, 50, 1.5, 6e-7, backend='scipy')
+        reference = kernels.clhs_rmse(6e-7, 1.5, self.T, self.t, 50, backend='scipy')
+        for backend in FAST_BACKENDS:
+            with self.subTest(backend=backend):
+                np.testing.assert_allclose(kernels.clhs_temperature(self.t, 50, 1.5, 6e-7, backend=backend),
+                                           reference_T, rtol=1e-12)
+                self.assertAlmostEqual(kernels.clhs_rmse(6e-7, 1.5, self.T, self.t, 50, backend=backend),
+                                       reference, places=12)
+
+    def test_leaky_well(self):
+        reference_T = kernels.leaky_well_temperature(self.well_parameters, self.well_t, backend='scipy')
+        reference = kernels.leaky_well_rmse_std(self.well_parameters, self.well_t, self.well_T, 1,
+                                                backend='scipy')
+        for backend in FAST_BACKENDS:
+            with self.subTest(backend=backend):
+                np.testing.assert_allclose(
+                    kernels.leaky_well_temperature(self.well_parameters, self.well_t, backend=backend),
+                    reference_T, rtol=1e-6)
+                self.assertAlmostEqual(
+                    kernels.leaky_well_rmse_std(self.well_parameters, self.well_t, self.well_T, 1,
+                                                backend=backend),
+                    reference, delta=1e-6 * reference)
+
+    def test_population_batch(self):
+        """种群批量目标函数与逐点参考实现一致"""
+        population = np.array([[2.4e6, 1.4], [3.0e6, 2.0], [1.5e6, 0.8]])
+        np.testing.assert_allclose(
+            kernels.kluitenberg_rmse_batch(population, self.T, self.t, *self.variables),
+            [kernels.kluitenberg_rmse(*x, self.T, self.t, *self.variables, backend='scipy') for x in population],
+            rtol=1e-12)
+        population = np.array([self.well_parameters, [3.0, 0.5, 1000.0], [3.0, 0.5, -1.0]])
+        values = kernels.leaky_well_rmse_std_batch(population, self.well_t, self.well_T, 1)
+        np.testing.assert_allclose(
+            values[:2], [kernels.leaky_well_rmse_std(x, self.well_t, self.well_T, 1, backend='scipy')
+                         for x in population[:2]],
+            rtol=1e-6)
+        self.assertEqual(values[2], np.inf)
+
+    def test_loop_kernels_uncompiled(self):
+        """numba 内核的循环逻辑在不编译时与参考实现一致"""
+        loop = kernels._get_loop_kernels('python')
+        x = np.array([1e-8, 1e-3, 0.5, 1.0, 1.5, 10.0, 300.0])
+        np.testing.assert_allclose([loop.e1(value) for value in x], exp1(x), rtol=1e-13)
+
+        t = self.t.astype(float)
+        r, q, t0 = (float(value) for value in self.variables)
+        np.testing.assert_allclose(
+            loop.kluitenberg_temperature(2.4e6, 1.4, t, r, q, t0),
+            kernels.kluitenberg_temperature(2.4e6, 1.4, t, r, q, t0, backend='scipy'), rtol=1e-12)
+        self.assertAlmostEqual(loop.kluitenberg_rmse(2.4e6, 1.4, self.T, t, r, q, t0),
+                               kernels.kluitenberg_rmse(2.4e6, 1.4, self.T, t, r, q, t0, backend='scipy'),
+                               places=12)
+        self.assertAlmostEqual(loop.clhs_rmse(6e-7, 1.5, self.T, t, 50.0, 0.0007),
+                               kernels.clhs_rmse(6e-7, 1.5, self.T, t, 50, backend='scipy'), places=12)
+
+        T_steady, b, A = self.well_parameters
+        self.assertAlmostEqual(
+            loop.leaky_well_rmse_std(T_steady, b, A, self.well_t.astype(float), self.well_T, 1,
+                                     float(kv(0, b)), kernels._WELL_NODES, kernels._WELL_WEIGHTS,
+                                     kernels._WELL_PANELS),
+            kernels.leaky_well_rmse_std(self.well_parameters, self.well_t, self.well_T, 1,
+                                        backend='numpy'),
+            places=12)
+
+
+class TestFitContext(unittest.TestCase):
+    """测试缓存时间轴不变量的拟合上下文"""
+
+    @classmethod
+    def setUpClass(cls):
+        curves = synthetic_heating_curves(2, 60, dt=4.0, model='kluitenberg', noise=0.01, seed=0)
+        cls.t = curves['seconds']
+        cls.T = curves['temperature'][0].copy()
+        cls.T[10] = np.nan
+        cls.variables = curves['variables']
+        cls.curves = curves
+        well = synthetic_heating_curves(1, 40, dt=120.0, model='well', noise=0.01, seed=0)
+        cls.well_t = well['seconds']
+        cls.well_T = well['temperature'][0]
+
+    def test_matches_reference(self):
+        """与参考实现一致（时间轴乱序时同样适用），目标函数通过 context 参数使用它"""
+        context = FitContext(self.t)
+        for x in ([2.4e6, 1.4], [1e7, 0.05]):
+            reference = NFM_Kluitenberg(x, self.T, self.t, self.variables)
+            self.assertAlmostEqual(NFM_Kluitenberg(x, self.T, self.t, self.variables, context=context),
+                                   reference, places=12)
+            order = np.random.default_rng(0).permutation(len(self.t))
+            self.assertAlmostEqual(FitContext(self.t[order]).kluitenberg_rmse(*x, self.T[order], *self.variables),
+                                   reference, places=12)
+        np.testing.assert_allclose(calc_temp([2.4e6, 1.4], self.t, self.variables, context=context),
+                                   calc_temp([2.4e6, 1.4], self.t, self.variables), rtol=1e-12)
+        T = self.curves['temperature'][1]
+        self.assertAlmostEqual(CLHS_RMSE([6e-7, 1.5], T, self.t, 50, context=context),
+                               CLHS_RMSE([6e-7, 1.5], T, self.t, 50), places=12)
+
+        context = FitContext(self.well_t)
+        for calc_timeidx in (0, 1, 5):
+            for parameter in ([5.2, 0.27, 668.0], [3.0, 0.0, 1000.0]):
+                self.assertAlmostEqual(
+                    calc_rmse_std(parameter, self.well_t, self.well_T, calc_timeidx, context=context),
+                    kernels.leaky_well_rmse_std(parameter, self.well_t, self.well_T, calc_timeidx,
+                                                backend='numpy'),
+                    places=12)
+        self.assertEqual(context.leaky_well_rmse_std([3.0, 0.5, -1.0], self.well_T, 1), np.inf)
+        with self.assertRaises(ValueError):
+            context.leaky_well_rmse_std([3.0, 0.5, 1000.0], self.well_T[1:], 1)
+
+    def test_time_axis_mismatch(self):
+        """与创建上下文时不同的时间轴（长度相同）抛出 ValueError"""
+        from atrt.flowrate_function import optimize_parameters_GD
+
+        context = FitContext(2 * self.t)
+        with self.assertRaises(ValueError):
+            NFM_Kluitenberg([2.4e6, 1.4], self.T, self.t, self.variables, context=context)
+        with self.assertRaises(ValueError):
+            kernels.kluitenberg_objective(self.T, self.t, self.variables, context=context)
+        with self.assertRaises(ValueError):
+            optimize_soil_properties_RMSE(self.t, self.T, self.variables, [2.5e6, 1.5], context=context)
+        context = FitContext(2 * self.well_t)
+        with self.assertRaises(ValueError):
+            calc_rmse_std([5.2, 0.27, 668.0], self.well_t, self.well_T, 1, context=context)
+        with self.assertRaises(ValueError):
+            optimize_parameters_GD(self.well_t, self.well_T, 1, [5.2, 0.27, 668.0], 'Nelder-Mead',
+                                   context=context)
+        # 相同取值的另一个数组可以使用
+        context = FitContext(self.t)
+        self.assertAlmostEqual(NFM_Kluitenberg([2.4e6, 1.4], self.T, self.t.copy(), self.variables,
+                                               context=context),
+                               NFM_Kluitenberg([2.4e6, 1.4], self.T, self.t, self.variables), places=12)
+
+    def test_no_per_evaluation_allocation(self):
+        """首次求值后不再分配与时间轴等长的数组"""
+        import tracemalloc
+
+        n = 20000
+        t = np.arange(n) * 2.0
+        T = np.zeros(n)
+        context = FitContext(t)
+        evaluations = [
+            lambda: context.kluitenberg_rmse(2.4e6, 1.4, T, *self.variables),
+            lambda: context.clhs_rmse(6e-7, 1.5, T, 50),
+            lambda: context.leaky_well_rmse_std([5.2, 0.27, 668.0], T, 1),
+        ]
+        for evaluate in evaluations:
+            evaluate()
+            tracemalloc.start()
+            try:
+                evaluate()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertLess(peak, n * 8)
+
+    def test_shared_across_depths(self):
+        """多个深度共享一个上下文，结果与不使用上下文时相同；序列化时只保留时间轴"""
+        import pickle
+
+        t = self.t[1:]
+        temperature = self.curves['temperature'][:, 1:]
+        variables = [self.variables[0], np.array([45.0, 55.0]), self.variables[2]]
+        context = FitContext(t)
+        expected = optimize_soil_properties_RMSE(t, temperature, variables, [2.5e6, 1.5])
+        result = optimize_soil_properties_RMSE(t, temperature, variables, [2.5e6, 1.5], context=context)
+        for value, reference in zip(result, expected):
+            np.testing.assert_allclose(value, reference, rtol=1e-6)
+        self.assertEqual(len(context._kluitenberg), 1)
+
+        restored = pickle.loads(pickle.dumps(context))
+        np.testing.assert_array_equal(restored.t, context.t)
+        self.assertEqual(restored._kluitenberg, {})
+
+
+class TestKernelBackend(unittest.TestCase):
+    """测试后端切换"""
+
+    def tearDown(self):
+        kernels.set_kernel_backend('scipy')
+
+    def test_switch(self):
+        self.assertEqual(kernels.get_kernel_backend(), 'scipy')
+        self.assertEqual(kernels.set_kernel_backend('auto'), FAST_BACKENDS[-1])
+        with self.assertRaises(ValueError):
+            kernels.set_kernel_backend('fortran')
+        if not kernels.numba_available():
+            with self.assertRaises(ImportError):
+                kernels.set_kernel_backend('numba')
+
+    def test_optimizer_uses_backend(self):
+        """切换后端后 DTPM 反演结果与参考实现一致"""
+        curves = synthetic_heating_curves(2, 60, dt=4.0, model='kluitenberg', noise=0.01, seed=3)
+        args = (curves['seconds'][1:], curves['temperature'][:, 1:], curves['variables'], [2.5e6, 1.5])
+        reference = optimize_soil_properties_RMSE(*args)
+        kernels.set_kernel_backend('auto')
+        result = optimize_soil_properties_RMSE(*args)
+        for expected, value in zip(reference, result):
+            np.testing.assert_allclose(value, expected, rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
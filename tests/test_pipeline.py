@@ -0,0 +1,108 @@
+"""
+测试流式分析流程
+"""
+
+import unittest
+import warnings
+import numpy as np
+import sys
+import os
+
+# 添加包路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from atrt import DtsDataProcessing
+from atrt.instrumentation import Instrumentation
+from atrt.pipeline import AnalysisPipeline
+from atrt.synthetic import synthetic_dts_data
+
+
+class TestAnalysisPipeline(unittest.TestCase):
+    """测试 AnalysisPipeline"""
+
+    def setUp(self):
+        self.dataset = synthetic_dts_data(n_depths=16, n_time=240, noise=0.02, seed=0)
+        self.processor = DtsDataProcessing(self.dataset['data'])
+        self.event = {
+            'name': 'event1',
+            'start_str': self.dataset['start_str'],
+            'end_str': self.dataset['end_str'],
+            'top_idx': self.dataset['top_idx'],
+            'bottom_idx': self.dataset['bottom_idx'],
+        }
+
+    def make_pipeline(self, **kwargs):
+        return AnalysisPipeline(
+            heating_power=self.dataset['heating_power'], block_size=3,
+            thermal_conductivity={'start_calc_hour': 0.5, 'end_calc_hour': 2},
+            dtpm={'r': 0.0007, 'initial_guess': [2.5e6, 1.5]},
+            **kwargs
+        )
+
+    def test_tidy_table(self):
+        """每个深度一行，导热系数接近真值"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            table = self.make_pipeline().run(self.processor, [self.event])['event1']
+
+        n_heated = self.dataset['bottom_idx'] - self.dataset['top_idx'] + 1
+        self.assertEqual(len(table), n_heated)
+        self.assertEqual(list(table['depth_index']),
+                         list(range(self.dataset['top_idx'], self.dataset['bottom_idx'] + 1)))
+        np.testing.assert_allclose(table['thermal_conductivity'], self.dataset['lambda'], rtol=0.05)
+        np.testing.assert_allclose(table['lambda_dtpm'], self.dataset['lambda'], rtol=0.05)
+
+    def test_executors_agree(self):
+        """串行与线程池执行结果一致，并记录各阶段耗时"""
+        instrumentation = Instrumentation()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            serial = self.make_pipeline().run_event(self.processor, self.event)
+            threaded = self.make_pipeline(executor='thread', max_workers=2,
+                                          instrumentation=instrumentation
+                                          ).run_event(self.processor, self.event)
+        np.testing.assert_allclose(serial['Cv'], threaded['Cv'])
+
+        stages = set(instrumentation.stage_frame()['stage'])
+        self.assertTrue({'extract', 'power', 'thermal_conductivity', 'dtpm'} <= stages)
+        records = instrumentation.to_frame()
+        self.assertEqual(sorted(records['depth']), list(serial['depth_index']))
+
+    def test_cache_path_normalized_once(self):
+        """缓存目录路径只转换一次，各深度的拟合共用同一个 ResultCache"""
+        import tempfile
+        from atrt.cache import ResultCache
+
+        with tempfile.TemporaryDirectory() as directory, warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pipeline = self.make_pipeline(cache=directory)
+            cache = pipeline.config['cache']
+            self.assertIsInstance(cache, ResultCache)
+            first = pipeline.run_event(self.processor, self.event)
+            misses = cache.misses
+            second = pipeline.run_event(self.processor, self.event)
+            self.assertEqual(cache.misses, misses)
+            self.assertEqual(cache.hits, misses)
+        np.testing.assert_array_equal(second['Cv'], first['Cv'])
+
+    def test_flow_stage_is_quiet(self):
+        """流速反演阶段关闭 scipy 的收敛输出"""
+        from unittest import mock
+
+        result = (np.array([3.0, 0.5, 1500.0]), 0.01, [])
+        with mock.patch('atrt.flowrate_function.optimize_parameters_GD', return_value=result) as fit, \
+                warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            table = self.make_pipeline(flow={'initial_guess': [3.0, 0.5, 1500.0]}
+                                       ).run_event(self.processor, self.event)
+        self.assertEqual(fit.call_count, len(table))
+        self.assertTrue(all(call.kwargs['disp'] is False for call in fit.call_args_list))
+
+    def test_requires_power(self):
+        """未给定电流和功率时抛出异常"""
+        with self.assertRaises(ValueError):
+            AnalysisPipeline()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+测试导热系数拟合结果的批量出图
+"""
+
+import unittest
+import tempfile
+import numpy as np
+import sys
+import os
+
+# 添加包路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from atrt.report import collect_fit_results, render_thermal_conductivity_reports
+
+
+class TestBatchReport(unittest.TestCase):
+    """测试批量出图"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.seconds = np.arange(0, 3 * 3600 + 1, 60.0)
+        self.delta_temp = 0.4 * np.log(np.maximum(self.seconds, 1)) + \
+            rng.normal(0, 0.02, (3, len(self.seconds)))
+        self.fit_results = collect_fit_results(self.delta_temp, self.seconds, 0.5, 2, 20)
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_dir = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_collect_fit_results(self):
+        """批量拟合结果的形状"""
+        self.assertEqual(self.fit_results['fitted_params'].shape, (3, 2))
+        np.testing.assert_allclose(self.fit_results['thermal_conductivity'],
+                                   20 / (4 * np.pi * 0.4), rtol=0.05)
+
+    def test_render_png_and_pdf(self):
+        """输出 PNG 和多页 PDF"""
+        files = render_thermal_conductivity_reports(
+            self.delta_temp, self.seconds, self.fit_results, self.output_dir,
+            labels=['10.0m', '10.5m', '11.0m'], pdf=True
+        )
+        self.assertEqual(len(files), 4)
+        for path in files:
+            self.assertTrue(os.path.getsize(path) > 0)
+        self.assertTrue(files[0].endswith('thermal_conductivity_10.0m.png'))
+
+
+if __name__ == '__main__':
+    unittest.main()
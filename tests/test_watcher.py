@@ -0,0 +1,152 @@
+"""
+测试监测目录的数据接入服务
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+
+# 添加包路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from atrt.pipeline import AnalysisPipeline
+from atrt.synthetic import synthetic_dts_data
+from atrt.watcher import DtsDirectoryWatcher
+
+
+class TestDtsDirectoryWatcher(unittest.TestCase):
+    """测试 DtsDirectoryWatcher"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataset = synthetic_dts_data(n_depths=8, n_time=240, noise=0.02, seed=0)
+        self.data = self.dataset['data']
+        self.pipeline = AnalysisPipeline(
+            heating_power=self.dataset['heating_power'],
+            thermal_conductivity={'start_calc_hour': 0.5, 'end_calc_hour': 1.5},
+        )
+        self.events = [
+            {'name': 'heating', 'start_str': self.dataset['start_str'], 'end_str': self.dataset['end_str'],
+             'top_idx': self.dataset['top_idx'], 'bottom_idx': self.dataset['bottom_idx']},
+            {'name': 'earlier', 'start_str': '2023/12/31 10:00:00', 'end_str': '2023/12/31 12:00:00'},
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, name, first, last):
+        """把第 first 到 last-1 个时间列写为一个导出文件"""
+        columns = [self.data.columns[0]] + list(self.data.columns[1 + first:1 + last])
+        self.data[columns].to_csv(os.path.join(self.directory.name, name), index=False)
+
+    def make_watcher(self, **kwargs):
+        return DtsDirectoryWatcher(self.directory.name, self.pipeline, events=self.events,
+                                   settle_time=0, max_pending=2, **kwargs)
+
+    def test_incremental_updates(self):
+        """新文件到达后只重新计算重叠的事件，结果与一次性分析相同"""
+        updates = []
+        watcher = self.make_watcher(on_update=lambda name, table: updates.append(name))
+
+        async def scenario():
+            self.write_file('part0.csv', 0, 100)
+            self.write_file('part1.csv', 100, 180)
+            first = await watcher.poll_once()
+            self.assertEqual(await watcher.poll_once(), {})  # 没有新文件
+            self.write_file('part2.csv', 180, 250)
+            second = await watcher.poll_once()
+            watcher.close()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(list(first), ['heating'])
+        self.assertEqual(list(second), ['heating'])
+        self.assertEqual(updates, ['heating', 'heating'])
+        self.assertEqual(len(watcher.processed_files), 3)
+        self.assertEqual(watcher.processor.temp.shape, (8, 250))
+
+        from atrt import DtsDataProcessing
+        expected = self.pipeline.run_event(DtsDataProcessing(self.data), self.events[0])
+        np.testing.assert_allclose(second['heating']['thermal_conductivity'],
+                                   expected['thermal_conductivity'])
+
+    def test_bad_file_is_reported(self):
+        """无法解析或深度不一致的文件被记录，不影响其他文件"""
+        watcher = self.make_watcher()
+
+        async def scenario():
+            self.write_file('part0.csv', 0, 250)
+            with open(os.path.join(self.directory.name, 'broken.csv'), 'w') as f:
+                f.write('not,a\nDTS,file\n')
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                result = await watcher.poll_once()
+            watcher.close()
+            return result
+
+        result = asyncio.run(scenario())
+        self.assertIn('heating', result)
+        self.assertEqual(list(watcher.errors), [os.path.join(self.directory.name, 'broken.csv')])
+
+    def test_waits_for_event_data(self):
+        """加热时段内数据不足时等待后续文件，不调用分析流程"""
+        watcher = self.make_watcher()
+
+        async def scenario():
+            self.write_file('part0.csv', 0, 11)  # 只有加热开始时刻一个采样
+            first = await watcher.poll_once()
+            self.write_file('part1.csv', 11, 250)
+            second = await watcher.poll_once()
+            watcher.close()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(first, {})
+        self.assertEqual(list(second), ['heating'])
+        self.assertEqual(watcher.errors, {})
+
+    def test_pipeline_error_is_reported(self):
+        """分析流程的错误按事件名记录，而不是当作数据不足忽略"""
+        watcher = self.make_watcher()
+        error = ValueError("无效的初值")
+
+        async def scenario():
+            self.write_file('part0.csv', 0, 250)
+            with mock.patch.object(self.pipeline, 'run_event', side_effect=error), \
+                    warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                result = await watcher.poll_once()
+            watcher.close()
+            return result, caught
+
+        result, caught = asyncio.run(scenario())
+        self.assertEqual(result, {})
+        self.assertIs(watcher.errors['heating'], error)
+        self.assertTrue(any('heating' in str(w.message) for w in caught))
+
+    def test_run_until_stopped(self):
+        """run() 持续轮询，stop() 后退出"""
+        watcher = self.make_watcher(poll_interval=0.01)
+
+        async def scenario():
+            task = asyncio.create_task(watcher.run())
+            self.write_file('part0.csv', 0, 250)
+            for _ in range(500):
+                await asyncio.sleep(0.01)
+                if 'heating' in watcher.results:
+                    break
+            watcher.stop()
+            await task
+
+        asyncio.run(scenario())
+        self.assertIn('heating', watcher.results)
+
+
+if __name__ == '__main__':
+    unittest.main()